@@ -2,13 +2,2926 @@ import tkinter as tk
 from tkinter import ttk, messagebox, font, filedialog
 import json
 import os
-from datetime import datetime
+import sys
+import io
+import codecs
+import copy
+import queue
+import sqlite3
+import mmap
+import shutil
+import gzip
+import lzma
+import calendar
+import bisect
+import heapq
+import math
+import itertools
+import unicodedata
+from abc import ABC, abstractmethod
+from array import array
+from contextlib import contextmanager, ExitStack
+from datetime import datetime, timedelta
 import threading
+import multiprocessing
 import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from collections import defaultdict
 
+try:
+    import numpy as np
+except ImportError:
+    # Sin NumPy las analíticas recorren los mismos arreglos con ciclos de Python
+    np = None
+
+# Archivos de datos
+ARCHIVO_INVENTARIO = "inventario_tortilleria.json"
+ARCHIVO_VENTAS = "ventas_tortilleria.json"
+ARCHIVO_DIARIO_VENTAS = "ventas_tortilleria.jsonl"
+ARCHIVO_SQLITE = "tortilleria.db"
+DIRECTORIO_ARCHIVO_VENTAS = "archivo_ventas"
+DIRECTORIO_VENTAS = "ventas"
+ARCHIVO_REGISTRO_RESPALDOS = "respaldos_tortilleria.json"
+ARCHIVO_RESUMEN_VENTAS = "resumen_ventas_tortilleria.json"
+ARCHIVO_PRONOSTICO = "pronostico_demanda_tortilleria.json"
+
+# Compresión de los respaldos: "gzip" (rápida) o "lzma" (más pequeña)
+COMPRESION_RESPALDOS = "gzip"
+
+# Almacenamiento de datos: "json" (archivos planos), "sqlite" o "particiones"
+# (un archivo de ventas por día en DIRECTORIO_VENTAS)
+BACKEND_ALMACENAMIENTO = os.environ.get("TORTILLERIA_BACKEND", "json")
+
+# Número de ventas en el diario a partir del cual se compacta al archivo principal
+LIMITE_DIARIO_VENTAS = 500
+
+# Número de productos que muestra el reporte de más vendidos
+PRODUCTOS_EN_REPORTE = 20
+
+# Productos comprados juntos: tamaño máximo de las combinaciones y umbrales de las reglas
+TAMANO_MAXIMO_CONJUNTO = 3
+SOPORTE_MINIMO = 0.01
+CONFIANZA_MINIMA = 0.2
+
+# Pronóstico de demanda: suavizado del nivel y de la estacionalidad por día de la semana,
+# y margen que se produce por encima de la demanda pronosticada
+SUAVIZADO_NIVEL = 0.3
+SUAVIZADO_ESTACION = 0.2
+MARGEN_PRODUCCION = 0.1
+
+# Procesos que reparten los reportes del historial completo (1 = calcularlos en serie)
+try:
+    PROCESOS_REPORTES = int(os.environ.get("TORTILLERIA_PROCESOS_REPORTES", os.cpu_count() or 1))
+except ValueError:
+    print("TORTILLERIA_PROCESOS_REPORTES no es un número, los reportes se calculan en serie")
+    PROCESOS_REPORTES = 1
+
+# Listas virtuales: alto de cada fila (igual al estilo 'Treeview') y filas que se
+# formatean por adelantado en cada página del búfer
+ALTO_FILA_LISTA = 25
+FILAS_POR_PAGINA = 200
+
+# Segundos que espera el hilo de guardado para juntar cambios seguidos en una sola escritura
+DEMORA_GUARDADO = 0.5
+
+# Milisegundos entre revisiones de los resultados del hilo de reportes
+INTERVALO_RESULTADOS = 50
+
+# Milisegundos que se muestra un aviso flotante (confirmaciones sin messagebox)
+DURACION_AVISO = 2500
+
+
+class DiarioVentas:
+    """Diario de ventas en formato JSON Lines (una venta por línea, solo se agrega)"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.entradas = 0
+
+    def agregar(self, venta):
+        """Agregar una venta al final del diario y forzarla a disco"""
+        linea = json.dumps(venta, ensure_ascii=False) + "\n"
+        with open(self.ruta, "a", encoding="utf-8") as f:
+            f.write(linea)
+            f.flush()
+            os.fsync(f.fileno())
+        self.entradas += 1
+
+    def leer(self):
+        """Leer todas las ventas del diario, ignorando una última línea incompleta"""
+        ventas = []
+        if not os.path.exists(self.ruta):
+            self.entradas = 0
+            return ventas
+
+        valido_hasta = 0
+        danado = False
+        with open(self.ruta, "rb") as f:
+            for numero, linea in enumerate(f, 1):
+                if not linea.strip():
+                    valido_hasta += len(linea)
+                    continue
+                try:
+                    if not linea.endswith(b"\n"):
+                        raise ValueError("línea incompleta")
+                    ventas.append(json.loads(linea.decode("utf-8")))
+                    valido_hasta += len(linea)
+                except ValueError:
+                    # Una escritura interrumpida solo puede dañar la última línea
+                    print(f"Línea {numero} del diario de ventas dañada, se ignora")
+                    danado = True
+                    break
+
+        if danado:
+            # Recortar el final dañado para que las siguientes ventas no se mezclen con él
+            with open(self.ruta, "r+b") as f:
+                f.truncate(valido_hasta)
+
+        self.entradas = len(ventas)
+        return ventas
+
+    def vaciar(self):
+        """Vaciar el diario después de compactarlo"""
+        with open(self.ruta, "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self.entradas = 0
+
+
+def serializar_ventas(ventas, inicio, primera=True):
+    """Codificar ventas (una por línea) y calcular la posición en bytes de cada una.
+
+    `inicio` es la posición del archivo donde se escribirá el texto y `primera`
+    indica si la primera venta no lleva coma antes. Devuelve (bytes, posiciones).
+    """
+    partes = []
+    posiciones = []
+    posicion = inicio
+    for venta in ventas:
+        separador = b"\n" if primera else b",\n"
+        primera = False
+        registro = json.dumps(venta, ensure_ascii=False).encode("utf-8")
+        posicion += len(separador)
+        posiciones.append((posicion, posicion + len(registro)))
+        posicion += len(registro)
+        partes.append(separador)
+        partes.append(registro)
+    partes.append(b"\n]")
+    return b"".join(partes), posiciones
+
+
+def iterar_ventas_json(f, inicio=0, fin=None, tam_bloque=1 << 16):
+    """Recorrer de forma incremental los objetos de un arreglo JSON abierto en modo binario.
+
+    Lee el archivo por bloques sin cargarlo completo y produce tuplas
+    (inicio, fin, venta) con la posición en bytes de cada objeto. Con `inicio`
+    y `fin` recorre solo un tramo del archivo.
+    """
+    decodificador = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    f.seek(inicio)
+    restante = None if fin is None else fin - inicio
+    buffer = ""
+    pos = 0
+    posicion_bytes = inicio  # Posición en el archivo de buffer[pos]
+    agotado = False
+
+    while True:
+        # Saltar espacios, comas y corchetes entre objetos (todos ocupan un byte)
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,[]":
+                pos += 1
+                posicion_bytes += 1
+            if pos < len(buffer) or agotado:
+                break
+            datos = f.read(tam_bloque if restante is None else min(tam_bloque, restante))
+            if restante is not None:
+                restante -= len(datos)
+            agotado = not datos
+            buffer = buffer[pos:] + utf8.decode(datos, final=agotado)
+            pos = 0
+
+        if pos >= len(buffer):
+            return
+        if buffer[pos] != "{":
+            raise ValueError(f"Carácter inesperado en el historial en la posición {posicion_bytes}")
+
+        try:
+            venta, fin_pos = decodificador.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if agotado:
+                raise
+            # El objeto continúa en el siguiente bloque
+            datos = f.read(tam_bloque if restante is None else min(tam_bloque, restante))
+            if restante is not None:
+                restante -= len(datos)
+            agotado = not datos
+            buffer = buffer[pos:] + utf8.decode(datos, final=agotado)
+            pos = 0
+            continue
+
+        largo = len(buffer[pos:fin_pos].encode("utf-8"))
+        yield posicion_bytes, posicion_bytes + largo, venta
+        posicion_bytes += largo
+        pos = fin_pos
+
+
+def agregar_ventas_archivo_json(ruta, ventas):
+    """Agregar ventas al final del arreglo JSON de `ruta` sin reescribir el archivo completo.
+
+    Devuelve la posición en bytes (inicio, fin) de cada venta escrita.
+    """
+    if not ventas:
+        return []
+
+    if not os.path.exists(ruta) or os.path.getsize(ruta) == 0:
+        return escribir_ventas_archivo_json(ruta, ventas)
+
+    with open(ruta, "r+b") as f:
+        # Buscar el corchete de cierre del arreglo leyendo desde el final
+        f.seek(0, os.SEEK_END)
+        posicion = f.tell()
+        cierre = None
+        anterior = None
+        while posicion > 0:
+            tam_bloque = min(4096, posicion)
+            posicion -= tam_bloque
+            f.seek(posicion)
+            bloque = f.read(tam_bloque)
+            for i in range(len(bloque) - 1, -1, -1):
+                caracter = bloque[i:i + 1]
+                if caracter.isspace():
+                    continue
+                if cierre is None:
+                    if caracter != b"]":
+                        raise ValueError(f"{ruta} no termina en un arreglo JSON")
+                    cierre = posicion + i
+                else:
+                    anterior = caracter
+                    break
+            if anterior is not None:
+                break
+
+        if cierre is None or anterior is None:
+            raise ValueError(f"{ruta} no contiene un arreglo JSON")
+
+        texto, posiciones = serializar_ventas(ventas, cierre, primera=(anterior == b"["))
+        f.seek(cierre)
+        f.truncate()
+        f.write(texto)
+        f.flush()
+        os.fsync(f.fileno())
+    return posiciones
+
+
+def escribir_json_atomico(ruta, datos):
+    """Escribir `datos` como JSON en un archivo temporal y renombrarlo sobre `ruta`"""
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+def escribir_ventas_archivo_json(ruta, ventas):
+    """Escribir el historial completo de ventas (una venta por línea) mediante archivo temporal.
+
+    Devuelve la posición en bytes (inicio, fin) de cada venta escrita.
+    """
+    temporal = ruta + ".tmp"
+    texto, posiciones = serializar_ventas(ventas, 1)
+    with open(temporal, "wb") as f:
+        f.write(b"[")
+        f.write(texto)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+    return posiciones
+
+
+class CargadorHistorial:
+    """Carga por meses del historial de ventas usando un índice de posiciones en el archivo.
+
+    Al iniciar solo se leen los meses recientes; los anteriores se leen cuando
+    un reporte los pide. El índice se guarda junto al historial y se invalida si
+    el tamaño o la fecha de modificación del archivo no coinciden.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.ruta_indice = ruta + ".idx"
+        self.meses = {}  # "YYYY-MM" -> {"rangos": [[inicio, fin], ...], "ventas": n}
+        self.ultimo_mes = None
+        self.cargados = set()
+        self.archivo = None  # ArchivoColumnar opcional para meses cerrados
+
+    def _firma(self):
+        estado = os.stat(self.ruta)
+        return [estado.st_size, estado.st_mtime_ns]
+
+    def _leer_indice(self):
+        """Leer el índice guardado si corresponde al archivo actual"""
+        if not os.path.exists(self.ruta_indice):
+            return False
+        try:
+            with open(self.ruta_indice, "r", encoding="utf-8") as f:
+                indice = json.load(f)
+        except ValueError:
+            return False
+        if indice.get("firma") != self._firma():
+            return False
+        self.meses = indice["meses"]
+        self.ultimo_mes = indice.get("ultimo_mes")
+        return True
+
+    def guardar_indice(self):
+        """Guardar el índice con la firma actual del historial"""
+        escribir_json_atomico(self.ruta_indice, {
+            "firma": self._firma(),
+            "ultimo_mes": self.ultimo_mes,
+            "meses": self.meses
+        })
+
+    def _agregar_posicion(self, mes, inicio, fin):
+        datos = self.meses.setdefault(mes, {"rangos": [], "ventas": 0})
+        if self.ultimo_mes == mes and datos["rangos"]:
+            # Ventas consecutivas del mismo mes forman un solo tramo
+            datos["rangos"][-1][1] = fin
+        else:
+            datos["rangos"].append([inicio, fin])
+        datos["ventas"] += 1
+        self.ultimo_mes = mes
+
+    def cargar_recientes(self, desde_mes):
+        """Leer las ventas de los meses >= `desde_mes`; el resto queda pendiente"""
+        self.meses = {}
+        self.ultimo_mes = None
+        self.cargados = set()
+        if not os.path.exists(self.ruta):
+            return []
+
+        if self._leer_indice():
+            return self.cargar_meses([mes for mes in self.meses if mes >= desde_mes])
+
+        # Sin índice válido: recorrer el archivo una vez, conservando solo los meses recientes
+        ventas = []
+        with open(self.ruta, "rb") as f:
+            for inicio, fin, venta in iterar_ventas_json(f):
+                mes = venta["fecha"][:7]
+                self._agregar_posicion(mes, inicio, fin)
+                if mes >= desde_mes:
+                    ventas.append(venta)
+        self.cargados = {mes for mes in self.meses if mes >= desde_mes}
+        self.guardar_indice()
+        return ventas
+
+    def leer_meses(self, meses):
+        """Leer las ventas de los meses indicados sin marcarlos como cargados"""
+        ventas = []
+        with open(self.ruta, "rb") as f:
+            for mes in sorted(meses):
+                if self.archivo is not None and self.archivo.vigente(mes, self.meses[mes]["ventas"]):
+                    # Los meses cerrados se leen del archivo columnar en vez del JSON
+                    ventas.extend(self.archivo.reconstruir_ventas(mes))
+                    continue
+                for inicio, fin in self.meses.get(mes, {}).get("rangos", []):
+                    ventas.extend(venta for _, _, venta in iterar_ventas_json(f, inicio, fin))
+        return ventas
+
+    def cargar_meses(self, meses):
+        """Leer las ventas de los meses indicados y marcarlos como cargados"""
+        ventas = self.leer_meses(meses)
+        self.cargados.update(meses)
+        return ventas
+
+    def meses_pendientes(self, desde=None, hasta=None):
+        """Meses aún no cargados que se cruzan con el rango de fechas [desde, hasta)"""
+        return sorted(mes for mes in self.meses
+                      if mes not in self.cargados
+                      and (desde is None or mes >= desde[:7])
+                      and (hasta is None or mes <= hasta[:7]))
+
+    def ventas_pendientes(self):
+        """Número de ventas en meses aún no cargados"""
+        return sum(datos["ventas"] for mes, datos in self.meses.items() if mes not in self.cargados)
+
+    def registrar_agregadas(self, ventas, posiciones):
+        """Actualizar el índice después de agregar ventas al final del archivo"""
+        for venta, (inicio, fin) in zip(ventas, posiciones):
+            mes = venta["fecha"][:7]
+            self._agregar_posicion(mes, inicio, fin)
+            self.cargados.add(mes)
+        self.guardar_indice()
+
+    def reconstruir(self, ventas, posiciones):
+        """Rehacer el índice después de reescribir el archivo completo"""
+        self.meses = {}
+        self.ultimo_mes = None
+        self.registrar_agregadas(ventas, posiciones)
+
+
+class ResumenVentas:
+    """Totales acumulados del historial completo: por día, por producto y por franja de la semana.
+
+    Por día guarda el número de ventas, el monto y las unidades de cada producto;
+    por producto, las unidades, el monto cobrado y el número de tickets; en
+    `mapa_calor`, las unidades y el monto de cada producto en las 168 franjas
+    (día de la semana × hora) de franja_semana; y en `pares`, cuántos tickets
+    llevan cada par de productos (matriz dispersa {a: {b: tickets}} con a < b).
+    Se actualiza con cada venta registrada, así los reportes no recorren el
+    historial. `ventas` permite comprobar al iniciar que el resumen guardado
+    corresponde al historial; si no, se reconstruye.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.dias = {}
+        self.productos = {}
+        self.mapa_calor = {}  # producto -> {"unidades": [168], "monto": [168]}
+        self.pares = {}
+        self.ventas = 0
+        self.vigente = False
+
+    def cargar(self):
+        """Leer el resumen guardado"""
+        if not os.path.exists(self.ruta):
+            return
+        with open(self.ruta, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        self.dias = datos["dias"]
+        self.productos = datos["productos"]
+        self.mapa_calor = datos["mapa_calor"]
+        self.pares = datos["pares"]
+        self.ventas = datos["ventas"]
+
+    def agregar(self, venta, inventario):
+        """Sumar una venta a su día y a cada uno de sus productos"""
+        dia = self.dias.get(venta["fecha"][:10])
+        if dia is None:
+            dia = self.dias[venta["fecha"][:10]] = {"count": 0, "total": 0, "productos": {}}
+        dia["count"] += 1
+        dia["total"] += venta["total"]
+
+        franja = franja_semana(fecha_a_epoch(venta["fecha"]))
+        detalle = venta.get("detalle", {})
+        for prod_key, cantidad in venta["productos"].items():
+            dia["productos"][prod_key] = dia["productos"].get(prod_key, 0) + cantidad
+
+            producto = self.productos.get(prod_key)
+            if producto is None:
+                producto = self.productos[prod_key] = {"nombre": prod_key, "unidad": "",
+                                                       "cantidad": 0, "monto": 0, "veces": 0}
+            if prod_key in inventario:
+                producto["nombre"] = inventario[prod_key]["nombre"]
+                producto["unidad"] = inventario[prod_key]["unidad"]
+            if prod_key in detalle:
+                subtotal = detalle[prod_key]["subtotal"]
+            else:
+                # Ventas anteriores sin precio registrado: se usa el precio actual
+                subtotal = cantidad * inventario[prod_key]["precio"] if prod_key in inventario else 0
+            producto["cantidad"] += cantidad
+            producto["monto"] += subtotal
+            producto["veces"] += 1
+
+            celdas = self.mapa_calor.get(prod_key)
+            if celdas is None:
+                celdas = self.mapa_calor[prod_key] = {"unidades": [0.0] * 168, "monto": [0.0] * 168}
+            celdas["unidades"][franja] += cantidad
+            celdas["monto"][franja] += subtotal
+        agregar_pares_canasta(self.pares, venta["productos"])
+        self.ventas += 1
+
+    def reconstruir(self, agrupaciones, inventario):
+        """Rehacer el resumen con las agrupaciones del historial completo (ver MotorReportes)"""
+        productos_por_dia = agrupaciones["dias_productos"]
+        self.dias = {fecha: {"count": datos["count"], "total": datos["total"],
+                             "productos": productos_por_dia.get(fecha, {})}
+                     for fecha, datos in agrupaciones["dias"].items()}
+        self.productos = {}
+        for clave, datos in agrupaciones["productos"].items():
+            producto = inventario.get(clave, {})
+            self.productos[clave] = {"nombre": producto.get("nombre", clave), "unidad": producto.get("unidad", ""),
+                                     **datos}
+        self.mapa_calor = agrupaciones["semana_productos"]
+        self.pares = agrupaciones["pares"]
+        self.ventas = agrupaciones["ventas"]
+        self.vigente = True
+
+    def mas_vendidos(self, k):
+        """Los `k` productos con más unidades vendidas, como pares (clave, datos)"""
+        return heapq.nlargest(k, self.productos.items(), key=lambda item: item[1]["cantidad"])
+
+    def instantanea(self):
+        """Copia para guardar en segundo plano mientras se siguen registrando ventas"""
+        return {"ventas": self.ventas,
+                "dias": {fecha: {"count": dia["count"], "total": dia["total"], "productos": dict(dia["productos"])}
+                         for fecha, dia in self.dias.items()},
+                "productos": {clave: dict(datos) for clave, datos in self.productos.items()},
+                "mapa_calor": {clave: {"unidades": list(celdas["unidades"]), "monto": list(celdas["monto"])}
+                               for clave, celdas in self.mapa_calor.items()},
+                "pares": {primero: dict(fila) for primero, fila in self.pares.items()}}
+
+    def conteos_canastas(self):
+        """(tickets, {conjunto: tickets}) de productos sueltos y pares, como contar_canastas_bloque"""
+        conteos = {(clave,): datos["veces"] for clave, datos in self.productos.items()}
+        for primero, fila in self.pares.items():
+            for segundo, tickets in fila.items():
+                conteos[(primero, segundo)] = tickets
+        return self.ventas, conteos
+
+
+class PronosticoDemanda:
+    """Demanda diaria de cada producto con suavizado exponencial estacional por día de la semana.
+
+    Por producto se guarda un nivel y un ajuste para cada día de la semana
+    (lunes = 0). El modelo se alimenta de los totales por día de ResumenVentas
+    y recuerda hasta qué día los incorporó (`hasta`), así cada actualización
+    solo procesa los días nuevos; todos los productos se actualizan a la vez.
+    `ventas_hasta` permite notar que el historial ya incorporado cambió (por
+    ejemplo al importar un respaldo) y volver a empezar.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Olvidar lo aprendido"""
+        self.productos = []
+        self.nivel = None  # [producto]
+        self.estacion = None  # [día de la semana][producto]
+        self.hasta = None
+        self.ventas_hasta = 0
+
+    def cargar(self):
+        """Leer el modelo guardado"""
+        if not os.path.exists(self.ruta):
+            return
+        with open(self.ruta, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        self.productos = datos["productos"]
+        self.nivel = datos["nivel"]
+        self.estacion = datos["estacion"]
+        self.hasta = datos["hasta"]
+        self.ventas_hasta = datos["ventas_hasta"]
+
+    def instantanea(self):
+        """Copia para guardar en segundo plano"""
+        return {"productos": list(self.productos), "hasta": self.hasta, "ventas_hasta": self.ventas_hasta,
+                "nivel": None if self.nivel is None else list(self.nivel),
+                "estacion": None if self.estacion is None else [list(fila) for fila in self.estacion]}
+
+    def actualizar(self, dias, hoy):
+        """Incorporar los días completos (anteriores a `hoy`) que el modelo aún no ha visto.
+
+        `dias` tiene el formato de ResumenVentas.dias; los días sin ventas
+        cuentan como demanda cero. Devuelve True si el modelo cambió.
+        """
+        if self.hasta is not None and self.ventas_hasta != sum(
+                datos["count"] for fecha, datos in dias.items() if fecha <= self.hasta):
+            self.reiniciar()
+
+        anteriores = [fecha for fecha in dias if fecha < hoy]
+        if not anteriores:
+            return False
+        primero = fecha_a_epoch(f"{self.hasta or min(anteriores)} 00:00:00") // 86400
+        if self.hasta is not None:
+            primero += 1
+        ultimo = fecha_a_epoch(f"{hoy} 00:00:00") // 86400 - 1
+        if primero > ultimo:
+            return False
+
+        numeros = range(primero, ultimo + 1)
+        fechas = [epoch_a_fecha(numero * 86400)[:10] for numero in numeros]
+        nuevos = {clave for fecha in fechas if fecha in dias for clave in dias[fecha]["productos"]}
+        productos = self.productos + sorted(nuevos.difference(self.productos))
+        filas = [[float(dias[fecha]["productos"].get(clave, 0)) if fecha in dias else 0.0 for clave in productos]
+                 for fecha in fechas]
+        semana = [(numero + 3) % 7 for numero in numeros]
+
+        if self.nivel is None:
+            # La primera semana completa da el nivel inicial y el ajuste de cada día
+            if len(filas) < 7:
+                return False
+            nivel = [sum(columna) / 7 for columna in zip(*filas[:7])]
+            estacion = [[0.0] * len(productos) for _ in range(7)]
+            for fila, dia in zip(filas[:7], semana[:7]):
+                estacion[dia] = [valor - n for valor, n in zip(fila, nivel)]
+            filas, semana = filas[7:], semana[7:]
+        else:
+            # Los productos nuevos empiezan sin demanda
+            faltan = len(productos) - len(self.productos)
+            nivel = list(self.nivel) + [0.0] * faltan
+            estacion = [list(fila) + [0.0] * faltan for fila in self.estacion]
+
+        alfa, gamma = SUAVIZADO_NIVEL, SUAVIZADO_ESTACION
+        if np is not None and filas:
+            nivel = np.asarray(nivel, dtype=np.float64)
+            estacion = np.asarray(estacion, dtype=np.float64).reshape(7, len(productos))
+            for fila, dia in zip(np.asarray(filas, dtype=np.float64), semana):
+                nuevo_nivel = alfa * (fila - estacion[dia]) + (1 - alfa) * nivel
+                estacion[dia] = gamma * (fila - nuevo_nivel) + (1 - gamma) * estacion[dia]
+                nivel = nuevo_nivel
+            nivel, estacion = nivel.tolist(), estacion.tolist()
+        else:
+            for fila, dia in zip(filas, semana):
+                ajuste = estacion[dia]
+                nuevo_nivel = [alfa * (y - a) + (1 - alfa) * n for y, a, n in zip(fila, ajuste, nivel)]
+                estacion[dia] = [gamma * (y - n) + (1 - gamma) * a for y, a, n in zip(fila, ajuste, nuevo_nivel)]
+                nivel = nuevo_nivel
+
+        self.productos, self.nivel, self.estacion = productos, nivel, estacion
+        self.hasta = fechas[-1]
+        self.ventas_hasta = sum(datos["count"] for fecha, datos in dias.items() if fecha <= self.hasta)
+        return True
+
+    def pronostico(self, fecha):
+        """{producto: demanda esperada} para el día `fecha` (YYYY-MM-DD); vacío sin una semana de datos"""
+        if self.nivel is None:
+            return {}
+        dia = (fecha_a_epoch(f"{fecha} 00:00:00") // 86400 + 3) % 7
+        return {clave: max(0.0, n + a) for clave, n, a in zip(self.productos, self.nivel, self.estacion[dia])}
+
+
+class CacheEstadisticas:
+    """Estadísticas calculadas una vez y reutilizadas mientras su colección no cambie.
+
+    Cada grupo de valores guarda la versión de la colección con la que se
+    calculó; si la versión actual es otra se recalcula al pedirlo. `ajustar`
+    permite actualizar los valores en lugar de invalidarlos (una venta).
+    """
+
+    def __init__(self):
+        self.grupos = {}  # colección -> (versión, valores)
+
+    def obtener(self, coleccion, version, calcular):
+        """Valores vigentes de `coleccion`, llamando a `calcular()` si no hay o son de otra versión"""
+        valores = self.vigentes(coleccion, version)
+        if valores is None:
+            valores = calcular()
+            self.guardar(coleccion, version, valores)
+        return valores
+
+    def vigentes(self, coleccion, version):
+        """Valores de `coleccion` calculados con `version`, o None"""
+        guardado = self.grupos.get(coleccion)
+        if guardado is None or guardado[0] != version:
+            return None
+        return guardado[1]
+
+    def guardar(self, coleccion, version, valores):
+        """Guardar valores calculados aparte (por ejemplo en otro hilo) con la versión que tenían los datos"""
+        self.grupos[coleccion] = (version, valores)
+
+    def ajustar(self, coleccion, version_anterior, version_nueva, ajuste):
+        """Aplicar `ajuste(valores)` si estaban vigentes en `version_anterior` y pasarlos a la nueva"""
+        guardado = self.grupos.get(coleccion)
+        if guardado is not None and guardado[0] == version_anterior:
+            ajuste(guardado[1])
+            self.grupos[coleccion] = (version_nueva, guardado[1])
+
+
+class PersistenciaEnSegundoPlano:
+    """Hilo que guarda en disco las colecciones marcadas como modificadas.
+
+    Varias marcas seguidas de la misma colección se juntan en una sola escritura
+    con la última copia recibida. En lugar de la copia puede recibirse una
+    función que la produce: se llama en este hilo justo antes de escribir, así
+    una colección grande que cambia seguido se copia una vez por escritura y no
+    una vez por cambio. Los errores se envían a la interfaz desde el hilo
+    principal mediante `root.after`.
+    """
+
+    def __init__(self, root, al_error, demora=DEMORA_GUARDADO):
+        self.root = root
+        self.al_error = al_error
+        self.demora = demora
+        self.escritores = {}
+        self.pendientes = {}
+        self.errores = queue.Queue()
+        self.condicion = threading.Condition()
+        self.escribiendo = False
+        self.activo = True
+
+        self.hilo = threading.Thread(target=self._trabajar, name="persistencia", daemon=True)
+        self.hilo.start()
+        self.root.after(250, self._revisar_errores)
+
+    def registrar_escritor(self, coleccion, funcion):
+        """Asociar a una colección la función que la escribe a disco"""
+        self.escritores[coleccion] = funcion
+
+    def marcar_sucio(self, coleccion, instantanea):
+        """Avisar que `coleccion` cambió; `instantanea` es la copia que se guardará (o la función que la da)"""
+        with self.condicion:
+            self.pendientes[coleccion] = instantanea
+            self.condicion.notify()
+
+    def _trabajar(self):
+        while True:
+            with self.condicion:
+                while self.activo and not self.pendientes:
+                    self.condicion.wait()
+                if not self.activo and not self.pendientes:
+                    return
+
+            # Esperar un poco para juntar una ráfaga de cambios en una sola escritura
+            if self.activo:
+                time.sleep(self.demora)
+
+            with self.condicion:
+                lote = self.pendientes
+                self.pendientes = {}
+                self.escribiendo = True
+
+            for coleccion, instantanea in lote.items():
+                try:
+                    if callable(instantanea):
+                        instantanea = instantanea()
+                    self.escritores[coleccion](instantanea)
+                except Exception as e:
+                    self.errores.put((coleccion, e))
+
+            with self.condicion:
+                self.escribiendo = False
+                self.condicion.notify_all()
+
+    def _revisar_errores(self):
+        try:
+            while True:
+                coleccion, error = self.errores.get_nowait()
+                self.al_error(coleccion, error)
+        except queue.Empty:
+            pass
+
+        if self.activo:
+            try:
+                self.root.after(250, self._revisar_errores)
+            except tk.TclError:
+                pass
+
+    def detener(self):
+        """Escribir lo pendiente y terminar el hilo"""
+        with self.condicion:
+            self.activo = False
+            self.condicion.notify_all()
+        self.hilo.join(timeout=10)
+
+
+class EjecutorTareas:
+    """Hilo que lee los datos al iniciar y calcula los reportes sin bloquear la interfaz.
+
+    Las tareas se calculan una tras otra; su resultado (o su error) vuelve al
+    hilo principal mediante `root.after`, que revisa la cola de resultados solo
+    mientras quedan tareas pendientes.
+    """
+
+    def __init__(self, root, intervalo=INTERVALO_RESULTADOS):
+        self.root = root
+        self.intervalo = intervalo
+        self.tareas = queue.Queue()
+        self.resultados = queue.Queue()
+        self.pendientes = 0
+        self.revisando = False
+
+        self.hilo = threading.Thread(target=self._trabajar, name="reportes", daemon=True)
+        self.hilo.start()
+
+    def enviar(self, calcular, al_terminar, al_fallar=None):
+        """Ejecutar `calcular()` en el hilo de tareas y luego `al_terminar(resultado)` en el hilo principal.
+
+        Si `calcular` lanza una excepción se llama `al_fallar(error)`.
+        """
+        self.pendientes += 1
+        self.tareas.put((calcular, al_terminar, al_fallar))
+        if not self.revisando:
+            self.revisando = True
+            self.root.after(self.intervalo, self._revisar_resultados)
+
+    def _trabajar(self):
+        while True:
+            tarea = self.tareas.get()
+            if tarea is None:
+                return
+            calcular, al_terminar, al_fallar = tarea
+            try:
+                self.resultados.put((al_terminar, calcular()))
+            except Exception as e:
+                self.resultados.put((al_fallar, e))
+
+    def _revisar_resultados(self):
+        try:
+            while True:
+                funcion, valor = self.resultados.get_nowait()
+                self.pendientes -= 1
+                if funcion is None:
+                    print(f"Error en tarea de segundo plano: {valor}")
+                    continue
+                try:
+                    funcion(valor)
+                except Exception as e:
+                    print(f"Error al mostrar el resultado de una tarea: {e}")
+        except queue.Empty:
+            pass
+
+        self.revisando = self.pendientes > 0
+        if self.revisando:
+            try:
+                self.root.after(self.intervalo, self._revisar_resultados)
+            except tk.TclError:
+                self.revisando = False
+
+    def detener(self, esperar=False):
+        """Terminar el hilo después de la tarea en curso (`esperar`: hasta que termine)"""
+        self.tareas.put(None)
+        if esperar:
+            self.hilo.join()
+
+
+class PerfilInicio:
+    """Tiempos del arranque, para la opción --profile-startup.
+
+    `medir` anota la duración de una etapa (puede llamarse desde el hilo de
+    tareas) y `marcar` el tiempo transcurrido desde que se creó el perfil
+    hasta un momento dado, como el primer dibujo de la ventana.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.etapas = []    # (etapa, segundos)
+        self.marcas = []    # (momento, segundos desde el inicio)
+
+    @contextmanager
+    def medir(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.etapas.append((etapa, time.perf_counter() - inicio))
+
+    def marcar(self, momento):
+        self.marcas.append((momento, time.perf_counter() - self.inicio))
+
+    def reporte(self):
+        """Texto con la duración de cada etapa y los momentos marcados, en milisegundos"""
+        lineas = ["Arranque (ms):"]
+        lineas += [f"  {etapa:<30}{segundos * 1000:10.1f}" for etapa, segundos in self.etapas]
+        lineas += [f"  {momento:<30}{segundos * 1000:10.1f}  desde el inicio" for momento, segundos in self.marcas]
+        return "\n".join(lineas)
+
+
+class VentasParticionadas:
+    """Ventas guardadas en un archivo JSON Lines por día: `directorio/AAAA/MM/DD.jsonl`.
+
+    Un manifiesto pequeño guarda por día el número de ventas, el monto y el
+    tamaño del archivo, de modo que una consulta por fechas abre solo las
+    particiones de su rango. Ofrece la misma interfaz por meses que
+    CargadorHistorial para la carga perezosa del historial.
+    """
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self.ruta_manifiesto = os.path.join(directorio, "manifiesto.json")
+        self.dias = {}   # "YYYY-MM-DD" -> {"ventas": n, "total": monto, "bytes": tamaño}
+        self.meses = {}  # "YYYY-MM" -> {"ventas": n}
+        self.cargados = set()
+        self.archivo = None  # ArchivoColumnar opcional para meses cerrados
+
+    def ruta_dia(self, dia):
+        anio, mes, num_dia = dia.split("-")
+        return os.path.join(self.directorio, anio, mes, num_dia + ".jsonl")
+
+    def _recalcular_meses(self):
+        self.meses = {}
+        for dia, datos in self.dias.items():
+            self.meses.setdefault(dia[:7], {"ventas": 0})["ventas"] += datos["ventas"]
+
+    def _listar_particiones(self):
+        """Tamaño de cada partición presente en disco"""
+        particiones = {}
+        if not os.path.isdir(self.directorio):
+            return particiones
+        for anio in os.scandir(self.directorio):
+            if not anio.is_dir():
+                continue
+            for mes in os.scandir(anio.path):
+                if not mes.is_dir():
+                    continue
+                for archivo in os.scandir(mes.path):
+                    if archivo.name.endswith(".jsonl"):
+                        dia = f"{anio.name}-{mes.name}-{archivo.name[:-6]}"
+                        particiones[dia] = archivo.stat().st_size
+        return particiones
+
+    def leer_dia(self, dia):
+        """Ventas de una partición (una última línea dañada se recorta)"""
+        return DiarioVentas(self.ruta_dia(dia)).leer()
+
+    def abrir(self):
+        """Leer el manifiesto y corregirlo con las particiones que hay en disco.
+
+        Devuelve True si el manifiesto tuvo que corregirse.
+        """
+        self._recuperar_reescritura()
+        self.dias = {}
+        self.cargados = set()
+        if os.path.exists(self.ruta_manifiesto):
+            try:
+                with open(self.ruta_manifiesto, "r", encoding="utf-8") as f:
+                    self.dias = json.load(f)["dias"]
+            except (ValueError, KeyError) as e:
+                print(f"Manifiesto de ventas dañado, se reconstruye: {e}")
+
+        corregido = False
+        en_disco = self._listar_particiones()
+        for dia in list(self.dias):
+            if dia not in en_disco:
+                del self.dias[dia]
+                corregido = True
+        for dia, tamano in en_disco.items():
+            if self.dias.get(dia, {}).get("bytes") != tamano:
+                # Solo se vuelven a leer las particiones que cambiaron desde el último manifiesto
+                ventas = self.leer_dia(dia)
+                self.dias[dia] = {"ventas": len(ventas),
+                                  "total": sum(v["total"] for v in ventas),
+                                  "bytes": os.path.getsize(self.ruta_dia(dia))}
+                corregido = True
+
+        self._recalcular_meses()
+        return corregido
+
+    def _recuperar_reescritura(self):
+        """Terminar o deshacer una reescritura que se interrumpió (ver confirmar_reescritura)"""
+        anterior = self.directorio + ".old"
+        if os.path.isdir(anterior):
+            if os.path.isdir(self.directorio):
+                # Las particiones nuevas ya estaban en su lugar; solo faltaba borrar las anteriores
+                shutil.rmtree(anterior, ignore_errors=True)
+            else:
+                # Se interrumpió entre los dos renombres: se vuelve a las particiones anteriores
+                os.replace(anterior, self.directorio)
+        # Particiones preparadas que nunca se confirmaron
+        shutil.rmtree(self.directorio + ".tmp", ignore_errors=True)
+
+    def existe(self):
+        """Indica si ya hay ventas particionadas o un manifiesto"""
+        return bool(self.dias) or os.path.exists(self.ruta_manifiesto)
+
+    def agregar(self, venta):
+        """Agregar una venta al final de la partición de su día y forzarla a disco"""
+        dia = venta["fecha"][:10]
+        ruta = self.ruta_dia(dia)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        linea = (json.dumps(venta, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(ruta, "ab") as f:
+            f.write(linea)
+            f.flush()
+            os.fsync(f.fileno())
+
+        datos = self.dias.setdefault(dia, {"ventas": 0, "total": 0, "bytes": 0})
+        datos["ventas"] += 1
+        datos["total"] += venta["total"]
+        datos["bytes"] += len(linea)
+        self.meses.setdefault(dia[:7], {"ventas": 0})["ventas"] += 1
+        self.cargados.add(dia[:7])
+
+    def manifiesto(self):
+        """Copia del manifiesto para guardarla en segundo plano"""
+        return {"dias": copy.deepcopy(self.dias)}
+
+    def guardar_manifiesto(self, manifiesto):
+        escribir_json_atomico(self.ruta_manifiesto, manifiesto)
+
+    def dias_en_rango(self, desde, hasta):
+        """Días con partición que se cruzan con [desde, hasta)"""
+        return sorted(dia for dia in self.dias if desde[:10] <= dia < hasta)
+
+    def leer_rango(self, desde, hasta):
+        """Ventas con `desde <= fecha < hasta` abriendo solo las particiones del rango"""
+        ventas = []
+        for dia in self.dias_en_rango(desde, hasta):
+            ventas.extend(v for v in self.leer_dia(dia) if desde <= v["fecha"] < hasta)
+        return ventas
+
+    def cargar_recientes(self, desde_mes):
+        """Leer las ventas de los meses >= `desde_mes`; el resto queda pendiente"""
+        return self.cargar_meses([mes for mes in self.meses if mes >= desde_mes])
+
+    def leer_meses(self, meses):
+        """Leer las ventas de los meses indicados sin marcarlos como cargados"""
+        ventas = []
+        for mes in sorted(meses):
+            if self.archivo is not None and self.archivo.vigente(mes, self.meses[mes]["ventas"]):
+                ventas.extend(self.archivo.reconstruir_ventas(mes))
+                continue
+            for dia in sorted(d for d in self.dias if d.startswith(mes)):
+                ventas.extend(self.leer_dia(dia))
+        return ventas
+
+    def cargar_meses(self, meses):
+        """Leer las ventas de los meses indicados y marcarlos como cargados"""
+        ventas = self.leer_meses(meses)
+        self.cargados.update(meses)
+        return ventas
+
+    def meses_pendientes(self, desde=None, hasta=None):
+        """Meses aún no cargados que se cruzan con el rango de fechas [desde, hasta)"""
+        return sorted(mes for mes in self.meses
+                      if mes not in self.cargados
+                      and (desde is None or mes >= desde[:7])
+                      and (hasta is None or mes <= hasta[:7]))
+
+    def ventas_pendientes(self):
+        """Número de ventas en meses aún no cargados"""
+        return sum(datos["ventas"] for mes, datos in self.meses.items() if mes not in self.cargados)
+
+    def reescribir(self, ventas):
+        """Reemplazar todas las particiones con el historial dado (importación o migración)"""
+        self.confirmar_reescritura(self.preparar_reescritura(ventas))
+
+    def preparar_reescritura(self, ventas):
+        """Escribir las particiones nuevas en un directorio temporal (puede hacerse en otro hilo)"""
+        temporal = self.directorio + ".tmp"
+        shutil.rmtree(temporal, ignore_errors=True)
+        os.makedirs(temporal)
+        destino = VentasParticionadas(temporal)
+        por_dia = defaultdict(list)
+        for venta in ventas:
+            por_dia[venta["fecha"][:10]].append(venta)
+        for dia, ventas_dia in por_dia.items():
+            ruta = destino.ruta_dia(dia)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            contenido = "".join(json.dumps(v, ensure_ascii=False) + "\n" for v in ventas_dia).encode("utf-8")
+            with open(ruta, "wb") as f:
+                f.write(contenido)
+                f.flush()
+                os.fsync(f.fileno())
+            destino.dias[dia] = {"ventas": len(ventas_dia),
+                                 "total": sum(v["total"] for v in ventas_dia),
+                                 "bytes": len(contenido)}
+        escribir_json_atomico(destino.ruta_manifiesto, destino.manifiesto())
+        return destino.dias
+
+    def confirmar_reescritura(self, dias):
+        """Reemplazar las particiones actuales por las preparadas.
+
+        Las actuales se apartan con un renombre antes de poner las nuevas, así
+        que en disco siempre queda uno de los dos directorios; abrir() recupera
+        una reescritura interrumpida.
+        """
+        anterior = self.directorio + ".old"
+        shutil.rmtree(anterior, ignore_errors=True)
+        if os.path.isdir(self.directorio):
+            os.replace(self.directorio, anterior)
+        os.replace(self.directorio + ".tmp", self.directorio)
+        shutil.rmtree(anterior, ignore_errors=True)
+        self.dias = dias
+        self._recalcular_meses()
+        self.cargados = set(self.meses)
+
+
+@contextmanager
+def abrir_respaldo(ruta):
+    """Abrir un respaldo en modo texto detectando si está comprimido con gzip o lzma.
+
+    Produce (texto, crudo); `crudo.tell()` indica cuántos bytes del archivo
+    se han leído, útil para mostrar el avance.
+    """
+    with open(ruta, "rb") as crudo:
+        firma = crudo.read(6)
+        crudo.seek(0)
+        if firma.startswith(b"\x1f\x8b"):
+            flujo = gzip.GzipFile(fileobj=crudo, mode="rb")
+        elif firma.startswith(b"\xfd7zXZ\x00"):
+            flujo = lzma.LZMAFile(crudo, "rb")
+        else:
+            flujo = crudo
+        texto = io.TextIOWrapper(flujo, encoding="utf-8")
+        try:
+            yield texto, crudo
+        finally:
+            texto.detach()
+            if flujo is not crudo:
+                flujo.close()
+
+
+def escribir_respaldo(ruta, encabezado, ventas, compresion=COMPRESION_RESPALDOS):
+    """Escribir un respaldo comprimido enviando las ventas una por una al archivo.
+
+    El historial va al final del objeto JSON para que pueda leerse en orden
+    sin cargar todo el archivo.
+    """
+    abrir = lzma.open if compresion == "lzma" else gzip.open
+    temporal = ruta + ".tmp"
+    with abrir(temporal, "wt", encoding="utf-8") as f:
+        f.write("{\n")
+        for clave, valor in encabezado.items():
+            f.write(f"{json.dumps(clave)}: {json.dumps(valor, ensure_ascii=False)},\n")
+        f.write('"historial_ventas": [')
+        for i, venta in enumerate(ventas):
+            f.write(",\n" if i else "\n")
+            f.write(json.dumps(venta, ensure_ascii=False))
+        f.write("\n]\n}\n")
+    os.replace(temporal, ruta)
+
+
+class LectorJSONIncremental:
+    """Lector de JSON por bloques para recorrer archivos grandes sin cargarlos completos"""
+
+    def __init__(self, f, tam_bloque=1 << 16):
+        self.f = f
+        self.tam_bloque = tam_bloque
+        self.buffer = ""
+        self.pos = 0
+        self.agotado = False
+        self.decodificador = json.JSONDecoder()
+
+    def _leer_mas(self):
+        datos = self.f.read(self.tam_bloque)
+        self.agotado = not datos
+        self.buffer = self.buffer[self.pos:] + datos
+        self.pos = 0
+        return not self.agotado
+
+    def _saltar_espacios(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._leer_mas():
+                return
+
+    def siguiente_es(self, caracter):
+        """Consumir `caracter` si es lo que sigue (sin contar espacios)"""
+        self._saltar_espacios()
+        if self.buffer.startswith(caracter, self.pos):
+            self.pos += 1
+            return True
+        return False
+
+    def esperar(self, caracter):
+        if not self.siguiente_es(caracter):
+            raise ValueError(f"Formato de respaldo inválido: se esperaba '{caracter}'")
+
+    def leer_valor(self):
+        """Leer el siguiente valor JSON completo (objeto, cadena, número...)"""
+        self._saltar_espacios()
+        while True:
+            try:
+                valor, fin = self.decodificador.raw_decode(self.buffer, self.pos)
+                # Un número cortado por el bloque ("1." de "1.5") se decodifica sin error;
+                # solo se acepta el valor si después viene un separador
+                if self.agotado or (fin < len(self.buffer) and self.buffer[fin] in ",:]} \t\r\n"):
+                    self.pos = fin
+                    return valor
+            except json.JSONDecodeError:
+                if self.agotado:
+                    raise
+            self._leer_mas()
+
+
+def iterar_respaldo(f):
+    """Recorrer un respaldo produciendo ("venta", venta) por cada venta y (clave, valor) por el resto"""
+    lector = LectorJSONIncremental(f)
+    lector.esperar("{")
+    if lector.siguiente_es("}"):
+        return
+    while True:
+        clave = lector.leer_valor()
+        lector.esperar(":")
+        if clave == "historial_ventas":
+            lector.esperar("[")
+            if not lector.siguiente_es("]"):
+                while True:
+                    yield "venta", lector.leer_valor()
+                    if lector.siguiente_es("]"):
+                        break
+                    lector.esperar(",")
+        else:
+            yield clave, lector.leer_valor()
+        if lector.siguiente_es("}"):
+            return
+        lector.esperar(",")
+
+
+def rutas_cadena_respaldos(ruta):
+    """Rutas de la cadena de respaldos desde el completo hasta `ruta`, leyendo solo encabezados"""
+    rutas = []
+    actual = ruta
+    while True:
+        rutas.append(actual)
+        encabezado = {}
+        with abrir_respaldo(actual) as (texto, _):
+            for clave, valor in iterar_respaldo(texto):
+                if clave == "venta":
+                    break
+                encabezado[clave] = valor
+        if encabezado.get("tipo") != "incremental":
+            break
+
+        # El respaldo anterior se busca primero junto a este y luego en su ruta original
+        anterior = os.path.join(os.path.dirname(actual), encabezado["anterior"])
+        if not os.path.exists(anterior):
+            anterior = encabezado.get("ruta_anterior", anterior)
+        if not os.path.exists(anterior):
+            raise FileNotFoundError(f"No se encontró el respaldo anterior: {encabezado['anterior']}")
+        actual = anterior
+
+    rutas.reverse()
+    return rutas
+
+
+def validar_venta(venta):
+    """Devolver un mensaje si la venta no tiene la estructura esperada, o None si es válida"""
+    if not isinstance(venta, dict):
+        return "no es un objeto"
+    for campo in ("fecha", "cliente", "vendedor"):
+        if not isinstance(venta.get(campo), str):
+            return f"campo '{campo}' ausente o inválido"
+    try:
+        datetime.strptime(venta["fecha"], "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return f"fecha inválida '{venta['fecha']}'"
+    if not isinstance(venta.get("total"), (int, float)) or venta["total"] < 0:
+        return "total inválido"
+    productos = venta.get("productos")
+    if not isinstance(productos, dict):
+        return "lista de productos inválida"
+    for clave, cantidad in productos.items():
+        if not isinstance(cantidad, (int, float)) or cantidad <= 0:
+            return f"cantidad inválida para '{clave}'"
+    detalle = venta.get("detalle", {})
+    if not isinstance(detalle, dict):
+        return "detalle de precios inválido"
+    for clave, linea in detalle.items():
+        if (clave not in productos or not isinstance(linea, dict)
+                or not all(isinstance(linea.get(campo), (int, float)) for campo in ("precio", "subtotal"))):
+            return f"precio inválido para '{clave}'"
+    return None
+
+
+class ImportacionCancelada(Exception):
+    """El usuario canceló la importación de un respaldo"""
+
+
+def aplicar_cadena_respaldos(rutas, al_avance=None, cancelado=None):
+    """Reconstruir (inventario, historial_ventas, usuarios_sistema, errores) leyendo la cadena por partes.
+
+    Cada venta se valida al leerla; las inválidas se omiten y se describen en
+    `errores`. `al_avance(bytes_leidos, bytes_totales, ventas)` se llama cada
+    cierto número de ventas y `cancelado` (un threading.Event) detiene la lectura.
+    """
+    total_bytes = sum(os.path.getsize(ruta) for ruta in rutas) or 1
+    bytes_previos = 0
+    inventario = usuarios = id_completo = None
+    historial = []
+    errores = []
+
+    for numero, ruta in enumerate(rutas):
+        encabezado = {}
+        with abrir_respaldo(ruta) as (texto, crudo):
+            for clave, valor in iterar_respaldo(texto):
+                if clave != "venta":
+                    encabezado[clave] = valor
+                    continue
+                error = validar_venta(valor)
+                if error:
+                    errores.append(f"{os.path.basename(ruta)}, venta {len(historial) + len(errores) + 1}: {error}")
+                else:
+                    historial.append(valor)
+                if (len(historial) + len(errores)) % 1000 == 0:
+                    if cancelado is not None and cancelado.is_set():
+                        raise ImportacionCancelada()
+                    if al_avance:
+                        al_avance(bytes_previos + crudo.tell(), total_bytes, len(historial))
+        bytes_previos += os.path.getsize(ruta)
+
+        if numero == 0:
+            if (not isinstance(encabezado.get("inventario"), dict)
+                    or not isinstance(encabezado.get("usuarios_sistema"), dict)):
+                raise ValueError("Archivo de respaldo inválido")
+            inventario = encabezado["inventario"]
+            usuarios = encabezado["usuarios_sistema"]
+            id_completo = encabezado.get("id")
+            continue
+
+        if encabezado.get("base") != id_completo:
+            raise ValueError("La cadena de respaldos incrementales no corresponde al respaldo completo")
+        inventario.update(encabezado["inventario_cambios"])
+        for clave in encabezado["inventario_eliminados"]:
+            inventario.pop(clave, None)
+        usuarios = encabezado["usuarios_sistema"]
+
+    if al_avance:
+        al_avance(total_bytes, total_bytes, len(historial))
+    return inventario, historial, usuarios, errores
+
+
+def fecha_a_epoch(fecha):
+    """Convertir "YYYY-MM-DD HH:MM:SS" a segundos (la hora local se trata como UTC)"""
+    # Cortar la cadena es varias veces más rápido que strptime y el formato es fijo
+    return calendar.timegm((int(fecha[0:4]), int(fecha[5:7]), int(fecha[8:10]),
+                            int(fecha[11:13]), int(fecha[14:16]), int(fecha[17:19])))
+
+
+def mes_siguiente(mes):
+    """Mes posterior a "YYYY-MM" en el mismo formato"""
+    año, numero = int(mes[:4]), int(mes[5:7])
+    return f"{año + numero // 12:04d}-{numero % 12 + 1:02d}"
+
+
+def franja_semana(segundos):
+    """Posición 0..167 (día de la semana * 24 + hora, con lunes = 0) de una fecha en segundos"""
+    # El 1 de enero de 1970 fue jueves (día 3 contando desde el lunes)
+    return (segundos // 86400 + 3) % 7 * 24 + segundos % 86400 // 3600
+
+
+def limite_a_epoch(limite):
+    """Convertir un límite de rango ("", "YYYY", "YYYY-MM-DD", ...) a segundos completando lo que falte"""
+    return fecha_a_epoch(limite + "0001-01-01 00:00:00"[len(limite):])
+
+
+def epoch_a_fecha(segundos):
+    """Convertir segundos a "YYYY-MM-DD HH:MM:SS" (inverso de fecha_a_epoch)"""
+    return (datetime(1970, 1, 1) + timedelta(seconds=segundos)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class IndiceTemporal:
+    """Índice por fecha de una lista de ventas en orden cronológico.
+
+    `segundos[i]` es la fecha de ventas[i]; un rango [desde, hasta) se resuelve
+    con dos búsquedas binarias. Si la lista cambia por fuera del índice (se
+    cargan meses anteriores o se importa un respaldo) se rehace al consultarlo.
+    """
+
+    def __init__(self):
+        self.ventas = None
+        self.segundos = array("q")
+
+    def sincronizar(self, ventas):
+        """Rehacer el índice si `ventas` no es la lista indexada o cambió de tamaño"""
+        if ventas is not self.ventas or len(ventas) != len(self.segundos):
+            self.ventas = ventas
+            self.segundos = array("q", (fecha_a_epoch(v["fecha"]) for v in ventas))
+            # Una venta con la hora del equipo atrasada puede haber quedado fuera de orden
+            if any(a > b for a, b in zip(self.segundos, self.segundos[1:])):
+                ventas.sort(key=lambda v: v["fecha"])
+                self.segundos = array("q", sorted(self.segundos))
+
+    def agregar(self, ventas, venta):
+        """Insertar una venta en la lista y en el índice sin romper el orden"""
+        self.sincronizar(ventas)
+        segundos = fecha_a_epoch(venta["fecha"])
+        # Casi siempre es la venta más reciente y se agrega al final
+        posicion = bisect.bisect_right(self.segundos, segundos)
+        ventas.insert(posicion, venta)
+        self.segundos.insert(posicion, segundos)
+
+    def rango(self, ventas, desde, hasta):
+        """Ventas con `desde <= fecha < hasta`"""
+        self.sincronizar(ventas)
+        inicio = bisect.bisect_left(self.segundos, limite_a_epoch(desde))
+        fin = bisect.bisect_left(self.segundos, limite_a_epoch(hasta), inicio)
+        return ventas[inicio:fin]
+
+
+def normalizar_busqueda(texto):
+    """Texto en minúsculas y sin acentos para buscar ("Chicharrón" -> "chicharron")"""
+    texto = unicodedata.normalize("NFD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def palabras_busqueda(texto):
+    """Palabras (letras y números) del texto normalizado"""
+    return "".join(c if c.isalnum() else " " for c in normalizar_busqueda(texto)).split()
+
+
+class IndiceBusqueda:
+    """Índice de prefijos y trigramas sobre nombre, descripción y categoría de los productos.
+
+    Un término de una o dos letras se busca como inicio de palabra; uno más
+    largo, en cualquier parte de una palabra, intersecando los productos de sus
+    trigramas y confirmando la coincidencia. Un producto coincide si contiene
+    todos los términos. Si el inventario se reemplaza o cambia de tamaño por
+    fuera del índice, se rehace al consultarlo.
+    """
+
+    def __init__(self):
+        self.inventario = None
+        self.palabras = {}                  # clave -> palabras del producto
+        self.prefijos = defaultdict(set)    # primeras 1 o 2 letras -> claves
+        self.trigramas = defaultdict(set)   # trigrama -> claves
+
+    def sincronizar(self, inventario):
+        """Rehacer el índice si `inventario` no es el indexado o cambió de tamaño"""
+        if inventario is not self.inventario or len(inventario) != len(self.palabras):
+            self.inventario = inventario
+            self.palabras = {}
+            self.prefijos = defaultdict(set)
+            self.trigramas = defaultdict(set)
+            for clave, producto in inventario.items():
+                self.actualizar(clave, producto)
+
+    def _entradas(self, palabras):
+        for palabra in palabras:
+            yield self.prefijos, palabra[:1]
+            if len(palabra) > 1:
+                yield self.prefijos, palabra[:2]
+            for i in range(len(palabra) - 2):
+                yield self.trigramas, palabra[i:i + 3]
+
+    def actualizar(self, clave, producto):
+        """Indexar (o volver a indexar) un producto nuevo o modificado"""
+        self.quitar(clave)
+        texto = " ".join((producto.get("nombre", ""), producto.get("descripcion", ""), producto.get("categoria", "")))
+        palabras = set(palabras_busqueda(texto))
+        self.palabras[clave] = palabras
+        for tabla, llave in self._entradas(palabras):
+            tabla[llave].add(clave)
+
+    def quitar(self, clave):
+        """Sacar un producto del índice"""
+        for tabla, llave in self._entradas(self.palabras.pop(clave, ())):
+            claves = tabla.get(llave)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del tabla[llave]
+
+    def buscar(self, inventario, consulta):
+        """Claves de los productos que contienen todos los términos de `consulta` (None si no hay términos)"""
+        self.sincronizar(inventario)
+        terminos = palabras_busqueda(consulta)
+        if not terminos:
+            return None
+
+        # Los términos largos primero: suelen dejar menos candidatos
+        coincidencias = None
+        for termino in sorted(set(terminos), key=len, reverse=True):
+            if len(termino) <= 2:
+                candidatos = self.prefijos.get(termino, set())
+            else:
+                grupos = sorted((self.trigramas.get(termino[i:i + 3], set()) for i in range(len(termino) - 2)),
+                                key=len)
+                candidatos = grupos[0].intersection(*grupos[1:])
+                # Con más de un trigrama pueden venir de palabras distintas del mismo producto
+                if len(grupos) > 1:
+                    candidatos = {clave for clave in candidatos
+                                  if any(termino in palabra for palabra in self.palabras[clave])}
+            coincidencias = candidatos if coincidencias is None else coincidencias & candidatos
+            if not coincidencias:
+                break
+        return coincidencias
+
+
+def normalizar_plu(codigo):
+    """Código PLU sin espacios ni ceros a la izquierda ("007" -> "7")"""
+    codigo = codigo.strip()
+    return str(int(codigo)) if codigo.isdigit() else codigo
+
+
+class IndicePLU:
+    """Código PLU corto -> clave del producto, para cobrar tecleando el código.
+
+    Como IndiceBusqueda, se rehace al consultarlo si el inventario se reemplazó
+    o cambió de tamaño por fuera del índice.
+    """
+
+    def __init__(self):
+        self.inventario = None
+        self.claves = {}    # código -> clave
+        self.codigos = {}   # clave -> código ('' si el producto no tiene)
+
+    def sincronizar(self, inventario):
+        """Rehacer el índice si `inventario` no es el indexado o cambió de tamaño"""
+        if inventario is not self.inventario or len(inventario) != len(self.codigos):
+            self.inventario = inventario
+            self.claves = {}
+            self.codigos = {}
+            for clave, producto in inventario.items():
+                self.actualizar(clave, producto)
+
+    def actualizar(self, clave, producto):
+        """Indexar el código de un producto nuevo o modificado"""
+        anterior = self.codigos.pop(clave, "")
+        if self.claves.get(anterior) == clave:
+            del self.claves[anterior]
+        codigo = producto.get("plu", "")
+        self.codigos[clave] = codigo
+        if codigo:
+            self.claves[codigo] = clave
+
+    def buscar(self, inventario, codigo):
+        """Clave del producto con ese código (None si no hay)"""
+        self.sincronizar(inventario)
+        return self.claves.get(normalizar_plu(codigo))
+
+    def siguiente(self, inventario):
+        """Código numérico libre que sigue al mayor en uso"""
+        self.sincronizar(inventario)
+        return str(max((int(codigo) for codigo in self.claves if codigo.isdigit()), default=0) + 1)
+
+
+class AnaliticaVentas:
+    """Ventas en arreglos por columna para agrupar todo el historial de una vez.
+
+    Cada venta ocupa una posición en `segundos`, `totales` y `codigos_vendedor`;
+    cada línea de producto, una posición en los arreglos `lineas_*`. Con NumPy
+    las agrupaciones son np.bincount sobre esos arreglos; sin NumPy se recorren
+    en Python y el resultado es el mismo.
+    """
+
+    def __init__(self, precios=None):
+        # Precio actual de cada producto, para las líneas sin subtotal registrado
+        self.precios = precios or {}
+        self.vendedores = {}
+        self.productos = {}
+        self.segundos = array("q")
+        self.totales = array("d")
+        self.codigos_vendedor = array("i")
+        self.lineas_venta = array("q")      # posición de la venta de cada línea
+        self.lineas_producto = array("i")
+        self.lineas_cantidad = array("d")
+        self.lineas_subtotal = array("d")   # NaN si la venta no registró el precio
+
+    def agregar_ventas(self, ventas):
+        """Agregar ventas en forma de diccionario"""
+        for venta in ventas:
+            posicion = len(self.segundos)
+            self.segundos.append(fecha_a_epoch(venta["fecha"]))
+            self.totales.append(venta["total"])
+            self.codigos_vendedor.append(self.vendedores.setdefault(venta["vendedor"], len(self.vendedores)))
+            detalle = venta.get("detalle", {})
+            for clave, cantidad in venta["productos"].items():
+                self.lineas_venta.append(posicion)
+                self.lineas_producto.append(self.productos.setdefault(clave, len(self.productos)))
+                self.lineas_cantidad.append(cantidad)
+                self.lineas_subtotal.append(detalle[clave]["subtotal"] if clave in detalle else math.nan)
+
+    def agregar_columnas(self, columnas, diccionarios):
+        """Agregar un mes del archivo columnar sin pasar por diccionarios de venta"""
+        vendedores = [self.vendedores.setdefault(n, len(self.vendedores)) for n in diccionarios["vendedores"]]
+        productos = [self.productos.setdefault(n, len(self.productos)) for n in diccionarios["productos"]]
+        base = len(self.segundos)
+        self.segundos.frombytes(columnas["fechas"].tobytes())
+        self.totales.frombytes(columnas["totales"].tobytes())
+        self.lineas_cantidad.frombytes(columnas["cantidades"].tobytes())
+        self.lineas_subtotal.frombytes(columnas["subtotales"].tobytes())
+
+        inicio_lineas = columnas["inicio_lineas"]
+        if np is not None:
+            # Los códigos del mes se traducen a los códigos globales con una sola indexación
+            codigos = np.asarray(vendedores, dtype=np.int32)[np.frombuffer(columnas["vendedores"], dtype=np.int32)]
+            self.codigos_vendedor.frombytes(codigos.tobytes())
+            codigos = np.asarray(productos, dtype=np.int32)[np.frombuffer(columnas["productos"], dtype=np.int32)]
+            self.lineas_producto.frombytes(codigos.tobytes())
+            lineas_por_venta = np.diff(np.frombuffer(inicio_lineas, dtype=np.int64))
+            posiciones = np.repeat(np.arange(base, base + len(lineas_por_venta), dtype=np.int64), lineas_por_venta)
+            self.lineas_venta.frombytes(posiciones.tobytes())
+        else:
+            self.codigos_vendedor.extend(vendedores[c] for c in columnas["vendedores"])
+            self.lineas_producto.extend(productos[c] for c in columnas["productos"])
+            for i in range(len(inicio_lineas) - 1):
+                self.lineas_venta.extend([base + i] * (inicio_lineas[i + 1] - inicio_lineas[i]))
+
+    def _subtotales(self):
+        """Subtotal de cada línea, usando el precio actual donde no se registró"""
+        precios = [self.precios.get(clave, 0.0) for clave in self.productos]
+        if np is not None:
+            subtotales = np.frombuffer(self.lineas_subtotal, dtype=np.float64)
+            estimados = np.frombuffer(self.lineas_cantidad, dtype=np.float64) * np.asarray(
+                precios, dtype=np.float64)[np.frombuffer(self.lineas_producto, dtype=np.int32)]
+            return np.where(np.isnan(subtotales), estimados, subtotales)
+        return [cantidad * precios[producto] if math.isnan(subtotal) else subtotal
+                for subtotal, cantidad, producto
+                in zip(self.lineas_subtotal, self.lineas_cantidad, self.lineas_producto)]
+
+    def totales_generales(self):
+        """(número de ventas, monto total)"""
+        # fsum con y sin NumPy: la suma por pares de ndarray.sum daría otro redondeo
+        return len(self.segundos), math.fsum(self.totales)
+
+    def por_dia(self):
+        """{YYYY-MM-DD: {"count", "total"}} de los días con ventas"""
+        if not self.segundos:
+            return {}
+        if np is not None:
+            dias = np.frombuffer(self.segundos, dtype=np.int64) // 86400
+            primero = int(dias.min())
+            conteos = np.bincount(dias - primero)
+            montos = np.bincount(dias - primero, weights=np.frombuffer(self.totales, dtype=np.float64))
+            return {epoch_a_fecha((primero + int(d)) * 86400)[:10]: {"count": int(conteos[d]), "total": float(montos[d])}
+                    for d in np.flatnonzero(conteos)}
+        resultado = {}
+        for segundos, total in zip(self.segundos, self.totales):
+            dia = resultado.setdefault(segundos // 86400, {"count": 0, "total": 0.0})
+            dia["count"] += 1
+            dia["total"] += total
+        return {epoch_a_fecha(d * 86400)[:10]: datos for d, datos in sorted(resultado.items())}
+
+    def por_hora(self):
+        """Lista de 24 elementos {"count", "total"}, uno por hora del día"""
+        if np is not None:
+            horas = np.frombuffer(self.segundos, dtype=np.int64) % 86400 // 3600
+            conteos = np.bincount(horas, minlength=24)
+            montos = np.bincount(horas, weights=np.frombuffer(self.totales, dtype=np.float64), minlength=24)
+            return [{"count": int(conteos[h]), "total": float(montos[h])} for h in range(24)]
+        resultado = [{"count": 0, "total": 0.0} for _ in range(24)]
+        for segundos, total in zip(self.segundos, self.totales):
+            hora = resultado[segundos % 86400 // 3600]
+            hora["count"] += 1
+            hora["total"] += total
+        return resultado
+
+    def por_vendedor(self):
+        """{vendedor: {"count", "total"}}"""
+        nombres = list(self.vendedores)
+        if np is not None:
+            codigos = np.frombuffer(self.codigos_vendedor, dtype=np.int32)
+            conteos = np.bincount(codigos, minlength=len(nombres))
+            montos = np.bincount(codigos, weights=np.frombuffer(self.totales, dtype=np.float64),
+                                 minlength=len(nombres))
+            return {nombres[i]: {"count": int(conteos[i]), "total": float(montos[i])}
+                    for i in range(len(nombres)) if conteos[i]}
+        resultado = {}
+        for codigo, total in zip(self.codigos_vendedor, self.totales):
+            vendedor = resultado.setdefault(nombres[codigo], {"count": 0, "total": 0.0})
+            vendedor["count"] += 1
+            vendedor["total"] += total
+        return resultado
+
+    def por_producto(self):
+        """{producto: {"cantidad", "monto", "veces"}}"""
+        claves = list(self.productos)
+        subtotales = self._subtotales()
+        if np is not None:
+            codigos = np.frombuffer(self.lineas_producto, dtype=np.int32)
+            veces = np.bincount(codigos, minlength=len(claves))
+            cantidades = np.bincount(codigos, weights=np.frombuffer(self.lineas_cantidad, dtype=np.float64),
+                                     minlength=len(claves))
+            montos = np.bincount(codigos, weights=subtotales, minlength=len(claves))
+            return {claves[i]: {"cantidad": float(cantidades[i]), "monto": float(montos[i]), "veces": int(veces[i])}
+                    for i in range(len(claves)) if veces[i]}
+        resultado = {}
+        for codigo, cantidad, subtotal in zip(self.lineas_producto, self.lineas_cantidad, subtotales):
+            producto = resultado.setdefault(claves[codigo], {"cantidad": 0.0, "monto": 0.0, "veces": 0})
+            producto["cantidad"] += cantidad
+            producto["monto"] += subtotal
+            producto["veces"] += 1
+        return resultado
+
+    def por_dia_producto(self):
+        """{YYYY-MM-DD: {producto: cantidad}}"""
+        if not self.segundos:
+            return {}
+        claves = list(self.productos)
+        if np is not None:
+            dias = np.frombuffer(self.segundos, dtype=np.int64) // 86400
+            primero = int(dias.min())
+            # Un solo bincount sobre la combinación (día, producto)
+            combinados = ((dias - primero)[np.frombuffer(self.lineas_venta, dtype=np.int64)] * len(claves)
+                          + np.frombuffer(self.lineas_producto, dtype=np.int32))
+            cantidades = np.bincount(combinados, weights=np.frombuffer(self.lineas_cantidad, dtype=np.float64))
+            presentes = np.bincount(combinados)
+            resultado = {}
+            for posicion in np.flatnonzero(presentes):
+                dia, producto = divmod(int(posicion), len(claves))
+                fecha = epoch_a_fecha((primero + dia) * 86400)[:10]
+                resultado.setdefault(fecha, {})[claves[producto]] = float(cantidades[posicion])
+            return resultado
+        resultado = {}
+        for venta, codigo, cantidad in zip(self.lineas_venta, self.lineas_producto, self.lineas_cantidad):
+            productos = resultado.setdefault(self.segundos[venta] // 86400, {})
+            productos[claves[codigo]] = productos.get(claves[codigo], 0.0) + cantidad
+        return {epoch_a_fecha(d * 86400)[:10]: productos for d, productos in sorted(resultado.items())}
+
+    def por_semana_producto(self):
+        """{producto: {"unidades": [168], "monto": [168]}} por franja_semana"""
+        claves = list(self.productos)
+        subtotales = self._subtotales()
+        if np is not None:
+            segundos = np.frombuffer(self.segundos, dtype=np.int64)
+            franjas = franja_semana(segundos)[np.frombuffer(self.lineas_venta, dtype=np.int64)]
+            combinados = np.frombuffer(self.lineas_producto, dtype=np.int32).astype(np.int64) * 168 + franjas
+            tamano = len(claves) * 168
+            unidades = np.bincount(combinados, weights=np.frombuffer(self.lineas_cantidad, dtype=np.float64),
+                                   minlength=tamano).reshape(len(claves), 168)
+            montos = np.bincount(combinados, weights=subtotales, minlength=tamano).reshape(len(claves), 168)
+            presentes = np.bincount(combinados // 168, minlength=len(claves))
+            return {claves[i]: {"unidades": unidades[i].tolist(), "monto": montos[i].tolist()}
+                    for i in range(len(claves)) if presentes[i]}
+        resultado = {}
+        for venta, codigo, cantidad, subtotal in zip(self.lineas_venta, self.lineas_producto,
+                                                     self.lineas_cantidad, subtotales):
+            celdas = resultado.get(claves[codigo])
+            if celdas is None:
+                celdas = resultado[claves[codigo]] = {"unidades": [0.0] * 168, "monto": [0.0] * 168}
+            franja = franja_semana(self.segundos[venta])
+            celdas["unidades"][franja] += cantidad
+            celdas["monto"][franja] += subtotal
+        return resultado
+
+    def por_par_producto(self):
+        """{a: {b: tickets}} con a < b: número de ventas que llevan ambos productos"""
+        claves = list(self.productos)
+        if np is not None and len(self.lineas_venta):
+            # Las líneas de cada venta son contiguas: la línea l forma par con la l + d
+            # si ambas son de la misma venta. Cada par se codifica como i * P + j (i < j)
+            # y se cuenta con np.unique, así la memoria depende de los pares y no de
+            # ventas × productos
+            ventas = np.frombuffer(self.lineas_venta, dtype=np.int64)
+            productos = np.frombuffer(self.lineas_producto, dtype=np.int32).astype(np.int64)
+            codigos = []
+            distancia = 1
+            while distancia < len(ventas):
+                misma = ventas[distancia:] == ventas[:-distancia]
+                if not misma.any():
+                    break
+                a = productos[:-distancia][misma]
+                b = productos[distancia:][misma]
+                distintos = a != b
+                a, b = a[distintos], b[distintos]
+                codigos.append(np.minimum(a, b) * len(claves) + np.maximum(a, b))
+                distancia += 1
+            resultado = {}
+            if codigos:
+                pares, conteos = np.unique(np.concatenate(codigos), return_counts=True)
+                for par, tickets in zip(pares.tolist(), conteos.tolist()):
+                    i, j = divmod(par, len(claves))
+                    primero, segundo = sorted((claves[i], claves[j]))
+                    resultado.setdefault(primero, {})[segundo] = tickets
+            return resultado
+        resultado = {}
+        canasta = []
+        anterior = None
+        for venta, codigo in zip(self.lineas_venta, self.lineas_producto):
+            if venta != anterior:
+                agregar_pares_canasta(resultado, canasta)
+                canasta = []
+                anterior = venta
+            canasta.append(claves[codigo])
+        agregar_pares_canasta(resultado, canasta)
+        return resultado
+
+    def agrupaciones(self):
+        """Todas las agrupaciones en un diccionario simple que puede enviarse entre procesos"""
+        ventas, monto = self.totales_generales()
+        return {"ventas": ventas, "monto": monto, "dias": self.por_dia(), "horas": self.por_hora(),
+                "vendedores": self.por_vendedor(), "productos": self.por_producto(),
+                "dias_productos": self.por_dia_producto(), "semana_productos": self.por_semana_producto(),
+                "pares": self.por_par_producto()}
+
+
+def agregar_pares_canasta(pares, canasta):
+    """Sumar a la matriz dispersa {a: {b: tickets}} los pares de productos de una canasta"""
+    canasta = sorted(canasta)
+    for i, primero in enumerate(canasta):
+        for segundo in canasta[i + 1:]:
+            fila = pares.setdefault(primero, {})
+            fila[segundo] = fila.get(segundo, 0) + 1
+
+
+class ArchivoColumnar:
+    """Archivo compacto por columnas de las ventas de meses cerrados.
+
+    Cada mes se guarda en `directorio/YYYY-MM/` como arreglos binarios nativos
+    (uno por columna) que se leen con mmap, más un JSON con los diccionarios de
+    vendedores, clientes y productos. Las líneas de venta se guardan en columnas
+    aparte; `inicio_lineas[i]` indica dónde empiezan las de la venta i.
+    """
+
+    COLUMNAS = {
+        "fechas": "q",          # segundos desde 1970
+        "totales": "d",
+        "vendedores": "i",      # índice en diccionarios["vendedores"]
+        "clientes": "i",        # índice en diccionarios["clientes"]
+        "inicio_lineas": "q",   # n + 1 posiciones en las columnas de líneas
+        "productos": "i",       # índice en diccionarios["productos"]
+        "cantidades": "d",
+        "precios": "d",         # NaN en ventas registradas sin precio
+        "subtotales": "d",
+    }
+
+    # Cambia cuando se agregan columnas; los meses con otro formato se vuelven a archivar
+    FORMATO = 2
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self._diccionarios = {}
+
+    def _ruta_mes(self, mes):
+        return os.path.join(self.directorio, mes)
+
+    def diccionarios(self, mes):
+        """Diccionarios de códigos del mes, o None si no está archivado"""
+        if mes not in self._diccionarios:
+            ruta = os.path.join(self._ruta_mes(mes), "diccionarios.json")
+            if not os.path.exists(ruta):
+                return None
+            with open(ruta, "r", encoding="utf-8") as f:
+                self._diccionarios[mes] = json.load(f)
+        return self._diccionarios[mes]
+
+    def vigente(self, mes, numero_ventas):
+        """Indica si el mes está archivado con el mismo número de ventas del historial"""
+        try:
+            diccionarios = self.diccionarios(mes)
+        except (OSError, ValueError):
+            return False
+        return (diccionarios is not None and diccionarios.get("formato") == self.FORMATO
+                and diccionarios["ventas"] == numero_ventas)
+
+    def archivar_mes(self, mes, ventas):
+        """Escribir las ventas de un mes en formato columnar"""
+        vendedores, clientes, productos = {}, {}, {}
+        columnas = {nombre: array(tipo) for nombre, tipo in self.COLUMNAS.items()}
+        columnas["inicio_lineas"].append(0)
+
+        for venta in ventas:
+            columnas["fechas"].append(fecha_a_epoch(venta["fecha"]))
+            columnas["totales"].append(venta["total"])
+            columnas["vendedores"].append(vendedores.setdefault(venta["vendedor"], len(vendedores)))
+            columnas["clientes"].append(clientes.setdefault(venta["cliente"], len(clientes)))
+            detalle = venta.get("detalle", {})
+            for clave, cantidad in venta["productos"].items():
+                columnas["productos"].append(productos.setdefault(clave, len(productos)))
+                columnas["cantidades"].append(cantidad)
+                linea = detalle.get(clave, {"precio": math.nan, "subtotal": math.nan})
+                columnas["precios"].append(linea["precio"])
+                columnas["subtotales"].append(linea["subtotal"])
+            columnas["inicio_lineas"].append(len(columnas["productos"]))
+
+        # Escribir en un directorio temporal y reemplazar el anterior de una vez
+        destino = self._ruta_mes(mes)
+        temporal = destino + ".tmp"
+        shutil.rmtree(temporal, ignore_errors=True)
+        os.makedirs(temporal)
+        for nombre, datos in columnas.items():
+            with open(os.path.join(temporal, nombre + ".bin"), "wb") as f:
+                datos.tofile(f)
+        diccionarios = {
+            "formato": self.FORMATO,
+            "ventas": len(ventas),
+            "vendedores": list(vendedores),
+            "clientes": list(clientes),
+            "productos": list(productos)
+        }
+        with open(os.path.join(temporal, "diccionarios.json"), "w", encoding="utf-8") as f:
+            json.dump(diccionarios, f, ensure_ascii=False)
+
+        shutil.rmtree(destino, ignore_errors=True)
+        os.replace(temporal, destino)
+        self._diccionarios[mes] = diccionarios
+
+    @contextmanager
+    def abrir_mes(self, mes):
+        """Abrir las columnas del mes mapeadas en memoria (solo lectura)"""
+        with ExitStack() as pila:
+            columnas = {}
+            for nombre, tipo in self.COLUMNAS.items():
+                ruta = os.path.join(self._ruta_mes(mes), nombre + ".bin")
+                if os.path.getsize(ruta) == 0:
+                    columnas[nombre] = array(tipo)
+                    continue
+                f = pila.enter_context(open(ruta, "rb"))
+                mapa = pila.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                vista = memoryview(mapa).cast(tipo)
+                pila.callback(vista.release)
+                columnas[nombre] = vista
+            yield columnas
+
+    def reconstruir_ventas(self, mes):
+        """Convertir las columnas del mes de nuevo en diccionarios de venta"""
+        diccionarios = self.diccionarios(mes)
+        vendedores, clientes, productos = (diccionarios["vendedores"], diccionarios["clientes"],
+                                           diccionarios["productos"])
+        ventas = []
+        with self.abrir_mes(mes) as c:
+            inicio_lineas = c["inicio_lineas"]
+            precios, subtotales = c["precios"], c["subtotales"]
+            for i in range(len(c["fechas"])):
+                lineas = range(inicio_lineas[i], inicio_lineas[i + 1])
+                venta = {
+                    "fecha": epoch_a_fecha(c["fechas"][i]),
+                    "cliente": clientes[c["clientes"][i]],
+                    "productos": {productos[c["productos"][j]]: c["cantidades"][j] for j in lineas},
+                    "total": c["totales"][i],
+                    "vendedor": vendedores[c["vendedores"][i]]
+                }
+                detalle = {productos[c["productos"][j]]: {"precio": precios[j], "subtotal": subtotales[j]}
+                           for j in lineas if not math.isnan(precios[j])}
+                if detalle:
+                    venta["detalle"] = detalle
+                ventas.append(venta)
+        return ventas
+
+    def eliminar_todo(self):
+        """Borrar todos los meses archivados (por ejemplo, después de importar datos)"""
+        shutil.rmtree(self.directorio, ignore_errors=True)
+        self._diccionarios = {}
+
+
+class AlmacenSQLite:
+    """Almacenamiento en SQLite (modo WAL) con índices para consultas de ventas"""
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS productos (
+            clave TEXT PRIMARY KEY,
+            nombre TEXT NOT NULL,
+            descripcion TEXT NOT NULL DEFAULT '',
+            precio REAL NOT NULL,
+            stock REAL NOT NULL,
+            unidad TEXT NOT NULL DEFAULT 'kg',
+            categoria TEXT NOT NULL DEFAULT 'otros',
+            plu TEXT NOT NULL DEFAULT ''
+        );
+        CREATE TABLE IF NOT EXISTS usuarios (
+            usuario TEXT PRIMARY KEY,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL,
+            nombre TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS ventas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha TEXT NOT NULL,
+            cliente TEXT NOT NULL,
+            vendedor TEXT NOT NULL,
+            total REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS venta_productos (
+            venta_id INTEGER NOT NULL REFERENCES ventas(id) ON DELETE CASCADE,
+            producto TEXT NOT NULL,
+            cantidad REAL NOT NULL,
+            precio REAL,
+            subtotal REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas(fecha);
+        CREATE INDEX IF NOT EXISTS idx_ventas_vendedor ON ventas(vendedor, fecha);
+        CREATE INDEX IF NOT EXISTS idx_venta_productos_venta ON venta_productos(venta_id);
+        CREATE INDEX IF NOT EXISTS idx_venta_productos_producto ON venta_productos(producto, venta_id);
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.lock = threading.Lock()
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        self.conexion.execute("PRAGMA foreign_keys=ON")
+        self.conexion.executescript(self.ESQUEMA)
+        # Bases creadas antes de guardar el precio de cada línea
+        columnas = {fila[1] for fila in self.conexion.execute("PRAGMA table_info(venta_productos)")}
+        for columna in ("precio", "subtotal"):
+            if columna not in columnas:
+                self.conexion.execute(f"ALTER TABLE venta_productos ADD COLUMN {columna} REAL")
+        # Bases creadas antes de los códigos PLU
+        columnas = {fila[1] for fila in self.conexion.execute("PRAGMA table_info(productos)")}
+        if "plu" not in columnas:
+            self.conexion.execute("ALTER TABLE productos ADD COLUMN plu TEXT NOT NULL DEFAULT ''")
+        self.conexion.commit()
+
+    def esta_vacio(self):
+        """Indica si la base de datos aún no tiene productos ni ventas"""
+        with self.lock:
+            productos = self.conexion.execute("SELECT COUNT(*) FROM productos").fetchone()[0]
+            ventas = self.conexion.execute("SELECT COUNT(*) FROM ventas").fetchone()[0]
+        return productos == 0 and ventas == 0
+
+    def cargar_inventario(self):
+        """Leer los productos como diccionario clave -> datos"""
+        with self.lock:
+            filas = self.conexion.execute(
+                "SELECT clave, nombre, descripcion, precio, stock, unidad, categoria, plu FROM productos").fetchall()
+        return {clave: {"nombre": nombre, "stock": stock, "precio": precio, "unidad": unidad,
+                        "descripcion": descripcion, "categoria": categoria, "plu": plu}
+                for clave, nombre, descripcion, precio, stock, unidad, categoria, plu in filas}
+
+    def cargar_usuarios(self):
+        """Leer los usuarios como diccionario usuario -> datos"""
+        with self.lock:
+            filas = self.conexion.execute("SELECT usuario, password, role, nombre FROM usuarios").fetchall()
+        return {usuario: {"password": password, "role": role, "nombre": nombre}
+                for usuario, password, role, nombre in filas}
+
+    def guardar_inventario(self, inventario):
+        """Sincronizar la tabla de productos con el inventario en memoria"""
+        with self.lock, self.conexion:
+            self._escribir_inventario(inventario)
+
+    def _escribir_inventario(self, inventario):
+        self.conexion.executemany(
+            """INSERT INTO productos (clave, nombre, descripcion, precio, stock, unidad, categoria, plu)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(clave) DO UPDATE SET nombre=excluded.nombre, descripcion=excluded.descripcion,
+                   precio=excluded.precio, stock=excluded.stock, unidad=excluded.unidad,
+                   categoria=excluded.categoria, plu=excluded.plu""",
+            [(clave, p["nombre"], p.get("descripcion", ""), p["precio"], p["stock"],
+              p.get("unidad", "kg"), p.get("categoria", "otros"), p.get("plu", ""))
+             for clave, p in inventario.items()])
+        claves = list(inventario)
+        marcadores = ",".join("?" * len(claves))
+        if claves:
+            self.conexion.execute(f"DELETE FROM productos WHERE clave NOT IN ({marcadores})", claves)
+        else:
+            self.conexion.execute("DELETE FROM productos")
+
+    def guardar_usuarios(self, usuarios):
+        """Sincronizar la tabla de usuarios con los usuarios en memoria"""
+        with self.lock, self.conexion:
+            self._escribir_usuarios(usuarios)
+
+    def _escribir_usuarios(self, usuarios):
+        self.conexion.execute("DELETE FROM usuarios")
+        self.conexion.executemany(
+            "INSERT INTO usuarios (usuario, password, role, nombre) VALUES (?, ?, ?, ?)",
+            [(u, d["password"], d["role"], d["nombre"]) for u, d in usuarios.items()])
+
+    def _insertar_venta(self, venta, sufijo=""):
+        cursor = self.conexion.execute(
+            f"INSERT INTO ventas{sufijo} (fecha, cliente, vendedor, total) VALUES (?, ?, ?, ?)",
+            (venta["fecha"], venta["cliente"], venta["vendedor"], venta["total"]))
+        detalle = venta.get("detalle", {})
+        self.conexion.executemany(
+            f"INSERT INTO venta_productos{sufijo} (venta_id, producto, cantidad, precio, subtotal) VALUES (?, ?, ?, ?, ?)",
+            [(cursor.lastrowid, clave, cantidad, detalle.get(clave, {}).get("precio"),
+              detalle.get(clave, {}).get("subtotal")) for clave, cantidad in venta["productos"].items()])
+
+    def registrar_venta(self, venta, inventario):
+        """Guardar una venta y el stock de sus productos en una sola transacción"""
+        with self.lock, self.conexion:
+            self._insertar_venta(venta)
+            self.conexion.executemany(
+                "UPDATE productos SET stock = ? WHERE clave = ?",
+                [(inventario[clave]["stock"], clave) for clave in venta["productos"] if clave in inventario])
+
+    def reemplazar_ventas(self, ventas):
+        """Reemplazar todo el historial de ventas (importación o migración)"""
+        with self.lock, self.conexion:
+            self.conexion.execute("DELETE FROM venta_productos")
+            self.conexion.execute("DELETE FROM ventas")
+            for venta in ventas:
+                self._insertar_venta(venta)
+
+    def preparar_importacion(self, ventas):
+        """Escribir las ventas importadas en tablas temporales sin tocar las actuales.
+
+        Son tablas TEMP de esta conexión: si el programa se cierra antes de
+        confirmar_importacion, desaparecen solas.
+        """
+        with self.lock:
+            self.conexion.executescript("""
+                DROP TABLE IF EXISTS temp.ventas_importadas;
+                DROP TABLE IF EXISTS temp.venta_productos_importadas;
+                CREATE TEMP TABLE ventas_importadas (
+                    id INTEGER PRIMARY KEY, fecha TEXT, cliente TEXT, vendedor TEXT, total REAL);
+                CREATE TEMP TABLE venta_productos_importadas (
+                    venta_id INTEGER, producto TEXT, cantidad REAL, precio REAL, subtotal REAL);
+            """)
+            with self.conexion:
+                for venta in ventas:
+                    self._insertar_venta(venta, "_importadas")
+
+    def confirmar_importacion(self, inventario, usuarios):
+        """Reemplazar productos, usuarios y ventas (las de preparar_importacion) en una sola transacción"""
+        with self.lock:
+            with self.conexion:
+                self._escribir_inventario(inventario)
+                self._escribir_usuarios(usuarios)
+                self.conexion.execute("DELETE FROM venta_productos")
+                self.conexion.execute("DELETE FROM ventas")
+                self.conexion.execute(
+                    """INSERT INTO ventas (id, fecha, cliente, vendedor, total)
+                       SELECT id, fecha, cliente, vendedor, total FROM temp.ventas_importadas""")
+                self.conexion.execute(
+                    """INSERT INTO venta_productos (venta_id, producto, cantidad, precio, subtotal)
+                       SELECT venta_id, producto, cantidad, precio, subtotal FROM temp.venta_productos_importadas""")
+            self.conexion.executescript("""
+                DROP TABLE temp.ventas_importadas;
+                DROP TABLE temp.venta_productos_importadas;
+            """)
+
+    def _leer_ventas(self, condicion="", parametros=(), orden="v.fecha, v.id"):
+        """Reconstruir los diccionarios de venta que cumplen la condición, en el orden dado"""
+        with self.lock:
+            filas = self.conexion.execute(
+                f"""SELECT v.id, v.fecha, v.cliente, v.vendedor, v.total, vp.producto, vp.cantidad,
+                           vp.precio, vp.subtotal
+                    FROM ventas v LEFT JOIN venta_productos vp ON vp.venta_id = v.id
+                    {condicion}
+                    ORDER BY {orden}""", parametros).fetchall()
+
+        ventas = []
+        ultimo_id = None
+        for venta_id, fecha, cliente, vendedor, total, producto, cantidad, precio, subtotal in filas:
+            if venta_id != ultimo_id:
+                ventas.append({"fecha": fecha, "cliente": cliente, "productos": {},
+                               "total": total, "vendedor": vendedor})
+                ultimo_id = venta_id
+            if producto is not None:
+                ventas[-1]["productos"][producto] = cantidad
+                if precio is not None:
+                    ventas[-1].setdefault("detalle", {})[producto] = {"precio": precio, "subtotal": subtotal}
+        return ventas
+
+    def cargar_ventas(self):
+        """Leer todo el historial de ventas en orden cronológico"""
+        return self._leer_ventas()
+
+    def ventas_en_rango(self, desde, hasta, vendedor=None):
+        """Ventas con `desde <= fecha < hasta` usando el índice de fecha"""
+        if vendedor is None:
+            return self._leer_ventas("WHERE v.fecha >= ? AND v.fecha < ?", (desde, hasta))
+        return self._leer_ventas("WHERE v.vendedor = ? AND v.fecha >= ? AND v.fecha < ?",
+                                 (vendedor, desde, hasta))
+
+    def totales_en_rango(self, desde, hasta):
+        """(ventas, monto total, días con ventas, id más alto) con `desde <= fecha < hasta`"""
+        with self.lock:
+            return self.conexion.execute(
+                """SELECT COUNT(*), COALESCE(SUM(total), 0), COUNT(DISTINCT substr(fecha, 1, 10)),
+                          COALESCE(MAX(id), 0)
+                   FROM ventas WHERE fecha >= ? AND fecha < ?""", (desde, hasta)).fetchone()
+
+    # En pagina_ventas, orden_ventas y ventas_por_id, `orden` es la cláusula ORDER BY
+    # sobre las columnas de `v` (la tabla ventas); debe terminar en v.id para que
+    # el orden sea total y una página leída por id salga en el mismo orden.
+
+    def pagina_ventas(self, desde, hasta, ultimo_id, orden, limite, desplazamiento):
+        """Una página (LIMIT/OFFSET) de las ventas de [desde, hasta) con id <= `ultimo_id`"""
+        with self.lock:
+            ids = [venta_id for venta_id, in self.conexion.execute(
+                f"""SELECT v.id FROM ventas v WHERE v.fecha >= ? AND v.fecha < ? AND v.id <= ?
+                    ORDER BY {orden} LIMIT ? OFFSET ?""",
+                (desde, hasta, ultimo_id, limite, desplazamiento))]
+        return self.ventas_por_id(ids, orden)
+
+    def orden_ventas(self, desde, hasta, ultimo_id, orden):
+        """[(id, posición en orden por fecha)] de las ventas de [desde, hasta) con id <= `ultimo_id`"""
+        with self.lock:
+            return self.conexion.execute(
+                f"""SELECT v.id, v.posicion FROM (
+                        SELECT id, fecha, vendedor, total, ROW_NUMBER() OVER (ORDER BY fecha, id) - 1 AS posicion
+                        FROM ventas WHERE fecha >= ? AND fecha < ? AND id <= ?) v
+                    ORDER BY {orden}""", (desde, hasta, ultimo_id)).fetchall()
+
+    def ventas_por_id(self, ids, orden="v.fecha, v.id"):
+        """Ventas con los ids dados, en el orden dado"""
+        if not ids:
+            return []
+        return self._leer_ventas(f"WHERE v.id IN ({','.join('?' * len(ids))})", ids, orden)
+
+    def contar_ventas(self, desde="", hasta="9999"):
+        """Número de ventas con `desde <= fecha < hasta`"""
+        with self.lock:
+            return self.conexion.execute("SELECT COUNT(*) FROM ventas WHERE fecha >= ? AND fecha < ?",
+                                         (desde, hasta)).fetchone()[0]
+
+    def meses(self, hasta="9999"):
+        """Meses (YYYY-MM) con ventas anteriores a `hasta`"""
+        with self.lock:
+            filas = self.conexion.execute(
+                "SELECT DISTINCT substr(fecha, 1, 7) FROM ventas WHERE fecha < ? ORDER BY 1", (hasta,)).fetchall()
+        return [mes for mes, in filas]
+
+    def cerrar(self):
+        """Cerrar la conexión"""
+        with self.lock:
+            self.conexion.close()
+
+
+def agrupar_bloque(bloque, precios):
+    """Agrupaciones de un bloque del historial; se ejecuta en los procesos de MotorReportes.
+
+    `bloque` indica de dónde leer las ventas para no enviarlas entre procesos:
+    ("ventas", lista), ("json", ruta, rangos), ("particiones", rutas),
+    ("columnar", directorio, mes) o ("sqlite", ruta, desde, hasta).
+    """
+    analitica = AnaliticaVentas(precios)
+    if bloque[0] == "columnar":
+        archivo = ArchivoColumnar(bloque[1])
+        with archivo.abrir_mes(bloque[2]) as columnas:
+            analitica.agregar_columnas(columnas, archivo.diccionarios(bloque[2]))
+    else:
+        analitica.agregar_ventas(ventas_de_bloque(bloque))
+    return analitica.agrupaciones()
+
+
+def ventas_de_bloque(bloque):
+    """Ventas (diccionarios) de un bloque del historial, en el formato de agrupar_bloque"""
+    tipo = bloque[0]
+    if tipo == "ventas":
+        yield from bloque[1]
+    elif tipo == "json":
+        with open(bloque[1], "rb") as f:
+            for inicio, fin in bloque[2]:
+                yield from (venta for _, _, venta in iterar_ventas_json(f, inicio, fin))
+    elif tipo == "particiones":
+        for ruta in bloque[1]:
+            yield from DiarioVentas(ruta).leer()
+    elif tipo == "columnar":
+        yield from ArchivoColumnar(bloque[1]).reconstruir_ventas(bloque[2])
+    elif tipo == "sqlite":
+        almacen = AlmacenSQLite(bloque[1])
+        try:
+            yield from almacen.ventas_en_rango(bloque[2], bloque[3])
+        finally:
+            almacen.cerrar()
+    else:
+        raise ValueError(f"Tipo de bloque desconocido: {tipo}")
+
+
+def contar_canastas_bloque(bloque, desde, hasta, tamano_maximo):
+    """Tickets de un bloque en [desde, hasta) y cuántos llevan cada combinación de hasta `tamano_maximo` productos.
+
+    Devuelve (tickets, {tupla ordenada de productos: tickets}). Cada bloque se
+    cuenta por separado en los procesos de MotorReportes y los conteos se
+    suman con combinar_canastas.
+    """
+    tickets = 0
+    conteos = {}
+    for venta in ventas_de_bloque(bloque):
+        if (desde is not None and venta["fecha"] < desde) or (hasta is not None and venta["fecha"] >= hasta):
+            continue
+        tickets += 1
+        canasta = sorted(venta["productos"])
+        for tamano in range(1, min(tamano_maximo, len(canasta)) + 1):
+            for conjunto in itertools.combinations(canasta, tamano):
+                conteos[conjunto] = conteos.get(conjunto, 0) + 1
+    return tickets, conteos
+
+
+def combinar_canastas(parciales):
+    """Sumar los conteos de contar_canastas_bloque"""
+    tickets = 0
+    conteos = {}
+    for parcial_tickets, parcial_conteos in parciales:
+        tickets += parcial_tickets
+        for conjunto, veces in parcial_conteos.items():
+            conteos[conjunto] = conteos.get(conjunto, 0) + veces
+    return tickets, conteos
+
+
+def reglas_asociacion(tickets, conteos, soporte_minimo=SOPORTE_MINIMO, confianza_minima=CONFIANZA_MINIMA):
+    """Combinaciones frecuentes y reglas "si compra X también compra Y" a partir de los conteos.
+
+    Devuelve (frecuentes, reglas): `frecuentes` son pares (conjunto, soporte)
+    de dos o más productos con soporte >= `soporte_minimo`; `reglas` son
+    diccionarios con antecedente, consecuente, soporte, confianza, lift y
+    tickets, con confianza >= `confianza_minima`. Ambas listas van de mayor a
+    menor soporte y lift.
+    """
+    if not tickets:
+        return [], []
+    frecuentes = sorted(((conjunto, veces / tickets) for conjunto, veces in conteos.items()
+                         if len(conjunto) > 1 and veces / tickets >= soporte_minimo),
+                        key=lambda item: (-item[1], item[0]))
+    reglas = []
+    for conjunto, soporte in frecuentes:
+        veces = conteos[conjunto]
+        for tamano in range(1, len(conjunto)):
+            for antecedente in itertools.combinations(conjunto, tamano):
+                consecuente = tuple(clave for clave in conjunto if clave not in antecedente)
+                if antecedente not in conteos or consecuente not in conteos:
+                    continue
+                confianza = veces / conteos[antecedente]
+                if confianza < confianza_minima:
+                    continue
+                reglas.append({"antecedente": antecedente, "consecuente": consecuente, "soporte": soporte,
+                               "confianza": confianza, "lift": confianza / (conteos[consecuente] / tickets),
+                               "tickets": veces})
+    reglas.sort(key=lambda regla: (-regla["lift"], -regla["soporte"], regla["antecedente"]))
+    return frecuentes, reglas
+
+
+def combinar_agrupaciones(parciales):
+    """Sumar, en el orden recibido, los resultados de agrupar_bloque"""
+    resultado = {"ventas": 0, "monto": 0.0, "dias": {}, "horas": [{"count": 0, "total": 0.0} for _ in range(24)],
+                 "vendedores": {}, "productos": {}, "dias_productos": {}, "semana_productos": {}, "pares": {}}
+    for parcial in parciales:
+        resultado["ventas"] += parcial["ventas"]
+        resultado["monto"] += parcial["monto"]
+        for grupo in ("dias", "vendedores", "productos"):
+            for clave, datos in parcial[grupo].items():
+                acumulado = resultado[grupo].get(clave)
+                if acumulado is None:
+                    resultado[grupo][clave] = dict(datos)
+                    continue
+                for campo, valor in datos.items():
+                    acumulado[campo] += valor
+        for acumulado, datos in zip(resultado["horas"], parcial["horas"]):
+            acumulado["count"] += datos["count"]
+            acumulado["total"] += datos["total"]
+        for fecha, productos in parcial["dias_productos"].items():
+            acumulado = resultado["dias_productos"].setdefault(fecha, {})
+            for clave, cantidad in productos.items():
+                acumulado[clave] = acumulado.get(clave, 0.0) + cantidad
+        for clave, celdas in parcial["semana_productos"].items():
+            acumulado = resultado["semana_productos"].get(clave)
+            if acumulado is None:
+                resultado["semana_productos"][clave] = {"unidades": list(celdas["unidades"]),
+                                                        "monto": list(celdas["monto"])}
+                continue
+            for campo in ("unidades", "monto"):
+                acumulado[campo] = [a + b for a, b in zip(acumulado[campo], celdas[campo])]
+        for primero, fila in parcial["pares"].items():
+            acumulado = resultado["pares"].setdefault(primero, {})
+            for segundo, tickets in fila.items():
+                acumulado[segundo] = acumulado.get(segundo, 0) + tickets
+    return resultado
+
+
+class MotorReportes:
+    """Reparte el cálculo de los reportes por bloques del historial entre varios procesos.
+
+    Cada bloque (normalmente un mes) se agrupa por separado y los parciales se
+    combinan siempre en el orden de los bloques, así el resultado es idéntico
+    en serie y en paralelo. Con `procesos` <= 1 todo se calcula en este proceso.
+    """
+
+    def __init__(self, procesos=PROCESOS_REPORTES):
+        self.procesos = procesos
+        self.ejecutor = None
+        self.bloqueo = threading.Lock()  # El hilo de reportes y el principal pueden calcular a la vez
+
+    def calcular(self, bloques, precios):
+        """Agrupaciones combinadas de todos los bloques"""
+        return combinar_agrupaciones(self._repartir(agrupar_bloque, bloques, precios))
+
+    def contar_canastas(self, bloques, desde=None, hasta=None, tamano_maximo=TAMANO_MAXIMO_CONJUNTO):
+        """Tickets y conteos de combinaciones de productos en [desde, hasta), ver contar_canastas_bloque"""
+        return combinar_canastas(self._repartir(contar_canastas_bloque, bloques, desde, hasta, tamano_maximo))
+
+    def _repartir(self, funcion, bloques, *argumentos):
+        """Resultados de `funcion(bloque, *argumentos)` para cada bloque, en el orden de los bloques"""
+        if self.procesos > 1 and len(bloques) > 1:
+            try:
+                with self.bloqueo:
+                    if self.ejecutor is None:
+                        # "spawn" no copia los hilos ni la interfaz del proceso principal
+                        self.ejecutor = ProcessPoolExecutor(max_workers=self.procesos,
+                                                            mp_context=multiprocessing.get_context("spawn"))
+                    ejecutor = self.ejecutor
+                return list(ejecutor.map(funcion, bloques,
+                                              *[[argumento] * len(bloques) for argumento in argumentos]))
+            except (BrokenProcessPool, OSError) as e:
+                print(f"No se pudieron usar varios procesos, el reporte se calcula en serie: {e}")
+                self.cerrar()
+                self.procesos = 1
+        return [funcion(bloque, *argumentos) for bloque in bloques]
+
+    def cerrar(self):
+        """Terminar los procesos de trabajo"""
+        with self.bloqueo:
+            ejecutor, self.ejecutor = self.ejecutor, None
+        if ejecutor is not None:
+            ejecutor.shutdown(cancel_futures=True)
+
+
+class FuenteVentas:
+    """Filas de una lista de ventas para ListaVirtual, formateadas solo cuando se piden.
+
+    `columnas` asocia cada columna con (formatear, clave, orden_sql): las dos
+    primeras reciben la posición de la venta en `ventas` y la venta;
+    `formatear` da el texto de la celda y `clave` el valor para ordenar
+    (`orden_sql` es lo mismo para FuenteVentasSQLite). Ordenar solo calcula
+    la permutación de posiciones, sin crear filas, pero `ventas` ya está
+    completa en memoria; para rangos que siguen en la base de datos está
+    FuenteVentasSQLite.
+    """
+
+    def __init__(self, ventas, columnas, recientes_primero=False):
+        self.ventas = ventas
+        self.columnas = columnas
+        self.recientes_primero = recientes_primero
+        self.orden = None  # None: orden por fecha
+
+    def __len__(self):
+        return len(self.ventas)
+
+    def posicion(self, fila):
+        """Posición en `ventas` de la fila `fila` en el orden actual"""
+        if self.orden is not None:
+            return self.orden[fila]
+        return len(self.ventas) - 1 - fila if self.recientes_primero else fila
+
+    def filas(self, inicio, fin):
+        """Valores de las filas [inicio, fin) en el orden actual"""
+        filas = []
+        for fila in range(inicio, min(fin, len(self.ventas))):
+            i = self.posicion(fila)
+            venta = self.ventas[i]
+            filas.append(tuple(formatear(i, venta) for formatear, _, _ in self.columnas.values()))
+        return filas
+
+    def venta(self, fila):
+        """Venta de la fila `fila` en el orden actual"""
+        return self.ventas[self.posicion(fila)]
+
+    def ordenar(self, columna, descendente):
+        """Ordenar por `columna`; con columna None se vuelve al orden por fecha"""
+        if columna is None:
+            self.orden = None
+            return
+        clave = self.columnas[columna][1]
+        self.orden = array("q", sorted(range(len(self.ventas)), key=lambda i: clave(i, self.ventas[i]),
+                                       reverse=descendente))
+
+
+class RangoVentasSQLite:
+    """Ventas de [desde, hasta) que se dejan en AlmacenSQLite; SQLite calcula sus totales.
+
+    Se fija el id más alto del rango al crearse, así las ventas que se
+    registren después no mueven las filas de una lista ya abierta.
+    """
+
+    def __init__(self, almacen, desde, hasta):
+        self.almacen = almacen
+        self.desde = desde
+        self.hasta = hasta
+        self.cantidad, self.monto, self.dias, self.ultimo_id = almacen.totales_en_rango(desde, hasta)
+
+    def __len__(self):
+        return self.cantidad
+
+
+class FuenteVentasSQLite:
+    """Como FuenteVentas, pero lee de la base de datos solo las páginas que pide ListaVirtual.
+
+    En orden por fecha cada página es una consulta LIMIT/OFFSET sobre el
+    índice de fecha de un RangoVentasSQLite. Ordenar por una columna pide a
+    SQLite los ids en ese orden (con la expresión `orden_sql` de la columna)
+    y los guarda como la permutación de FuenteVentas; las ventas se siguen
+    leyendo por página. La posición que reciben las funciones de `columnas`
+    es la de la venta en orden por fecha, igual que en FuenteVentas.
+    """
+
+    def __init__(self, rango, columnas, recientes_primero=False):
+        self.rango = rango
+        self.columnas = columnas
+        self.recientes_primero = recientes_primero
+        self.orden = None  # None: orden por fecha; si no, (cláusula ORDER BY, ids, posiciones)
+
+    def __len__(self):
+        return len(self.rango)
+
+    def _pagina(self, inicio, fin):
+        """[(posición por fecha, venta)] de las filas [inicio, fin) en el orden actual"""
+        fin = min(fin, len(self.rango))
+        almacen = self.rango.almacen
+        if self.orden is not None:
+            orden, ids, posiciones = self.orden
+            return list(zip(posiciones[inicio:fin], almacen.ventas_por_id(list(ids[inicio:fin]), orden)))
+        if self.recientes_primero:
+            ventas = almacen.pagina_ventas(self.rango.desde, self.rango.hasta, self.rango.ultimo_id,
+                                           "v.fecha DESC, v.id DESC", fin - inicio, inicio)
+            return [(len(self.rango) - 1 - fila, venta) for fila, venta in enumerate(ventas, inicio)]
+        ventas = almacen.pagina_ventas(self.rango.desde, self.rango.hasta, self.rango.ultimo_id,
+                                       "v.fecha, v.id", fin - inicio, inicio)
+        return list(enumerate(ventas, inicio))
+
+    def filas(self, inicio, fin):
+        """Valores de las filas [inicio, fin) en el orden actual"""
+        return [tuple(formatear(i, venta) for formatear, _, _ in self.columnas.values())
+                for i, venta in self._pagina(inicio, fin)]
+
+    def venta(self, fila):
+        """Venta de la fila `fila` en el orden actual"""
+        return self._pagina(fila, fila + 1)[0][1]
+
+    def ordenar(self, columna, descendente):
+        """Ordenar por `columna`; con columna None se vuelve al orden por fecha"""
+        if columna is None:
+            self.orden = None
+            return
+        sentido = " DESC" if descendente else ""
+        orden = f"{self.columnas[columna][2]}{sentido}, v.id{sentido}"
+        filas = self.rango.almacen.orden_ventas(self.rango.desde, self.rango.hasta, self.rango.ultimo_id, orden)
+        self.orden = (orden, array("q", (venta_id for venta_id, _ in filas)),
+                      array("q", (posicion for _, posicion in filas)))
+
+
+class ListaVirtual:
+    """Treeview para listas muy grandes que solo contiene las filas visibles.
+
+    El Treeview tiene tantas filas como caben en pantalla y al desplazarse se
+    reemplazan sus valores con los de la fuente (FuenteVentas, FuenteVentasSQLite
+    u otra con `__len__`, `filas(inicio, fin)` y `ordenar(columna, descendente)`). Las filas
+    se piden a la fuente por páginas de FILAS_POR_PAGINA, que se conservan como
+    búfer mientras el usuario se mueve cerca de ellas. Un clic en el encabezado
+    ordena por esa columna.
+    """
+
+    PAGINAS_EN_BUFER = 4
+
+    def __init__(self, parent, fuente, columnas):
+        self.fuente = fuente
+        self.columnas = columnas  # [(id, texto, ancho, anchor)]
+        self.textos = {columna: texto for columna, texto, _, _ in columnas}
+        self.inicio = 0
+        self.visibles = 0
+        self.seleccion = None
+        self.orden = (None, False)
+        self.paginas = {}
+
+        self.frame = tk.Frame(parent, bg="#F0F8FF")
+        self.tree = ttk.Treeview(self.frame, columns=[c[0] for c in columnas], show="headings",
+                                 selectmode="browse")
+        for columna, texto, ancho, anchor in columnas:
+            self.tree.heading(columna, text=texto, command=lambda c=columna: self.ordenar(c))
+            self.tree.column(columna, width=ancho, anchor=anchor)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.desplazar_barra)
+
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.tree.bind("<Configure>", self.ajustar_alto)
+        self.tree.bind("<MouseWheel>", lambda e: self.desplazar(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self.desplazar(-3))
+        self.tree.bind("<Button-5>", lambda e: self.desplazar(3))
+        self.tree.bind("<Up>", lambda e: self.mover_seleccion(-1))
+        self.tree.bind("<Down>", lambda e: self.mover_seleccion(1))
+        self.tree.bind("<Prior>", lambda e: self.mover_seleccion(-max(1, self.visibles - 1)))
+        self.tree.bind("<Next>", lambda e: self.mover_seleccion(max(1, self.visibles - 1)))
+        self.tree.bind("<Home>", lambda e: self.mover_seleccion(-len(self.fuente)))
+        self.tree.bind("<End>", lambda e: self.mover_seleccion(len(self.fuente)))
+        self.tree.bind("<<TreeviewSelect>>", self.al_seleccionar)
+
+        self.ajustar_alto()
+
+    def pack(self, **opciones):
+        self.frame.pack(**opciones)
+
+    def fila(self, fila):
+        """Valores de una fila, pidiendo su página a la fuente si no está en el búfer"""
+        numero = fila // FILAS_POR_PAGINA
+        pagina = self.paginas.pop(numero, None)
+        if pagina is None:
+            pagina = self.fuente.filas(numero * FILAS_POR_PAGINA, (numero + 1) * FILAS_POR_PAGINA)
+            if len(self.paginas) >= self.PAGINAS_EN_BUFER:
+                # Se descarta la página usada hace más tiempo
+                del self.paginas[next(iter(self.paginas))]
+        self.paginas[numero] = pagina
+        return pagina[fila - numero * FILAS_POR_PAGINA]
+
+    def ajustar_alto(self, event=None):
+        """Crear o quitar filas del Treeview para que coincidan con las que caben"""
+        alto = event.height if event is not None else self.tree.winfo_height()
+        # La primera fila del alto es el encabezado
+        visibles = max(1, alto // ALTO_FILA_LISTA - 1) if alto > 1 else int(self.tree.cget("height"))
+        visibles = min(visibles, len(self.fuente))
+        if visibles == self.visibles:
+            return
+        filas = self.tree.get_children()
+        for i in range(len(filas), visibles):
+            self.tree.insert("", "end", iid=str(i))
+        if len(filas) > visibles:
+            self.tree.delete(*filas[visibles:])
+        self.visibles = visibles
+        self.mostrar(self.inicio)
+
+    def mostrar(self, inicio):
+        """Llenar el Treeview con las filas desde `inicio`"""
+        total = len(self.fuente)
+        self.inicio = max(0, min(inicio, total - self.visibles))
+        for i in range(self.visibles):
+            self.tree.item(str(i), values=self.fila(self.inicio + i))
+
+        # La selección se conserva aunque la fila salga de la vista
+        self.tree.selection_remove(*self.tree.selection())
+        if self.seleccion is not None and self.inicio <= self.seleccion < self.inicio + self.visibles:
+            iid = str(self.seleccion - self.inicio)
+            self.tree.selection_set(iid)
+            self.tree.focus(iid)
+
+        if total:
+            self.scrollbar.set(self.inicio / total, (self.inicio + self.visibles) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def desplazar(self, filas):
+        self.mostrar(self.inicio + filas)
+        return "break"
+
+    def desplazar_barra(self, accion, cantidad, unidad=None):
+        """Comando de la barra de desplazamiento"""
+        if accion == "moveto":
+            self.mostrar(int(float(cantidad) * len(self.fuente)))
+        elif accion == "scroll":
+            paso = max(1, self.visibles - 1) if unidad == "pages" else 1
+            self.desplazar(int(cantidad) * paso)
+
+    def al_seleccionar(self, event=None):
+        seleccion = self.tree.selection()
+        if seleccion:
+            self.seleccion = self.inicio + int(seleccion[0])
+
+    def mover_seleccion(self, filas):
+        """Mover la selección con el teclado, desplazando la vista si sale de ella"""
+        if not len(self.fuente):
+            return "break"
+        actual = self.seleccion if self.seleccion is not None else self.inicio - 1
+        self.seleccion = max(0, min(actual + filas, len(self.fuente) - 1))
+        if self.seleccion < self.inicio:
+            self.mostrar(self.seleccion)
+        elif self.seleccion >= self.inicio + self.visibles:
+            self.mostrar(self.seleccion - self.visibles + 1)
+        else:
+            self.mostrar(self.inicio)
+        return "break"
+
+    def ordenar(self, columna):
+        """Ordenar por la columna; un segundo clic invierte el orden y un tercero lo quita"""
+        anterior, descendente = self.orden
+        if anterior != columna:
+            self.orden = (columna, False)
+        elif not descendente:
+            self.orden = (columna, True)
+        else:
+            self.orden = (None, False)
+        self.fuente.ordenar(*self.orden)
+        self.paginas = {}
+        self.seleccion = None
+        for c, texto in self.textos.items():
+            flecha = (" ▼" if self.orden[1] else " ▲") if c == self.orden[0] else ""
+            self.tree.heading(c, text=texto + flecha)
+        self.mostrar(0)
+
+    def seleccionado(self):
+        """Número de fila (en el orden actual) seleccionada, o None"""
+        return self.seleccion
+
+    def bind(self, evento, funcion):
+        self.tree.bind(evento, funcion)
+
+
+class VistaCarrito(ABC):
+    """Vista de un carrito que solo crea, cambia o quita las líneas de los productos que cambiaron.
+
+    Guarda la cantidad y el subtotal que muestra cada línea y ajusta el total
+    con la diferencia, así actualizar un producto cuesta lo mismo sin importar
+    cuántos haya en el carrito. Las subclases dibujan las líneas.
+    """
+
+    def __init__(self):
+        self.lineas = {}  # producto -> (cantidad, precio) mostrados
+        self.subtotales = {}
+        self.total = 0.0
+
+    def actualizar(self, carrito, inventario, claves=None):
+        """Reflejar el carrito; `claves` limita la revisión a esos productos (todos si es None)"""
+        if claves is None:
+            claves = list(self.lineas) + [key for key in carrito if key not in self.lineas]
+        vacio_antes = not self.lineas
+        for key in claves:
+            if key not in carrito:
+                if key in self.lineas:
+                    del self.lineas[key]
+                    self.total -= self.subtotales.pop(key)
+                    self.quitar_linea(key)
+                continue
+            producto = inventario[key]
+            datos = (carrito[key], producto["precio"])
+            if self.lineas.get(key) == datos:
+                continue
+            subtotal = datos[0] * datos[1]
+            self.total += subtotal - self.subtotales.get(key, 0.0)
+            self.subtotales[key] = subtotal
+            if key in self.lineas:
+                self.cambiar_linea(key, producto, *datos, subtotal)
+            else:
+                self.crear_linea(key, producto, *datos, subtotal)
+            self.lineas[key] = datos
+        if not self.lineas:
+            # Sin productos no queda nada que sumar; se evita arrastrar errores de redondeo
+            self.total = 0.0
+        if vacio_antes != (not self.lineas):
+            self.mostrar_vacio(not self.lineas)
+
+    @abstractmethod
+    def crear_linea(self, key, producto, cantidad, precio, subtotal):
+        """Dibujar la línea de un producto nuevo en el carrito"""
+
+    @abstractmethod
+    def cambiar_linea(self, key, producto, cantidad, precio, subtotal):
+        """Actualizar la cantidad, el precio y el subtotal de una línea ya dibujada"""
+
+    @abstractmethod
+    def quitar_linea(self, key):
+        """Borrar la línea de un producto que salió del carrito"""
+
+    @abstractmethod
+    def mostrar_vacio(self, vacio):
+        """Mostrar u ocultar el aviso de carrito vacío"""
+
+
+class VistaCarritoTarjetas(VistaCarrito):
+    """Carrito del cliente: un Frame por producto con su subtotal y un botón para quitarlo"""
+
+    def __init__(self, parent, al_eliminar):
+        super().__init__()
+        self.parent = parent
+        self.al_eliminar = al_eliminar
+        self.widgets = {}
+        self.vacio = tk.Label(parent, text="🛒 Tu carrito está vacío\n\n¡Agrega algunos productos deliciosos!",
+                              font=("Helvetica", 11), bg="white", fg="gray", justify="center")
+        self.vacio.pack(pady=50)
+
+    def crear_linea(self, key, producto, cantidad, precio, subtotal):
+        # Frame del item
+        item_frame = tk.Frame(self.parent, bg="#F8F8F8", relief="solid", bd=1)
+        item_frame.pack(fill="x", padx=5, pady=2)
+        
+        # Info del producto
+        info = tk.Label(item_frame, font=("Helvetica", 10), bg="#F8F8F8", fg="black", justify="left")
+        info.pack(side="left", padx=5, pady=5)
+        
+        # Precio y botón eliminar
+        right_frame = tk.Frame(item_frame, bg="#F8F8F8")
+        right_frame.pack(side="right", padx=5, pady=5)
+        
+        subtotal_label = tk.Label(right_frame, font=("Helvetica", 11, "bold"), bg="#F8F8F8", fg="#228B22")
+        subtotal_label.pack()
+        
+        ttk.Button(right_frame, text="❌", style='Danger.TButton',
+                 command=lambda: self.al_eliminar(key)).pack()
+        
+        self.widgets[key] = (item_frame, info, subtotal_label)
+        self.cambiar_linea(key, producto, cantidad, precio, subtotal)
+
+    def cambiar_linea(self, key, producto, cantidad, precio, subtotal):
+        _, info, subtotal_label = self.widgets[key]
+        info.config(text=f"{producto['nombre']}\n{cantidad:.1f} {producto['unidad']} × ${precio:.2f}")
+        subtotal_label.config(text=f"${subtotal:.2f}")
+
+    def quitar_linea(self, key):
+        self.widgets.pop(key)[0].destroy()
+
+    def mostrar_vacio(self, vacio):
+        if vacio:
+            self.vacio.pack(pady=50)
+        else:
+            self.vacio.pack_forget()
+
+
+class VistaCarritoTexto(VistaCarrito):
+    """Carrito de la venta en mostrador: un Text donde cada producto es un tramo con su propia etiqueta"""
+
+    def __init__(self, texto):
+        super().__init__()
+        self.texto = texto
+        self.texto.insert(tk.END, "Carrito vacío...", "vacio")
+
+    def linea(self, producto, cantidad, precio, subtotal):
+        return f"{producto['nombre']}\n{cantidad:.1f} {producto['unidad']} × ${precio:.2f} = ${subtotal:.2f}\n\n"
+
+    def crear_linea(self, key, producto, cantidad, precio, subtotal):
+        self.texto.insert(tk.END, self.linea(producto, cantidad, precio, subtotal), f"linea:{key}")
+
+    def cambiar_linea(self, key, producto, cantidad, precio, subtotal):
+        inicio, fin = self.texto.tag_ranges(f"linea:{key}")
+        self.texto.delete(inicio, fin)
+        self.texto.insert(inicio, self.linea(producto, cantidad, precio, subtotal), f"linea:{key}")
+
+    def quitar_linea(self, key):
+        self.texto.delete(*self.texto.tag_ranges(f"linea:{key}"))
+
+    def mostrar_vacio(self, vacio):
+        if vacio:
+            self.texto.insert("1.0", "Carrito vacío...", "vacio")
+        elif self.texto.tag_ranges("vacio"):
+            self.texto.delete(*self.texto.tag_ranges("vacio"))
+
+
+class TablaInventario:
+    """Tabla del inventario en un Treeview cuyas filas tienen como id la clave del producto.
+
+    Recuerda los valores y el estilo mostrados en cada fila, así que actualizar
+    solo toca las filas que de verdad cambiaron. `estado_stock(stock)` da
+    "agotado", "poco" o "disponible".
+    """
+
+    ESTADOS = {"disponible": ("✅ Disponible", "success"),
+               "poco": ("⚠️ Poco Stock", "warning"),
+               "agotado": ("❌ Agotado", "danger")}
+
+    def __init__(self, tree, estado_stock):
+        self.tree = tree
+        self.estado_stock = estado_stock
+        self.filas = {}       # clave -> (valores, estilo) mostrados
+        self.posiciones = {}  # clave -> número de la columna ID
+        self.visibles = []    # claves enganchadas al árbol, en orden
+
+        tree.tag_configure('warning', background='#FFFACD')
+        tree.tag_configure('danger', background='#FFE4E1')
+        tree.tag_configure('success', background='#F0FFF0')
+
+    def fila(self, clave, producto):
+        """Valores y estilo de la fila de un producto"""
+        texto, estilo = self.ESTADOS[self.estado_stock(producto["stock"])]
+        return ((self.posiciones[clave], producto["nombre"], f"{producto['stock']:.1f}",
+                 f"${producto['precio']:.2f}", producto["unidad"], texto), estilo)
+
+    def actualizar(self, inventario, claves=None):
+        """Reflejar los cambios de los productos `claves` (todos si es None).
+
+        Devuelve True si se agregaron o quitaron filas.
+        """
+        if claves is None:
+            self.posiciones = {clave: i + 1 for i, clave in enumerate(inventario)}
+            claves = list(inventario) + [clave for clave in self.filas if clave not in inventario]
+
+        estructura = False
+        for clave in claves:
+            producto = inventario.get(clave)
+            if producto is None:
+                if clave in self.filas:
+                    self.tree.delete(clave)
+                    del self.filas[clave]
+                    self.posiciones.pop(clave, None)
+                    if clave in self.visibles:
+                        self.visibles.remove(clave)
+                    estructura = True
+                continue
+
+            if clave not in self.posiciones:
+                self.posiciones[clave] = len(self.posiciones) + 1
+            fila = self.fila(clave, producto)
+            if clave not in self.filas:
+                valores, estilo = fila
+                self.tree.insert("", "end", iid=clave, values=valores, tags=(estilo,))
+                self.visibles.append(clave)
+                estructura = True
+            elif self.filas[clave] != fila:
+                valores, estilo = fila
+                self.tree.item(clave, values=valores, tags=(estilo,))
+            self.filas[clave] = fila
+        return estructura
+
+    def mostrar(self, claves):
+        """Dejar en el árbol solo las filas de `claves`, en ese orden"""
+        claves = [clave for clave in claves if clave in self.filas]
+        if claves == self.visibles:
+            return
+        quedan = set(claves)
+        for clave in self.visibles:
+            if clave not in quedan:
+                self.tree.detach(clave)
+        for posicion, clave in enumerate(claves):
+            self.tree.move(clave, "", posicion)
+        self.visibles = claves
+
+
+class GestorPantallas:
+    """Pantallas de la ventana principal construidas una sola vez y apiladas en el mismo lugar.
+
+    Cada pantalla se registra con una función que la construye dentro del
+    Frame que recibe y devuelve otra función (o None) que actualiza solo las
+    partes que dependen de los datos. Mostrar una pantalla ya construida
+    solo llama a esa función y la trae al frente con tkraise.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.contenedor = None
+        self.constructores = {}
+        self.pantallas = {}  # nombre -> (frame, refrescar)
+        self.actual = None
+
+    def registrar(self, nombre, construir):
+        self.constructores[nombre] = construir
+
+    def mostrar(self, nombre):
+        """Traer al frente la pantalla `nombre`, construyéndola la primera vez"""
+        self.cerrar_ventanas_secundarias()
+        if self.contenedor is None:
+            self.contenedor = tk.Frame(self.root)
+            self.contenedor.pack(fill="both", expand=True)
+            self.contenedor.grid_rowconfigure(0, weight=1)
+            self.contenedor.grid_columnconfigure(0, weight=1)
+        if nombre not in self.pantallas:
+            frame = tk.Frame(self.contenedor)
+            frame.grid(row=0, column=0, sticky="nsew")
+            self.pantallas[nombre] = (frame, self.constructores[nombre](frame))
+        frame, refrescar = self.pantallas[nombre]
+        if refrescar is not None:
+            refrescar()
+        frame.tkraise()
+        self.actual = nombre
+
+    def cerrar_ventanas_secundarias(self):
+        """Cerrar las ventanas abiertas desde la pantalla anterior"""
+        for widget in self.root.winfo_children():
+            if isinstance(widget, tk.Toplevel):
+                widget.destroy()
+
+
 class TortilleriaApp:
-    def __init__(self):
+    def __init__(self, perfilar_inicio=False):
+        # Tiempos del arranque; se imprimen solo con --profile-startup
+        self.perfil_inicio = PerfilInicio()
+        self.perfilar_inicio = perfilar_inicio
+        
         self.root = tk.Tk()
         self.root.title("🌽 Tortillería La Guadalupana - Sistema Integral 🌽")
         self.root.geometry("1300x900")  # Aumentar el tamaño inicial
@@ -79,7 +2992,68 @@ class TortilleriaApp:
         
         # Historial de ventas
         self.historial_ventas = []
-        
+        self.indice_temporal = IndiceTemporal()
+        # Búsqueda de productos por nombre, descripción y categoría
+        self.indice_busqueda = IndiceBusqueda()
+        # Códigos PLU para el cobro rápido con teclado
+        self.indice_plu = IndicePLU()
+        # Funciones que reciben las claves de los productos modificados (None: todos)
+        self.observadores_productos = []
+
+        # Diario de ventas nuevas pendientes de compactar
+        self.diario_ventas = DiarioVentas(ARCHIVO_DIARIO_VENTAS)
+
+        # Carga por meses del historial (al iniciar solo se lee el mes actual)
+        self.cargador_historial = CargadorHistorial(ARCHIVO_VENTAS)
+
+        # Ventas particionadas por día (solo si se eligió ese almacenamiento)
+        self.ventas_particionadas = None
+        if BACKEND_ALMACENAMIENTO == "particiones":
+            self.ventas_particionadas = VentasParticionadas(DIRECTORIO_VENTAS)
+            self.cargador_historial = self.ventas_particionadas
+
+        self.archivo_columnar = ArchivoColumnar(DIRECTORIO_ARCHIVO_VENTAS)
+        self.cargador_historial.archivo = self.archivo_columnar
+
+        # Versión de cada colección (aumenta con cada cambio) y estadísticas calculadas con ellas
+        self.versiones = {"inventario": 0, "historial_ventas": 0, "usuarios_sistema": 0}
+        self.cache_estadisticas = CacheEstadisticas()
+
+        # Reportes del historial completo repartidos entre varios procesos
+        self.motor_reportes = MotorReportes()
+        # Los reportes se calculan en otro hilo; este bloqueo protege las ventas en
+        # memoria y el resumen de ventas mientras el hilo principal registra ventas
+        self.bloqueo_historial = threading.RLock()
+
+        # Totales por día para los reportes, actualizados con cada venta
+        self.resumen_ventas = ResumenVentas(ARCHIVO_RESUMEN_VENTAS)
+        self.pronostico_demanda = PronosticoDemanda(ARCHIVO_PRONOSTICO)
+        self.historial_cargado_desde = ""  # En SQLite: fecha desde la que hay ventas en memoria
+
+        # Base de datos SQLite (solo si se eligió ese almacenamiento)
+        self.almacen_sqlite = None
+        if BACKEND_ALMACENAMIENTO == "sqlite":
+            try:
+                self.almacen_sqlite = AlmacenSQLite(ARCHIVO_SQLITE)
+            except Exception as e:
+                print(f"No se pudo abrir la base de datos, se usarán archivos JSON: {e}")
+
+        # Guardado en segundo plano del inventario y los usuarios
+        self.persistencia = PersistenciaEnSegundoPlano(self.root, self.mostrar_error_guardado)
+        self.ejecutor_tareas = EjecutorTareas(self.root)
+        if self.almacen_sqlite is not None:
+            self.persistencia.registrar_escritor("inventario", self.almacen_sqlite.guardar_inventario)
+            self.persistencia.registrar_escritor("usuarios", self.almacen_sqlite.guardar_usuarios)
+        else:
+            self.persistencia.registrar_escritor(
+                "inventario", lambda inventario: escribir_json_atomico(ARCHIVO_INVENTARIO, inventario))
+        if self.ventas_particionadas is not None:
+            self.persistencia.registrar_escritor("manifiesto", self.ventas_particionadas.guardar_manifiesto)
+        self.persistencia.registrar_escritor(
+            "resumen", lambda resumen: escribir_json_atomico(ARCHIVO_RESUMEN_VENTAS, resumen))
+        self.persistencia.registrar_escritor(
+            "pronostico", lambda pronostico: escribir_json_atomico(ARCHIVO_PRONOSTICO, pronostico))
+
         # Configurar fuentes personalizadas
         self.fuente_titulo = font.Font(family="Helvetica", size=18, weight="bold")
         self.fuente_subtitulo = font.Font(family="Helvetica", size=14, weight="bold")
@@ -87,13 +3061,25 @@ class TortilleriaApp:
         self.fuente_precio = font.Font(family="Helvetica", size=13, weight="bold")
         
         # Estilos para ttk
-        self.configurar_estilos()
-        
-        # Cargar datos
-        self.cargar_datos()
-        
-        # Inicializar con pantalla de bienvenida
-        self.crear_pantalla_bienvenida()
+        with self.perfil_inicio.medir("configurar_estilos"):
+            self.configurar_estilos()
+        
+        # Pantallas de la ventana principal (se construyen la primera vez que se muestran)
+        self.pantallas = GestorPantallas(self.root)
+        self.pantallas.registrar("carga", self.construir_pantalla_carga)
+        self.pantallas.registrar("bienvenida", self.construir_pantalla_bienvenida)
+        self.pantallas.registrar("login", self.construir_login_empleado)
+        self.pantallas.registrar("cliente", self.construir_interfaz_cliente)
+        self.pantallas.registrar("empleado", self.construir_interfaz_empleado)
+        self.pantallas.registrar("admin", self.construir_interfaz_admin)
+        
+        # La ventana aparece de inmediato con un aviso de carga; los datos se leen
+        # en el hilo de tareas y al terminar se muestra la pantalla de bienvenida
+        self.datos_cargados = False
+        self.pantallas.mostrar("carga")
+        self.root.after_idle(self.perfil_inicio.marcar, "ventana visible")
+        self.ejecutor_tareas.enviar(self.cargar_datos_inicio, self.terminar_carga_inicio,
+                                    self.terminar_carga_inicio)
         
     def configurar_estilos(self):
         """Configura estilos personalizados para widgets ttk"""
@@ -154,48 +3140,628 @@ class TortilleriaApp:
         style.configure('Treeview.Heading',
                       font=('Helvetica', 11, 'bold'))
         
+    def cargar_datos_inicio(self):
+        """Leer los datos guardados al iniciar (en el hilo de tareas)"""
+        with self.perfil_inicio.medir("cargar_datos"):
+            self.cargar_datos()
+        with self.perfil_inicio.medir("cargar_resumen_ventas"):
+            self.cargar_resumen_ventas()
+
+    def terminar_carga_inicio(self, error=None):
+        """Pasar del aviso de carga a la pantalla de bienvenida (hilo principal)"""
+        if error is not None:
+            print(f"Error al cargar datos: {error}")
+        self.asignar_plu_faltantes()
+        self.datos_cargados = True
+        with self.perfil_inicio.medir("crear_pantalla_bienvenida"):
+            self.crear_pantalla_bienvenida()
+        if self.perfilar_inicio:
+            self.root.after_idle(self.mostrar_perfil_inicio)
+
+    def mostrar_perfil_inicio(self):
+        """Imprimir los tiempos del arranque una vez dibujada la pantalla de bienvenida"""
+        self.perfil_inicio.marcar("bienvenida visible")
+        print(self.perfil_inicio.reporte())
+
     def cargar_datos(self):
-        """Cargar datos desde archivos JSON"""
+        """Cargar datos desde archivos JSON o desde la base de datos SQLite"""
+        if self.almacen_sqlite is not None and not self.almacen_sqlite.esta_vacio():
+            self.cargar_datos_sqlite()
+            return
+
         try:
-            if os.path.exists("inventario_tortilleria.json"):
-                with open("inventario_tortilleria.json", "r", encoding="utf-8") as f:
+            if os.path.exists(ARCHIVO_INVENTARIO):
+                with open(ARCHIVO_INVENTARIO, "r", encoding="utf-8") as f:
                     self.inventario = json.load(f)
         except Exception as e:
             print(f"Error al cargar inventario: {e}")
-            
+
+        if self.ventas_particionadas is not None:
+            self.cargar_ventas_particionadas()
+            return
+
         try:
-            if os.path.exists("ventas_tortilleria.json"):
-                with open("ventas_tortilleria.json", "r", encoding="utf-8") as f:
-                    self.historial_ventas = json.load(f)
+            desde_mes = self.inicio_ventana_historial()[:7]
+            self.historial_ventas = self.cargador_historial.cargar_recientes(desde_mes)
         except Exception as e:
             print(f"Error al cargar historial: {e}")
-    
+
+        # Reconstruir las ventas que aún no se han compactado
+        try:
+            pendientes = self.diario_ventas.leer()
+            if pendientes:
+                self.cargar_meses_historial({v["fecha"][:7] for v in pendientes})
+                # Si la compactación anterior se interrumpió después de escribir
+                # el archivo principal, las ventas del diario ya están en él
+                if self.historial_ventas[-len(pendientes):] == pendientes:
+                    self.diario_ventas.vaciar()
+                else:
+                    self.historial_ventas.extend(pendientes)
+        except Exception as e:
+            print(f"Error al cargar diario de ventas: {e}")
+
+        # Primera ejecución con SQLite: migrar los datos de los archivos JSON
+        if self.almacen_sqlite is not None:
+            try:
+                self.cargar_meses_historial(self.cargador_historial.meses_pendientes())
+                self.almacen_sqlite.guardar_inventario(self.inventario)
+                self.almacen_sqlite.guardar_usuarios(self.usuarios_sistema)
+                self.almacen_sqlite.reemplazar_ventas(self.historial_ventas)
+            except Exception as e:
+                print(f"Error al migrar datos a SQLite: {e}")
+
+    def cargar_datos_sqlite(self):
+        """Cargar inventario, usuarios y ventas recientes desde la base de datos"""
+        try:
+            self.inventario = self.almacen_sqlite.cargar_inventario()
+            usuarios = self.almacen_sqlite.cargar_usuarios()
+            if usuarios:
+                self.usuarios_sistema = usuarios
+            self.historial_cargado_desde = self.inicio_ventana_historial()
+            self.historial_ventas = self.almacen_sqlite.ventas_en_rango(self.historial_cargado_desde, "9999")
+        except Exception as e:
+            print(f"Error al cargar datos de SQLite: {e}")
+
+    def cargar_ventas_particionadas(self):
+        """Abrir las particiones por día (migrando el historial JSON la primera vez)"""
+        try:
+            corregido = self.ventas_particionadas.abrir()
+            if not self.ventas_particionadas.existe():
+                ventas = CargadorHistorial(ARCHIVO_VENTAS).cargar_recientes("")
+                diario = self.diario_ventas.leer()
+                if ventas[-len(diario):] != diario:
+                    ventas.extend(diario)
+                self.ventas_particionadas.reescribir(ventas)
+                # Las ventas migradas no se quedan en memoria; se cargan abajo por meses
+                self.ventas_particionadas.cargados.clear()
+            elif corregido:
+                self.persistencia.marcar_sucio("manifiesto", self.copia_manifiesto_ventas)
+
+            desde_mes = self.inicio_ventana_historial()[:7]
+            self.historial_ventas = self.ventas_particionadas.cargar_recientes(desde_mes)
+        except Exception as e:
+            print(f"Error al cargar ventas particionadas: {e}")
+
+    def cargar_resumen_ventas(self):
+        """Leer el resumen de ventas y comprobar que corresponde al historial"""
+        try:
+            self.resumen_ventas.cargar()
+            self.resumen_ventas.vigente = self.resumen_ventas.ventas == self.contar_ventas()
+        except Exception as e:
+            print(f"Error al cargar el resumen de ventas, se reconstruirá: {e}")
+            self.resumen_ventas.vigente = False
+        try:
+            self.pronostico_demanda.cargar()
+        except Exception as e:
+            print(f"Error al cargar el pronóstico de demanda, se volverá a calcular: {e}")
+            self.pronostico_demanda.reiniciar()
+
+    def bloques_historial(self, desde=None, hasta=None):
+        """Bloques (uno por mes no cargado, más las ventas en memoria) que forman el historial completo.
+
+        Con `desde`/`hasta` solo se incluyen los bloques que se cruzan con
+        [desde, hasta); los bloques de archivo columnar pueden traer ventas
+        fuera del rango, así que quien los lea debe filtrar por fecha.
+        """
+        with self.bloqueo_historial:
+            return self._bloques_historial(desde, hasta)
+
+    def _bloques_historial(self, desde, hasta):
+        bloques = []
+        if self.almacen_sqlite is not None:
+            if self.historial_cargado_desde:
+                limite = min(self.historial_cargado_desde, hasta or "9999")
+                for mes in self.almacen_sqlite.meses(limite):
+                    if mes_siguiente(mes) > (desde or ""):
+                        bloques.append(("sqlite", ARCHIVO_SQLITE, max(mes, desde or ""),
+                                        min(mes_siguiente(mes), limite)))
+        else:
+            for mes in self.cargador_historial.meses_pendientes(desde, hasta):
+                if self.archivo_columnar.vigente(mes, self.cargador_historial.meses[mes]["ventas"]):
+                    bloques.append(("columnar", DIRECTORIO_ARCHIVO_VENTAS, mes))
+                elif self.ventas_particionadas is not None:
+                    dias = self.ventas_particionadas.dias_en_rango(max(mes, desde or ""),
+                                                                   min(mes_siguiente(mes), hasta or "9999"))
+                    bloques.append(("particiones", [self.ventas_particionadas.ruta_dia(dia) for dia in dias]))
+                else:
+                    bloques.append(("json", ARCHIVO_VENTAS, self.cargador_historial.meses[mes]["rangos"]))
+        if desde is not None or hasta is not None:
+            en_memoria = self.ventas_en_memoria(desde or "", hasta or "9999")
+        else:
+            # Copia: el hilo principal puede seguir agregando ventas mientras se calcula
+            en_memoria = list(self.historial_ventas)
+        if en_memoria:
+            bloques.append(("ventas", en_memoria))
+        return bloques
+
+    def agrupaciones_historial(self, bloques=None, inventario=None):
+        """Ventas por día, hora, vendedor y producto de todo el historial (o de los bloques dados)"""
+        if bloques is None:
+            bloques = self.bloques_historial()
+        if inventario is None:
+            inventario = self.inventario
+        # list() copia los productos de una vez aunque el inventario cambie en el hilo principal
+        precios = {clave: p["precio"] for clave, p in list(inventario.items())}
+        return self.motor_reportes.calcular(bloques, precios)
+
+    def reconstruir_resumen_ventas(self):
+        """Rehacer el resumen de ventas con las agrupaciones del historial completo y guardarlo"""
+        agrupaciones = self.agrupaciones_historial()
+        with self.bloqueo_historial:
+            self.resumen_ventas.reconstruir(agrupaciones, self.inventario)
+            # Las ventas registradas mientras se calculaba no están en el resumen
+            self.resumen_ventas.vigente = self.resumen_ventas.ventas == self.contar_ventas()
+            if self.resumen_ventas.vigente:
+                self.persistencia.marcar_sucio("resumen", self.copia_resumen_ventas)
+
+    def inicio_ventana_historial(self):
+        """Fecha (YYYY-MM-DD) desde la que se cargan las ventas al iniciar: el mes actual"""
+        return datetime.now().strftime("%Y-%m-01")
+
+    def cargar_meses_historial(self, meses):
+        """Leer del archivo JSON los meses indicados que aún no están en memoria"""
+        meses = [mes for mes in meses if mes in self.cargador_historial.meses
+                 and mes not in self.cargador_historial.cargados]
+        if not meses:
+            return
+        anteriores = self.cargador_historial.leer_meses(meses)
+        with self.bloqueo_historial:
+            # Otro hilo pudo cargar alguno de estos meses mientras se leían
+            nuevos = [mes for mes in meses if mes not in self.cargador_historial.cargados]
+            if len(nuevos) < len(meses):
+                anteriores = [v for v in anteriores if v["fecha"][:7] in nuevos]
+            self.cargador_historial.cargados.update(nuevos)
+            # Ambas listas ya están ordenadas, así que el ordenamiento solo las intercala
+            self.historial_ventas = anteriores + self.historial_ventas
+            self.historial_ventas.sort(key=lambda v: v["fecha"])
+
+    def asegurar_historial(self, desde=None, hasta=None):
+        """Cargar en memoria las ventas del rango [desde, hasta) que aún no se han leído"""
+        try:
+            if self.almacen_sqlite is not None:
+                cargado_desde = self.historial_cargado_desde
+                if cargado_desde and (desde is None or desde < cargado_desde):
+                    inicio = desde or ""
+                    anteriores = self.almacen_sqlite.ventas_en_rango(inicio, cargado_desde)
+                    with self.bloqueo_historial:
+                        if self.historial_cargado_desde == cargado_desde:
+                            self.historial_ventas[:0] = anteriores
+                            self.historial_cargado_desde = inicio
+                return
+            self.cargar_meses_historial(self.cargador_historial.meses_pendientes(desde, hasta))
+        except Exception as e:
+            print(f"Error al cargar historial anterior: {e}")
+
+    def contar_ventas(self):
+        """Número total de ventas registradas, incluidas las que no están en memoria"""
+        if self.almacen_sqlite is not None:
+            if not self.historial_cargado_desde:
+                return len(self.historial_ventas)
+            return len(self.historial_ventas) + self.almacen_sqlite.contar_ventas(hasta=self.historial_cargado_desde)
+        return len(self.historial_ventas) + self.cargador_historial.ventas_pendientes()
+
     def guardar_datos(self):
-        """Guardar datos en archivos JSON"""
+        """Programar el guardado del inventario (y usuarios en SQLite) en segundo plano"""
+        self.persistencia.marcar_sucio("inventario", copy.deepcopy(self.inventario))
+        if self.almacen_sqlite is not None:
+            self.persistencia.marcar_sucio("usuarios", copy.deepcopy(self.usuarios_sistema))
+
+    def mostrar_error_guardado(self, coleccion, error):
+        """Mostrar un error ocurrido en el hilo de guardado"""
+        messagebox.showerror("Error", f"No se pudo guardar {coleccion}: {str(error)}")
+
+    def preparar_historial_importado(self, historial, inventario=None):
+        """Calcular el resumen del historial nuevo y escribirlo sin tocar el actual; puede llamarse desde otro hilo.
+
+        El resumen se calcula antes de escribir, así que si falla los archivos
+        no cambiaron. Devuelve lo que necesita confirmar_historial_importado.
+        """
+        if inventario is None:
+            inventario = self.inventario
+        resumen = ResumenVentas(ARCHIVO_RESUMEN_VENTAS)
+        resumen.reconstruir(self.agrupaciones_historial([("ventas", historial)], inventario), inventario)
+        if self.almacen_sqlite is not None:
+            # Tablas temporales; confirmar_historial_importado las pasa a las reales en una transacción
+            self.almacen_sqlite.preparar_importacion(historial)
+            return None, resumen
+        if self.ventas_particionadas is not None:
+            return self.ventas_particionadas.preparar_reescritura(historial), resumen
+        return escribir_ventas_archivo_json(ARCHIVO_VENTAS + ".importado", historial), resumen
+
+    def confirmar_historial_importado(self, historial, preparado, inventario, usuarios):
+        """Poner en uso el historial escrito por preparar_historial_importado (hilo principal)
+
+        Con SQLite los productos y usuarios importados se guardan en la misma
+        transacción que las ventas; con archivos los guarda después guardar_datos.
+        """
+        preparado, resumen = preparado
+        if self.almacen_sqlite is not None:
+            self.almacen_sqlite.confirmar_importacion(inventario, usuarios)
+            self.historial_cargado_desde = ""
+        elif self.ventas_particionadas is not None:
+            self.ventas_particionadas.confirmar_reescritura(preparado)
+            self.archivo_columnar.eliminar_todo()
+        else:
+            os.replace(ARCHIVO_VENTAS + ".importado", ARCHIVO_VENTAS)
+            self.cargador_historial.reconstruir(historial, preparado)
+            self.diario_ventas.vaciar()
+            self.archivo_columnar.eliminar_todo()
+        with self.bloqueo_historial:
+            self.resumen_ventas = resumen
+            self.persistencia.marcar_sucio("resumen", self.copia_resumen_ventas)
+
+    def buscar_productos(self, consulta):
+        """Claves, en el orden del inventario, de los productos que coinciden con `consulta` (todas si está vacía)"""
+        coincidencias = self.indice_busqueda.buscar(self.inventario, consulta)
+        if coincidencias is None:
+            return list(self.inventario)
+        return [clave for clave in self.inventario if clave in coincidencias]
+
+    def asignar_plu_faltantes(self):
+        """Dar código PLU a los productos que no tienen (datos anteriores al cobro rápido)"""
+        faltantes = [clave for clave, producto in self.inventario.items() if not producto.get("plu")]
+        if not faltantes:
+            return
+        siguiente = int(self.indice_plu.siguiente(self.inventario))
+        for clave in faltantes:
+            self.inventario[clave]["plu"] = str(siguiente)
+            self.indice_plu.actualizar(clave, self.inventario[clave])
+            siguiente += 1
+        self.marcar_cambio("inventario")
+        self.guardar_datos()
+
+    def detalle_venta(self, carrito):
+        """Precio unitario y subtotal de cada producto del carrito al momento de la venta"""
+        return {key: {"precio": self.inventario[key]["precio"],
+                      "subtotal": cantidad * self.inventario[key]["precio"]}
+                for key, cantidad in carrito.items()}
+
+    def marcar_cambio(self, *colecciones):
+        """Aumentar la versión de las colecciones modificadas; invalida sus estadísticas"""
+        for coleccion in colecciones:
+            self.versiones[coleccion] += 1
+
+    def avisar_cambio_productos(self, claves=None):
+        """Avisar a las vistas abiertas qué productos cambiaron (None: todo el inventario)"""
+        for observador in list(self.observadores_productos):
+            observador(claves)
+
+    def observar_productos(self, ventana, observador):
+        """Suscribir `observador` a avisar_cambio_productos mientras `ventana` exista"""
+        def al_cerrar(event):
+            # <Destroy> de una Toplevel también llega por cada widget hijo que se destruye
+            if event.widget is ventana and observador in self.observadores_productos:
+                self.observadores_productos.remove(observador)
+        
+        self.observadores_productos.append(observador)
+        # add="+": no reemplazar otros manejadores de <Destroy> de la ventana
+        ventana.bind("<Destroy>", al_cerrar, add="+")
+
+    def estado_stock(self, stock):
+        """Estado de un producto según su stock: agotado, poco (≤5) o disponible"""
+        return "agotado" if stock <= 0 else "poco" if stock <= 5 else "disponible"
+
+    def estadisticas_inventario(self):
+        """Número de productos, agotados, con poco stock y valor del inventario"""
+        def calcular():
+            valores = {"productos": len(self.inventario), "agotado": 0, "poco": 0, "disponible": 0,
+                       "valor": 0.0}
+            for producto in self.inventario.values():
+                valores[self.estado_stock(producto["stock"])] += 1
+                valores["valor"] += producto["stock"] * producto["precio"]
+            return valores
+        return self.cache_estadisticas.obtener("inventario", self.versiones["inventario"], calcular)
+
+    def estadisticas_usuarios(self):
+        """Número de usuarios por rol"""
+        def calcular():
+            valores = {"usuarios": len(self.usuarios_sistema), "admin": 0, "empleado": 0}
+            for usuario in self.usuarios_sistema.values():
+                if usuario["role"] in valores:
+                    valores[usuario["role"]] += 1
+            return valores
+        return self.cache_estadisticas.obtener("usuarios_sistema", self.versiones["usuarios_sistema"], calcular)
+
+    def estadisticas_ventas(self, al_terminar, al_fallar=None):
+        """Número de ventas, monto, ventas por vendedor y por hora de todo el historial.
+
+        Si no están en caché se calculan en el hilo de reportes; `al_terminar(valores)`
+        se llama siempre en el hilo principal.
+        """
+        version = self.versiones["historial_ventas"]
+        valores = self.cache_estadisticas.vigentes("historial_ventas", version)
+        if valores is not None:
+            al_terminar(valores)
+            return
+        
+        def calcular():
+            agrupaciones = self.agrupaciones_historial()
+            return {"ventas": agrupaciones["ventas"], "monto": agrupaciones["monto"],
+                    "vendedores": agrupaciones["vendedores"], "horas": agrupaciones["horas"]}
+        
+        def guardar(valores):
+            # Con la versión de cuando se pidieron: si hubo ventas mientras tanto, la próxima vez se recalculan
+            self.cache_estadisticas.guardar("historial_ventas", version, valores)
+            al_terminar(valores)
+        
+        self.ejecutor_tareas.enviar(calcular, guardar, al_fallar)
+
+    def ajustar_estadisticas_venta(self, venta):
+        """Sumar una venta a las estadísticas en caché en lugar de recalcularlas.
+
+        Quien registra la venta ya descontó el stock, así que el stock anterior
+        de cada producto es el actual más la cantidad vendida.
+        """
+        def ajustar_inventario(valores):
+            for key, cantidad in venta["productos"].items():
+                if key not in self.inventario:
+                    continue
+                producto = self.inventario[key]
+                valores[self.estado_stock(producto["stock"] + cantidad)] -= 1
+                valores[self.estado_stock(producto["stock"])] += 1
+                valores["valor"] -= cantidad * producto["precio"]
+
+        def ajustar_ventas(valores):
+            valores["ventas"] += 1
+            valores["monto"] += venta["total"]
+            vendedor = valores["vendedores"].setdefault(venta["vendedor"], {"count": 0, "total": 0.0})
+            vendedor["count"] += 1
+            vendedor["total"] += venta["total"]
+            hora = valores["horas"][int(venta["fecha"][11:13])]
+            hora["count"] += 1
+            hora["total"] += venta["total"]
+
+        for coleccion, ajuste in (("inventario", ajustar_inventario), ("historial_ventas", ajustar_ventas)):
+            anterior = self.versiones[coleccion]
+            self.marcar_cambio(coleccion)
+            self.cache_estadisticas.ajustar(coleccion, anterior, self.versiones[coleccion], ajuste)
+
+    def registrar_venta(self, venta):
+        """Registrar una venta nueva y guardarla junto con el stock actualizado"""
+        # El historial y el resumen cambian juntos: un reporte en el hilo de tareas ve ambos o ninguno
+        with self.bloqueo_historial:
+            self.indice_temporal.agregar(self.historial_ventas, venta)
+            self.actualizar_resumen_ventas(venta)
+        self.ajustar_estadisticas_venta(venta)
+        self.avisar_cambio_productos(list(venta["productos"]))
+
+        if self.almacen_sqlite is not None:
+            try:
+                self.almacen_sqlite.registrar_venta(venta, self.inventario)
+            except Exception as e:
+                messagebox.showerror("Error", f"No se pudo guardar la venta: {str(e)}")
+                return
+            # Reemplazar la copia del inventario que espere el hilo de guardado:
+            # si no, escribiría encima el stock anterior a esta venta
+            self.guardar_datos()
+            return
+
         try:
-            with open("inventario_tortilleria.json", "w", encoding="utf-8") as f:
-                json.dump(self.inventario, f, indent=2, ensure_ascii=False)
+            if self.ventas_particionadas is not None:
+                # Bajo el bloqueo: el hilo de guardado copia el manifiesto y el de reportes lo consulta
+                with self.bloqueo_historial:
+                    self.ventas_particionadas.agregar(venta)
+                self.persistencia.marcar_sucio("manifiesto", self.copia_manifiesto_ventas)
+            else:
+                self.diario_ventas.agregar(venta)
         except Exception as e:
-            messagebox.showerror("Error", f"No se pudo guardar el inventario: {str(e)}")
-            
+            messagebox.showerror("Error", f"No se pudo guardar la venta: {str(e)}")
+            return
+
+        self.guardar_datos()
+
+        if self.diario_ventas.entradas >= LIMITE_DIARIO_VENTAS:
+            self.compactar_ventas()
+
+    def actualizar_resumen_ventas(self, venta):
+        """Sumar la venta al resumen de ventas y programar su guardado"""
+        if self.resumen_ventas.vigente:
+            self.resumen_ventas.agregar(venta, self.inventario)
+            self.persistencia.marcar_sucio("resumen", self.copia_resumen_ventas)
+
+    def copia_resumen_ventas(self):
+        """Copia del resumen de ventas para el hilo de guardado, tomada bajo el bloqueo del historial"""
+        with self.bloqueo_historial:
+            return self.resumen_ventas.instantanea()
+
+    def copia_manifiesto_ventas(self):
+        """Copia del manifiesto de las particiones para el hilo de guardado"""
+        with self.bloqueo_historial:
+            return self.ventas_particionadas.manifiesto()
+
+    def compactar_ventas(self):
+        """Pasar las ventas del diario al archivo principal y vaciar el diario"""
+        if self.almacen_sqlite is not None or self.ventas_particionadas is not None:
+            return
+        if self.diario_ventas.entradas == 0:
+            return
+
         try:
-            with open("ventas_tortilleria.json", "w", encoding="utf-8") as f:
-                json.dump(self.historial_ventas, f, indent=2, ensure_ascii=False)
+            pendientes = self.diario_ventas.leer()
+            posiciones = agregar_ventas_archivo_json(ARCHIVO_VENTAS, pendientes)
+            with self.bloqueo_historial:
+                self.cargador_historial.registrar_agregadas(pendientes, posiciones)
+            self.diario_ventas.vaciar()
         except Exception as e:
-            messagebox.showerror("Error", f"No se pudo guardar el historial de ventas: {str(e)}")
-    
-    def limpiar_ventana(self):
-        """Limpiar todos los widgets de la ventana"""
-        for widget in self.root.winfo_children():
-            widget.destroy()
+            print(f"Error al compactar el diario de ventas: {e}")
+
+    def rango_en_memoria(self, desde, hasta):
+        """Indica si todas las ventas de [desde, hasta) ya están en historial_ventas"""
+        if self.almacen_sqlite is not None:
+            return not self.historial_cargado_desde or desde >= self.historial_cargado_desde
+        return not self.cargador_historial.meses_pendientes(desde, hasta)
+
+    def ventas_en_memoria(self, desde, hasta, vendedor=None):
+        """Ventas de historial_ventas en [desde, hasta) usando el índice por fecha"""
+        with self.bloqueo_historial:
+            ventas = self.indice_temporal.rango(self.historial_ventas, desde, hasta)
+        if vendedor is not None:
+            ventas = [v for v in ventas if v["vendedor"] == vendedor]
+        return ventas
+
+    def consultar_ventas(self, desde, hasta, vendedor=None):
+        """Ventas con fecha en [desde, hasta), opcionalmente de un solo vendedor"""
+        if self.rango_en_memoria(desde, hasta):
+            return self.ventas_en_memoria(desde, hasta, vendedor)
+
+        if self.almacen_sqlite is not None:
+            try:
+                return self.almacen_sqlite.ventas_en_rango(desde, hasta, vendedor)
+            except Exception as e:
+                print(f"Error al consultar ventas en SQLite: {e}")
+
+        if self.ventas_particionadas is not None:
+            # Solo se abren las particiones de los días del rango
+            try:
+                return [v for v in self.ventas_particionadas.leer_rango(desde, hasta)
+                        if vendedor is None or v["vendedor"] == vendedor]
+            except Exception as e:
+                print(f"Error al leer particiones de ventas: {e}")
+
+        self.asegurar_historial(desde, hasta)
+        return self.ventas_en_memoria(desde, hasta, vendedor)
+
+    def ventas_del_dia(self, fecha=None):
+        """Ventas de un día (por defecto hoy); `fecha` en formato YYYY-MM-DD"""
+        dia = datetime.strptime(fecha, "%Y-%m-%d") if fecha else datetime.now()
+        desde = dia.strftime("%Y-%m-%d")
+        hasta = (dia + timedelta(days=1)).strftime("%Y-%m-%d")
+        return self.consultar_ventas(desde, hasta)
+
+    def asegurar_resumen_ventas(self):
+        """Reconstruir el resumen de ventas si no corresponde al historial"""
+        if not self.resumen_ventas.vigente:
+            try:
+                self.reconstruir_resumen_ventas()
+            except Exception as e:
+                print(f"Error al reconstruir el resumen de ventas: {e}")
+
+    def resumen_ventas_por_dia(self):
+        """Número de ventas, monto y unidades por producto de cada día (YYYY-MM-DD) en todo el historial"""
+        self.asegurar_resumen_ventas()
+        return self.resumen_ventas.dias
+
+    def productos_mas_vendidos(self, k=PRODUCTOS_EN_REPORTE):
+        """Los `k` productos con más unidades vendidas: nombre, unidad, cantidad, monto y tickets"""
+        self.asegurar_resumen_ventas()
+        with self.bloqueo_historial:
+            return [(clave, dict(datos)) for clave, datos in self.resumen_ventas.mas_vendidos(k)]
+
+    def productos_comprados_juntos(self, desde=None, hasta=None, soporte_minimo=SOPORTE_MINIMO,
+                                   confianza_minima=CONFIANZA_MINIMA):
+        """(tickets, combinaciones frecuentes, reglas de asociación) del historial o de [desde, hasta).
+
+        Sin rango se usan los pares del resumen de ventas; con rango se cuentan
+        también las combinaciones de hasta TAMANO_MAXIMO_CONJUNTO productos,
+        repartiendo los bloques del historial entre los procesos de reportes.
+        """
+        if desde is None and hasta is None:
+            self.asegurar_resumen_ventas()
+            with self.bloqueo_historial:
+                tickets, conteos = self.resumen_ventas.conteos_canastas()
+        else:
+            tickets, conteos = self.motor_reportes.contar_canastas(self.bloques_historial(desde, hasta),
+                                                                   desde, hasta)
+        return (tickets, *reglas_asociacion(tickets, conteos, soporte_minimo, confianza_minima))
+
+    def produccion_sugerida(self):
+        """Demanda pronosticada para mañana y cuánto producir de cada producto según su stock actual.
+
+        Devuelve {producto: {"demanda", "sugerido"}}, o un diccionario vacío si
+        aún no hay una semana de ventas para pronosticar.
+        """
+        self.asegurar_resumen_ventas()
+        hoy = datetime.now()
+        # Puede llamarse desde el hilo de reportes: el resumen se lee bajo el bloqueo del historial
+        with self.bloqueo_historial:
+            actualizado = self.pronostico_demanda.actualizar(self.resumen_ventas.dias, hoy.strftime("%Y-%m-%d"))
+        if actualizado:
+            self.persistencia.marcar_sucio("pronostico", self.pronostico_demanda.instantanea())
+        demanda = self.pronostico_demanda.pronostico((hoy + timedelta(days=1)).strftime("%Y-%m-%d"))
+        if not demanda:
+            return {}
+        resultado = {}
+        for key, producto in list(self.inventario.items()):
+            esperado = demanda.get(key, 0.0)
+            resultado[key] = {"demanda": esperado,
+                              "sugerido": max(0.0, esperado * (1 + MARGEN_PRODUCCION) - producto["stock"])}
+        return resultado
+
+    def mapa_calor_ventas(self, prod_key=None, campo="unidades"):
+        """Lista de 168 valores (franja_semana) de un producto, o de todos si `prod_key` es None"""
+        self.asegurar_resumen_ventas()
+        with self.bloqueo_historial:
+            mapa = self.resumen_ventas.mapa_calor
+            if prod_key is not None:
+                return list(mapa[prod_key][campo]) if prod_key in mapa else [0.0] * 168
+            celdas = [0.0] * 168
+            for datos in mapa.values():
+                celdas = [a + b for a, b in zip(celdas, datos[campo])]
+            return celdas
+
+    def archivar_periodos_cerrados(self):
+        """Crear el archivo columnar de cada mes anterior al actual que no lo tenga"""
+        if self.almacen_sqlite is not None:
+            messagebox.showinfo("Archivo de Ventas",
+                                "Con la base de datos SQLite las consultas ya usan índices;\nno es necesario archivar.")
+            return
+
+        try:
+            self.compactar_ventas()
+            mes_actual = datetime.now().strftime("%Y-%m")
+            archivados = 0
+            for mes, datos in sorted(self.cargador_historial.meses.items()):
+                if mes >= mes_actual or self.archivo_columnar.vigente(mes, datos["ventas"]):
+                    continue
+                if mes in self.cargador_historial.cargados:
+                    ventas = self.ventas_en_memoria(mes, mes_siguiente(mes))
+                else:
+                    ventas = self.cargador_historial.leer_meses([mes])
+                self.archivo_columnar.archivar_mes(mes, ventas)
+                archivados += 1
+
+            messagebox.showinfo("Archivo de Ventas",
+                                f"Meses archivados en formato compacto: {archivados}")
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo archivar el historial: {str(e)}")
+
+    def construir_pantalla_carga(self, frame):
+        """Crear la pantalla que se ve mientras se leen los datos al iniciar"""
+        frame.configure(bg="#2E8B57")
+        
+        tk.Label(frame, text="🌽 TORTILLERÍA LA GUADALUPANA 🌽",
+                font=("Helvetica", 28, "bold"), bg="#2E8B57", fg="#FFD700").pack(expand=True, anchor="s", pady=10)
+        tk.Label(frame, text="⏳ Cargando datos...",
+                font=("Helvetica", 14, "italic"), bg="#2E8B57", fg="white").pack(expand=True, anchor="n")
     
     def crear_pantalla_bienvenida(self):
-        """Crear pantalla de bienvenida principal"""
-        self.limpiar_ventana()
-        
+        """Mostrar pantalla de bienvenida principal"""
+        self.pantallas.mostrar("bienvenida")
+    
+    def construir_pantalla_bienvenida(self, main_frame):
+        """Crear pantalla de bienvenida principal; devuelve la función que actualiza sus datos"""
         # Frame principal con gradiente simulado
-        main_frame = tk.Frame(self.root, bg="#2E8B57")
-        main_frame.pack(fill="both", expand=True)
+        main_frame.configure(bg="#2E8B57")
         
         # Header con animación de bienvenida
         header_frame = tk.Frame(main_frame, bg="#228B22", height=150)
@@ -263,11 +3829,10 @@ class TortilleriaApp:
         info_frame.pack(fill="x", side="bottom")
         info_frame.pack_propagate(False)
         
-        fecha_actual = datetime.now().strftime("%d/%m/%Y %H:%M")
-        tk.Label(info_frame,
-                text=f"🕐 Fecha: {fecha_actual} | 📍 Sucursal: Centro | 📞 Tel: (555) 123-4567 | 👤 Usuarios registrados: {len(self.usuarios_sistema)}",
+        fecha_label = tk.Label(info_frame,
                 font=("Helvetica", 11),
-                bg="#1F4E37", fg="white").pack(pady=10)
+                bg="#1F4E37", fg="white")
+        fecha_label.pack(pady=10)
         
         # Mostrar productos destacados
         productos_frame = tk.Frame(info_frame, bg="#1F4E37")
@@ -283,12 +3848,22 @@ class TortilleriaApp:
         stats_frame = tk.Frame(info_frame, bg="#1F4E37")
         stats_frame.pack(pady=5)
         
-        total_productos = len(self.inventario)
-        total_ventas = len(self.historial_ventas)
-        tk.Label(stats_frame,
-                text=f"📊 Estadísticas: {total_productos} productos en inventario | {total_ventas} ventas registradas",
+        stats_label = tk.Label(stats_frame,
                 font=("Helvetica", 9),
-                bg="#1F4E37", fg="white").pack()
+                bg="#1F4E37", fg="white")
+        stats_label.pack()
+        
+        def refrescar():
+            fecha_actual = datetime.now().strftime("%d/%m/%Y %H:%M")
+            fecha_label.config(
+                text=f"🕐 Fecha: {fecha_actual} | 📍 Sucursal: Centro | 📞 Tel: (555) 123-4567 | 👤 Usuarios registrados: {len(self.usuarios_sistema)}")
+            
+            total_productos = len(self.inventario)
+            total_ventas = self.contar_ventas()
+            stats_label.config(
+                text=f"📊 Estadísticas: {total_productos} productos en inventario | {total_ventas} ventas registradas")
+        
+        return refrescar
     
     def modo_cliente(self):
         """Activar modo cliente (compras sin login)"""
@@ -308,16 +3883,23 @@ class TortilleriaApp:
                                       icon="question")
         if respuesta:
             self.guardar_datos()
+            self.compactar_ventas()
+            self.persistencia.detener()
+            self.ejecutor_tareas.detener()
+            self.motor_reportes.cerrar()
+            if self.almacen_sqlite is not None:
+                self.almacen_sqlite.cerrar()
             self.root.quit()
             self.root.destroy()
     
     def crear_login_empleado(self):
-        """Crear pantalla de login para empleados/administradores"""
-        self.limpiar_ventana()
-        
+        """Mostrar pantalla de login para empleados/administradores"""
+        self.pantallas.mostrar("login")
+    
+    def construir_login_empleado(self, login_main):
+        """Crear pantalla de login; devuelve la función que la deja lista para otro acceso"""
         # Frame principal de login
-        login_main = tk.Frame(self.root, bg="#2E8B57")
-        login_main.pack(fill="both", expand=True)
+        login_main.configure(bg="#2E8B57")
         
         # Header
         header = tk.Frame(login_main, bg="#228B22", height=100)
@@ -388,7 +3970,13 @@ Empleados:
         
         # Bind Enter key
         self.entry_password.bind("<Return>", lambda e: self.validar_login_empleado())
-        self.entry_usuario.focus()
+        
+        def refrescar():
+            self.entry_usuario.delete(0, tk.END)
+            self.entry_password.delete(0, tk.END)
+            self.entry_usuario.focus()
+        
+        return refrescar
     
     def validar_login_empleado(self):
         """Validar credenciales de empleado/administrador"""
@@ -414,19 +4002,22 @@ Empleados:
             self.entry_password.delete(0, tk.END)
     
     def crear_interfaz_cliente(self):
-        self.limpiar_ventana()
+        """Mostrar la interfaz de compra para clientes"""
+        self.pantallas.mostrar("cliente")
     
+    def construir_interfaz_cliente(self, pantalla):
+        """Crear la interfaz de compra; devuelve la función que actualiza el catálogo y el carrito"""
         # Configurar el grid principal
-        self.root.grid_columnconfigure(0, weight=3)  # 75% para productos
-        self.root.grid_columnconfigure(1, weight=1)  # 25% para carrito
-        self.root.grid_rowconfigure(0, weight=1)
+        pantalla.grid_columnconfigure(0, weight=3)  # 75% para productos
+        pantalla.grid_columnconfigure(1, weight=1)  # 25% para carrito
+        pantalla.grid_rowconfigure(0, weight=1)
     
         # Frame de productos (izquierda)
-        productos_frame = tk.Frame(self.root, bg="#F0F8FF")
+        productos_frame = tk.Frame(pantalla, bg="#F0F8FF")
         productos_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
     
         # Frame del carrito (derecha)
-        carrito_frame = tk.Frame(self.root, bg="#E6F3FF", bd=2, relief="groove")
+        carrito_frame = tk.Frame(pantalla, bg="#E6F3FF", bd=2, relief="groove")
         carrito_frame.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
     
         # Configurar scroll para productos
@@ -446,13 +4037,43 @@ Empleados:
         self.crear_panel_carrito_cliente(carrito_frame)
     
         # Botón volver abajo
-        btn_volver = ttk.Button(self.root, text="🔙 Volver al Menú Principal",
+        btn_volver = ttk.Button(pantalla, text="🔙 Volver al Menú Principal",
                           style='Danger.TButton',
                           command=self.crear_pantalla_bienvenida)
         btn_volver.grid(row=1, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+        
+        def refrescar():
+            self.refrescar_catalogo_cliente()
+            self.actualizar_carrito_cliente()
+        
+        return refrescar
+    
+    def firma_catalogo_cliente(self):
+        """Lo que define las tarjetas del catálogo; si cambia hay que volver a crearlas"""
+        return tuple((key, producto["nombre"], producto["descripcion"], producto["precio"], producto["unidad"],
+                      producto.get("categoria", "otros"), producto["stock"] > 0)
+                     for key, producto in self.inventario.items())
+    
+    def refrescar_catalogo_cliente(self):
+        """Actualizar el stock de las tarjetas, o recrear el catálogo si cambiaron los productos"""
+        if self.firma_catalogo_cliente() != self.catalogo_cliente_firma:
+            for widget in self.catalogo_cliente_frame.winfo_children():
+                widget.destroy()
+            self.crear_catalogo_productos_cliente(self.catalogo_cliente_frame)
+            return
+        for key, stock_label in self.stock_tarjetas_cliente.items():
+            self.mostrar_stock_tarjeta(stock_label, self.inventario[key])
+    
+    def mostrar_stock_tarjeta(self, stock_label, producto):
+        stock_color = "#228B22" if producto['stock'] > 5 else "#FF8C00" if producto['stock'] > 0 else "#DC143C"
+        stock_label.config(text=f"📦 {producto['stock']:.1f} {producto['unidad']} disponibles", fg=stock_color)
     
     def crear_catalogo_productos_cliente(self, parent):
         """Crear catálogo de productos para clientes"""
+        self.catalogo_cliente_frame = parent
+        self.catalogo_cliente_firma = self.firma_catalogo_cliente()
+        self.stock_tarjetas_cliente = {}
+        
         # Título del catálogo
         tk.Label(parent, text="🌟 NUESTROS PRODUCTOS FRESCOS 🌟",
                 font=("Helvetica", 18, "bold"), bg="#F0F8FF", fg="#2E8B57").pack(pady=20)
@@ -511,9 +4132,10 @@ Empleados:
         tk.Label(precio_frame, text=f"💰 ${producto['precio']:.2f}/{producto['unidad']}",
                 font=("Helvetica", 12, "bold"), bg="white", fg="#228B22").pack(side="left")
         
-        stock_color = "#228B22" if producto['stock'] > 5 else "#FF8C00" if producto['stock'] > 0 else "#DC143C"
-        tk.Label(precio_frame, text=f"📦 {producto['stock']:.1f} {producto['unidad']} disponibles",
-                font=("Helvetica", 10), bg="white", fg=stock_color).pack(side="right")
+        stock_label = tk.Label(precio_frame, font=("Helvetica", 10), bg="white")
+        stock_label.pack(side="right")
+        self.mostrar_stock_tarjeta(stock_label, producto)
+        self.stock_tarjetas_cliente[key] = stock_label
         
         # Controles de compra
         compra_frame = tk.Frame(card_frame, bg="white")
@@ -555,6 +4177,8 @@ Empleados:
         self.carrito_canvas.pack(side="left", fill="both", expand=True)
         carrito_scrollbar.pack(side="right", fill="y")
         
+        self.vista_carrito = VistaCarritoTarjetas(self.carrito_scroll_frame, self.eliminar_producto_carrito)
+        
         # Panel de totales
         totales_frame = tk.Frame(parent, bg="#FFD700", relief="raised", bd=2)
         totales_frame.pack(fill="x", padx=10, pady=5)
@@ -610,50 +4234,19 @@ Empleados:
             entry_cantidad.delete(0, tk.END)
             entry_cantidad.insert(0, "0.5")
             
-            self.actualizar_carrito_cliente()
+            self.actualizar_carrito_cliente((key,))
             messagebox.showinfo("Producto Agregado", 
                               f"✅ {self.inventario[key]['nombre']} agregado al carrito")
             
         except ValueError:
             messagebox.showerror("Error", "Por favor ingrese una cantidad válida")
     
-    def actualizar_carrito_cliente(self):
-        """Actualizar visualización del carrito del cliente"""
-        # Limpiar carrito actual
-        for widget in self.carrito_scroll_frame.winfo_children():
-            widget.destroy()
-        
-        total = 0
-        
-        if not self.carrito:
-            tk.Label(self.carrito_scroll_frame, text="🛒 Tu carrito está vacío\n\n¡Agrega algunos productos deliciosos!",
-                    font=("Helvetica", 11), bg="white", fg="gray", justify="center").pack(pady=50)
-        else:
-            for key, cantidad in self.carrito.items():
-                producto = self.inventario[key]
-                subtotal = cantidad * producto["precio"]
-                total += subtotal
-                
-                # Frame del item
-                item_frame = tk.Frame(self.carrito_scroll_frame, bg="#F8F8F8", relief="solid", bd=1)
-                item_frame.pack(fill="x", padx=5, pady=2)
-                
-                # Info del producto
-                info_text = f"{producto['nombre']}\n{cantidad:.1f} {producto['unidad']} × ${producto['precio']:.2f}"
-                tk.Label(item_frame, text=info_text,
-                        font=("Helvetica", 10), bg="#F8F8F8", fg="black", justify="left").pack(side="left", padx=5, pady=5)
-                
-                # Precio y botón eliminar
-                right_frame = tk.Frame(item_frame, bg="#F8F8F8")
-                right_frame.pack(side="right", padx=5, pady=5)
-                
-                tk.Label(right_frame, text=f"${subtotal:.2f}",
-                        font=("Helvetica", 11, "bold"), bg="#F8F8F8", fg="#228B22").pack()
-                
-                ttk.Button(right_frame, text="❌", style='Danger.TButton',
-                         command=lambda k=key: self.eliminar_producto_carrito(k)).pack()
+    def actualizar_carrito_cliente(self, claves=None):
+        """Actualizar visualización del carrito del cliente (solo los productos en `claves` si se indican)"""
+        self.vista_carrito.actualizar(self.carrito, self.inventario, claves)
         
         # Actualizar totales
+        total = self.vista_carrito.total
         self.label_subtotal.config(text=f"Subtotal: ${total:.2f}")
         self.label_total.config(text=f"TOTAL: ${total:.2f}")
     
@@ -661,7 +4254,7 @@ Empleados:
         """Eliminar producto del carrito"""
         if key in self.carrito:
             del self.carrito[key]
-            self.actualizar_carrito_cliente()
+            self.actualizar_carrito_cliente((key,))
             messagebox.showinfo("Producto Eliminado", "Producto removido del carrito")
     
     def vaciar_carrito_cliente(self):
@@ -712,13 +4305,11 @@ Empleados:
                 "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "cliente": "Cliente Mostrador",
                 "productos": dict(self.carrito),
+                "detalle": self.detalle_venta(self.carrito),
                 "total": total,
                 "vendedor": "Cliente (Autoservicio)"
             }
-            self.historial_ventas.append(venta)
-        
-        # Guardar datos
-            self.guardar_datos()
+            self.registrar_venta(venta)
         
             # Limpiar carrito
             self.carrito.clear()
@@ -728,20 +4319,21 @@ Empleados:
                           f"¡Gracias por su compra!\n\nTotal pagado: ${total:.2f}\n\n¡Que disfrute sus productos frescos!")
     
     def crear_interfaz_empleado(self):
-        """Crear interfaz para empleados"""
-        self.limpiar_ventana()
-        
+        """Mostrar interfaz para empleados"""
+        self.pantallas.mostrar("empleado")
+    
+    def construir_interfaz_empleado(self, pantalla):
+        """Crear interfaz para empleados; devuelve la función que muestra al usuario actual"""
         # Header del empleado
-        header = tk.Frame(self.root, bg="#32CD32", height=90)
+        header = tk.Frame(pantalla, bg="#32CD32", height=90)
         header.pack(fill="x")
         header.pack_propagate(False)
         
-        nombre = self.usuarios_sistema[self.usuario_actual]["nombre"]
-        tk.Label(header, text=f"👨‍💼 PANEL EMPLEADO - {nombre}",
-                font=("Helvetica", 20, "bold"), bg="#32CD32", fg="white").pack(pady=20)
+        titulo_label = tk.Label(header, font=("Helvetica", 20, "bold"), bg="#32CD32", fg="white")
+        titulo_label.pack(pady=20)
         
         # Frame principal
-        main_frame = tk.Frame(self.root, bg="#F0F8FF")
+        main_frame = tk.Frame(pantalla, bg="#F0F8FF")
         main_frame.pack(fill="both", expand=True)
         
         # Panel de información
@@ -749,9 +4341,8 @@ Empleados:
         info_panel.pack(fill="x")
         info_panel.pack_propagate(False)
         
-        fecha = datetime.now().strftime("%d/%m/%Y %H:%M")
-        tk.Label(info_panel, text=f"📅 {fecha} | 🏪 Sistema de Empleados | 👨‍💼 {nombre}",
-                font=("Helvetica", 11, "bold"), bg="#E6F3FF", fg="black").pack(pady=12)
+        info_label = tk.Label(info_panel, font=("Helvetica", 11, "bold"), bg="#E6F3FF", fg="black")
+        info_label.pack(pady=12)
         
         # Menú de opciones para empleados
         menu_frame = tk.Frame(main_frame, bg="#F0F8FF")
@@ -791,22 +4382,31 @@ Empleados:
         ttk.Button(fila2, text="🏠\nMENÚ PRINCIPAL\nPantalla Inicial",
                  style='Primary.TButton',
                  width=20, command=self.crear_pantalla_bienvenida).pack(side="left", padx=10)
+        
+        def refrescar():
+            nombre = self.usuarios_sistema[self.usuario_actual]["nombre"]
+            fecha = datetime.now().strftime("%d/%m/%Y %H:%M")
+            titulo_label.config(text=f"👨‍💼 PANEL EMPLEADO - {nombre}")
+            info_label.config(text=f"📅 {fecha} | 🏪 Sistema de Empleados | 👨‍💼 {nombre}")
+        
+        return refrescar
     
     def crear_interfaz_admin(self):
-        """Crear interfaz para administradores"""
-        self.limpiar_ventana()
-        
+        """Mostrar interfaz para administradores"""
+        self.pantallas.mostrar("admin")
+    
+    def construir_interfaz_admin(self, pantalla):
+        """Crear interfaz para administradores; devuelve la función que muestra al usuario actual"""
         # Header del admin
-        header = tk.Frame(self.root, bg="#B22222", height=90)
+        header = tk.Frame(pantalla, bg="#B22222", height=90)
         header.pack(fill="x")
         header.pack_propagate(False)
         
-        nombre = self.usuarios_sistema[self.usuario_actual]["nombre"]
-        tk.Label(header, text=f"👑 PANEL ADMINISTRADOR - {nombre}",
-                font=("Helvetica", 20, "bold"), bg="#B22222", fg="#FFD700").pack(pady=20)
+        titulo_label = tk.Label(header, font=("Helvetica", 20, "bold"), bg="#B22222", fg="#FFD700")
+        titulo_label.pack(pady=20)
         
         # Frame principal
-        main_frame = tk.Frame(self.root, bg="#F0F8FF")
+        main_frame = tk.Frame(pantalla, bg="#F0F8FF")
         main_frame.pack(fill="both", expand=True)
         
         # Panel de información
@@ -814,9 +4414,8 @@ Empleados:
         info_panel.pack(fill="x")
         info_panel.pack_propagate(False)
         
-        fecha = datetime.now().strftime("%d/%m/%Y %H:%M")
-        tk.Label(info_panel, text=f"📅 {fecha} | 🏪 Sistema Administrativo | 👑 {nombre}",
-                font=("Helvetica", 11, "bold"), bg="#FFE4E1", fg="black").pack(pady=12)
+        info_label = tk.Label(info_panel, font=("Helvetica", 11, "bold"), bg="#FFE4E1", fg="black")
+        info_label.pack(pady=12)
         
         # Menú de opciones para administradores
         menu_frame = tk.Frame(main_frame, bg="#F0F8FF")
@@ -868,6 +4467,14 @@ Empleados:
         ttk.Button(fila3, text="🏠\nMENÚ PRINCIPAL\nPantalla Inicial",
                  style='Primary.TButton',
                  width=20, command=self.crear_pantalla_bienvenida).pack(side="left", padx=10)
+        
+        def refrescar():
+            nombre = self.usuarios_sistema[self.usuario_actual]["nombre"]
+            fecha = datetime.now().strftime("%d/%m/%Y %H:%M")
+            titulo_label.config(text=f"👑 PANEL ADMINISTRADOR - {nombre}")
+            info_label.config(text=f"📅 {fecha} | 🏪 Sistema Administrativo | 👑 {nombre}")
+        
+        return refrescar
     
     def ver_inventario_empleado(self):
         """Ver inventario para empleados"""
@@ -942,12 +4549,10 @@ Empleados:
         stats_frame = tk.Frame(ventana_inventario, bg="#FFD700", height=40)
         stats_frame.pack(fill="x", pady=10)
         
-        total_productos = len(self.inventario)
-        productos_agotados = sum(1 for p in self.inventario.values() if p["stock"] == 0)
-        productos_poco_stock = sum(1 for p in self.inventario.values() if 0 < p["stock"] <= 5)
+        stats = self.estadisticas_inventario()
         
         tk.Label(stats_frame, 
-                text=f"📊 Total Productos: {total_productos} | ⚠️ Poco Stock: {productos_poco_stock} | ❌ Agotados: {productos_agotados}",
+                text=f"📊 Total Productos: {stats['productos']} | ⚠️ Poco Stock: {stats['poco']} | ❌ Agotados: {stats['agotado']}",
                 font=("Helvetica", 11, "bold"), bg="#FFD700", fg="black").pack(pady=5)
         
         # Botón cerrar
@@ -981,6 +4586,16 @@ Empleados:
                                       font=("Helvetica", 14, "bold"), bg="#F0F8FF")
         productos_frame.pack(side="left", fill="both", expand=True, padx=10, pady=10)
         
+        # Búsqueda: filtra la lista mientras se escribe
+        busqueda_frame = tk.Frame(productos_frame, bg="#F0F8FF")
+        busqueda_frame.pack(side="top", fill="x", padx=5, pady=5)
+        
+        tk.Label(busqueda_frame, text="🔍 Buscar:", font=("Helvetica", 11, "bold"),
+                bg="#F0F8FF").pack(side="left", padx=2)
+        busqueda_var = tk.StringVar()
+        busqueda_entry = ttk.Entry(busqueda_frame, textvariable=busqueda_var, font=("Helvetica", 11))
+        busqueda_entry.pack(side="left", fill="x", expand=True, padx=2)
+        
         # Canvas para scroll de productos
         canvas_productos = tk.Canvas(productos_frame, bg="#F0F8FF")
         scrollbar_productos = ttk.Scrollbar(productos_frame, orient="vertical", command=canvas_productos.yview)
@@ -993,19 +4608,23 @@ Empleados:
         canvas_productos.create_window((0, 0), window=scrollable_productos, anchor="nw")
         canvas_productos.configure(yscrollcommand=scrollbar_productos.set)
         
-        # Lista de productos
+        # Lista de productos (se crean una vez; la búsqueda solo los muestra u oculta)
+        filas_productos = {}
+        stock_labels = {}
         for key, producto in self.inventario.items():
             if producto["stock"] > 0:
                 prod_frame = tk.Frame(scrollable_productos, bg="white", relief="solid", bd=1)
                 prod_frame.pack(fill="x", padx=5, pady=2)
+                filas_productos[key] = prod_frame
                 
                 info_frame = tk.Frame(prod_frame, bg="white")
                 info_frame.pack(side="left", fill="x", expand=True, padx=5, pady=5)
                 
-                tk.Label(info_frame, text=producto["nombre"], font=("Helvetica", 11, "bold"),
-                        bg="white", fg="black").pack(anchor="w")
-                tk.Label(info_frame, text=f"${producto['precio']:.2f}/{producto['unidad']} - Stock: {producto['stock']:.1f}",
-                        font=("Helvetica", 10), bg="white", fg="gray").pack(anchor="w")
+                tk.Label(info_frame, text=f"[{producto.get('plu', '')}] {producto['nombre']}",
+                        font=("Helvetica", 11, "bold"), bg="white", fg="black").pack(anchor="w")
+                stock_labels[key] = tk.Label(info_frame, text=self.texto_precio_stock(producto),
+                                             font=("Helvetica", 10), bg="white", fg="gray")
+                stock_labels[key].pack(anchor="w")
                 
                 # Controles de venta
                 control_frame = tk.Frame(prod_frame, bg="white")
@@ -1018,6 +4637,30 @@ Empleados:
                 ttk.Button(control_frame, text="Agregar", style='Success.TButton',
                          command=lambda k=key, e=cantidad_entry: self.agregar_a_venta(k, e, carrito_venta, carrito_label, total_label)).pack(side="left", padx=2)
         
+        visibles = list(filas_productos)
+        
+        def filtrar_productos(*args):
+            nonlocal visibles
+            claves = [key for key in self.buscar_productos(busqueda_var.get()) if key in filas_productos]
+            if claves == visibles:
+                return
+            for key in visibles:
+                filas_productos[key].pack_forget()
+            for key in claves:
+                filas_productos[key].pack(fill="x", padx=5, pady=2)
+            visibles = claves
+            canvas_productos.yview_moveto(0)
+        
+        busqueda_var.trace_add("write", filtrar_productos)
+        
+        # El stock mostrado sigue a las ventas y a los cambios del inventario
+        def al_cambiar_productos(claves):
+            for key in (stock_labels if claves is None else claves):
+                if key in stock_labels and key in self.inventario:
+                    stock_labels[key].config(text=self.texto_precio_stock(self.inventario[key]))
+        
+        self.observar_productos(ventana_venta, al_cambiar_productos)
+        
         canvas_productos.pack(side="left", fill="both", expand=True)
         scrollbar_productos.pack(side="right", fill="y")
         
@@ -1027,11 +4670,34 @@ Empleados:
         carrito_frame.pack(side="right", fill="y", padx=10, pady=10)
         carrito_frame.pack_propagate(False)
         
+        # Cobro rápido: "código [cantidad]" + Enter agrega; Enter con la línea vacía cobra
+        rapido_frame = tk.LabelFrame(carrito_frame, text="⌨️ Cobro Rápido", font=("Helvetica", 11, "bold"),
+                                     bg="#F0F8FF")
+        rapido_frame.pack(fill="x", padx=5, pady=5)
+        
+        codigo_entry = ttk.Entry(rapido_frame, font=("Helvetica", 14))
+        codigo_entry.pack(fill="x", padx=5, pady=2)
+        tk.Label(rapido_frame, text="código [cantidad] ⏎ agrega · ⏎ vacío cobra · Esc borra",
+                font=("Helvetica", 9), bg="#F0F8FF", fg="gray").pack(anchor="w", padx=5)
+        
+        def cobrar_linea(event=None):
+            linea = codigo_entry.get().strip()
+            if not linea:
+                self.finalizar_venta(carrito_venta, ventana_venta, confirmar=False)
+            elif self.agregar_por_codigo(linea, carrito_venta, carrito_label, total_label, ventana_venta):
+                codigo_entry.delete(0, tk.END)
+            return "break"
+        
+        codigo_entry.bind("<Return>", cobrar_linea)
+        codigo_entry.bind("<KP_Enter>", cobrar_linea)
+        codigo_entry.bind("<Escape>", lambda event: codigo_entry.delete(0, tk.END))
+        codigo_entry.focus_set()
+        
         # Área del carrito
-        carrito_scroll = tk.Text(carrito_frame, height=20, width=45, font=("Helvetica", 10))
+        carrito_scroll = tk.Text(carrito_frame, height=16, width=45, font=("Helvetica", 10))
         carrito_scroll.pack(padx=5, pady=5)
         
-        carrito_label = carrito_scroll  # Referencia para actualizar
+        carrito_label = VistaCarritoTexto(carrito_scroll)  # Referencia para actualizar
         
         # Total
         total_frame = tk.Frame(carrito_frame, bg="#FFD700", relief="raised", bd=2)
@@ -1059,16 +4725,72 @@ Empleados:
         ventana_venta.carrito_label = carrito_label
         ventana_venta.total_label = total_label
     
+    def texto_precio_stock(self, producto):
+        """Precio y stock de un producto en la lista de venta"""
+        return f"${producto['precio']:.2f}/{producto['unidad']} - Stock: {producto['stock']:.1f}"
+    
+    def mostrar_aviso(self, ventana, texto, error=False):
+        """Aviso flotante al pie de `ventana` que se quita solo (no bloquea como un messagebox)"""
+        aviso = getattr(ventana, "aviso", None)
+        if aviso is None:
+            aviso = ventana.aviso = tk.Label(ventana, font=("Helvetica", 12, "bold"), fg="white",
+                                             padx=15, pady=8)
+            aviso.ocultar = None
+        aviso.config(text=texto, bg="#B22222" if error else "#228B22")
+        aviso.place(relx=0.5, rely=1.0, anchor="s", y=-15)
+        aviso.lift()
+        if aviso.ocultar is not None:
+            self.root.after_cancel(aviso.ocultar)
+        # Con el reloj de la raíz: la ventana pudo cerrarse antes de que se cumpla
+        aviso.ocultar = self.root.after(DURACION_AVISO, lambda: aviso.winfo_exists() and aviso.place_forget())
+        if error:
+            ventana.bell()
+    
+    def agregar_por_codigo(self, linea, carrito_venta, carrito_label, total_label, ventana):
+        """Agregar a la venta una línea "código [cantidad]" (p. ej. "1 2.5"); True si se agregó"""
+        partes = linea.split()
+        if len(partes) > 2:
+            self.mostrar_aviso(ventana, "Escriba: código [cantidad]", error=True)
+            return False
+        
+        key = self.indice_plu.buscar(self.inventario, partes[0])
+        if key is None:
+            self.mostrar_aviso(ventana, f"No hay producto con el código {partes[0]}", error=True)
+            return False
+        producto = self.inventario[key]
+        
+        try:
+            cantidad = float(partes[1]) if len(partes) > 1 else 1.0
+        except ValueError:
+            self.mostrar_aviso(ventana, f"Cantidad inválida: {partes[1]}", error=True)
+            return False
+        if cantidad <= 0:
+            self.mostrar_aviso(ventana, "La cantidad debe ser mayor a 0", error=True)
+            return False
+        
+        disponible = producto["stock"] - carrito_venta.get(key, 0)
+        if cantidad > disponible:
+            self.mostrar_aviso(ventana, f"Stock insuficiente de {producto['nombre']}. Disponible: {disponible:.1f}",
+                               error=True)
+            return False
+        
+        carrito_venta[key] = carrito_venta.get(key, 0) + cantidad
+        self.actualizar_carrito_venta(carrito_venta, carrito_label, total_label, (key,))
+        self.mostrar_aviso(ventana, f"+ {cantidad:g} {producto['unidad']} {producto['nombre']}")
+        return True
+    
     def agregar_a_venta(self, key, entry, carrito_venta, carrito_label, total_label):
         """Agregar producto a la venta"""
+        ventana = entry.winfo_toplevel()
         try:
             cantidad = float(entry.get())
             if cantidad <= 0:
-                messagebox.showwarning("Error", "La cantidad debe ser mayor a 0")
+                self.mostrar_aviso(ventana, "La cantidad debe ser mayor a 0", error=True)
                 return
             
             if cantidad > self.inventario[key]["stock"]:
-                messagebox.showerror("Error", f"Stock insuficiente. Disponible: {self.inventario[key]['stock']:.1f}")
+                self.mostrar_aviso(ventana, f"Stock insuficiente. Disponible: {self.inventario[key]['stock']:.1f}",
+                                   error=True)
                 return
             
             if key in carrito_venta:
@@ -1080,46 +4802,40 @@ Empleados:
             if carrito_venta[key] > self.inventario[key]["stock"]:
                 carrito_venta[key] = self.inventario[key]["stock"]
             
-            self.actualizar_carrito_venta(carrito_venta, carrito_label, total_label)
+            self.actualizar_carrito_venta(carrito_venta, carrito_label, total_label, (key,))
             entry.delete(0, tk.END)
             entry.insert(0, "1.0")
             
         except ValueError:
-            messagebox.showerror("Error", "Cantidad inválida")
+            self.mostrar_aviso(ventana, "Cantidad inválida", error=True)
     
-    def actualizar_carrito_venta(self, carrito_venta, carrito_label, total_label):
-        """Actualizar visualización del carrito de venta"""
-        carrito_label.delete(1.0, tk.END)
-        total = 0
-        
-        if not carrito_venta:
-            carrito_label.insert(tk.END, "Carrito vacío...")
-        else:
-            for key, cantidad in carrito_venta.items():
-                producto = self.inventario[key]
-                subtotal = cantidad * producto["precio"]
-                total += subtotal
-                
-                linea = f"{producto['nombre']}\n{cantidad:.1f} {producto['unidad']} × ${producto['precio']:.2f} = ${subtotal:.2f}\n\n"
-                carrito_label.insert(tk.END, linea)
-        
-        total_label.config(text=f"TOTAL: ${total:.2f}")
+    def actualizar_carrito_venta(self, carrito_venta, carrito_label, total_label, claves=None):
+        """Actualizar visualización del carrito de venta (solo los productos en `claves` si se indican)"""
+        carrito_label.actualizar(carrito_venta, self.inventario, claves)
+        total_label.config(text=f"TOTAL: ${carrito_label.total:.2f}")
     
     def limpiar_venta(self, carrito_venta, carrito_label, total_label):
         """Limpiar carrito de venta"""
         carrito_venta.clear()
         self.actualizar_carrito_venta(carrito_venta, carrito_label, total_label)
     
-    def finalizar_venta(self, carrito_venta, ventana):
-        """Finalizar la venta"""
+    def finalizar_venta(self, carrito_venta, ventana, confirmar=True):
+        """Finalizar la venta; la ventana queda lista para la siguiente (`confirmar`: preguntar antes)"""
         if not carrito_venta:
-            messagebox.showwarning("Error", "El carrito está vacío")
+            self.mostrar_aviso(ventana, "El carrito está vacío", error=True)
             return
         
+        # El stock pudo cambiar mientras se armaba el carrito
+        for key, cantidad in carrito_venta.items():
+            if cantidad > self.inventario[key]["stock"]:
+                self.mostrar_aviso(ventana, f"Stock insuficiente de {self.inventario[key]['nombre']}. "
+                                            f"Disponible: {self.inventario[key]['stock']:.1f}", error=True)
+                return
+        
         total = sum(carrito_venta[key] * self.inventario[key]["precio"] for key in carrito_venta)
         
         # Confirmar venta
-        respuesta = messagebox.askyesno("Confirmar Venta", f"Total: ${total:.2f}\n¿Procesar venta?")
+        respuesta = not confirmar or messagebox.askyesno("Confirmar Venta", f"Total: ${total:.2f}\n¿Procesar venta?")
         
         if respuesta:
             # Actualizar inventario
@@ -1131,16 +4847,14 @@ Empleados:
                 "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "cliente": "Cliente Mostrador",
                 "productos": dict(carrito_venta),
+                "detalle": self.detalle_venta(carrito_venta),
                 "total": total,
                 "vendedor": self.usuarios_sistema[self.usuario_actual]["nombre"]
             }
-            self.historial_ventas.append(venta)
-            
-            # Guardar datos
-            self.guardar_datos()
+            self.registrar_venta(venta)
             
-            messagebox.showinfo("Venta Exitosa", f"Venta procesada exitosamente\nTotal: ${total:.2f}")
-            ventana.destroy()
+            self.limpiar_venta(carrito_venta, ventana.carrito_label, ventana.total_label)
+            self.mostrar_aviso(ventana, f"✅ Venta registrada - Total: ${total:.2f}")
     
     def ver_ventas_empleado(self):
         """Ver ventas del día para empleados"""
@@ -1162,8 +4876,7 @@ Empleados:
         ventas_frame.pack(fill="both", expand=True, padx=20, pady=20)
         
         # Filtrar ventas del día
-        hoy = datetime.now().strftime("%Y-%m-%d")
-        ventas_hoy = [v for v in self.historial_ventas if v["fecha"].startswith(hoy)]
+        ventas_hoy = self.ventas_del_dia()
         
         if not ventas_hoy:
             tk.Label(ventas_frame, text="No hay ventas registradas hoy",
@@ -1174,56 +4887,15 @@ Empleados:
             stats_frame.pack(fill="x", pady=10)
             
             total_ventas = len(ventas_hoy)
-            total_monto = sum(v["total"] for v in ventas_hoy)
-            promedio = total_monto / total_ventas if total_ventas > 0 else 0
-            
-            tk.Label(stats_frame, 
-                    text=f"📅 Resumen del día: {total_ventas} ventas | Total: ${total_monto:.2f} | Promedio: ${promedio:.2f}",
-                    font=("Helvetica", 12, "bold"), bg="#FFD700", fg="black").pack(pady=5)
-            
-            # Crear lista de ventas con Treeview
-            tree_frame = tk.Frame(ventas_frame, bg="#F0F8FF")
-            tree_frame.pack(fill="both", expand=True)
-            
-            tree = ttk.Treeview(tree_frame, columns=("ID", "Fecha", "Vendedor", "Total"), show="headings")
-            
-            # Configurar columnas
-            tree.heading("ID", text="ID")
-            tree.heading("Fecha", text="Fecha")
-            tree.heading("Vendedor", text="Vendedor")
-            tree.heading("Total", text="Total")
-            
-            tree.column("ID", width=50, anchor="center")
-            tree.column("Fecha", width=150, anchor="center")
-            tree.column("Vendedor", width=200, anchor="w")
-            tree.column("Total", width=100, anchor="e")
-            
-            # Insertar datos
-            for i, venta in enumerate(ventas_hoy):
-                tree.insert("", "end", values=(
-                    i+1,
-                    venta["fecha"][11:19],  # Solo la hora
-                    venta["vendedor"],
-                    f"${venta['total']:.2f}"
-                ))
-            
-            # Agregar scrollbar
-            scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
-            tree.configure(yscrollcommand=scrollbar.set)
-            
-            tree.pack(side="left", fill="both", expand=True)
-            scrollbar.pack(side="right", fill="y")
+            total_monto = sum(v["total"] for v in ventas_hoy)
+            promedio = total_monto / total_ventas if total_ventas > 0 else 0
             
-            # Función para ver detalles de la venta seleccionada
-            def ver_detalle_venta(event):
-                item = tree.focus()
-                if item:
-                    valores = tree.item(item, 'values')
-                    indice = int(valores[0]) - 1
-                    if 0 <= indice < len(ventas_hoy):
-                        self.mostrar_detalle_venta(ventas_hoy[indice])
+            tk.Label(stats_frame, 
+                    text=f"📅 Resumen del día: {total_ventas} ventas | Total: ${total_monto:.2f} | Promedio: ${promedio:.2f}",
+                    font=("Helvetica", 12, "bold"), bg="#FFD700", fg="black").pack(pady=5)
             
-            tree.bind("<Double-1>", ver_detalle_venta)
+            # Lista de ventas (solo se crean las filas visibles)
+            self.crear_lista_ventas(ventas_frame, ventas_hoy, "Fecha")
         
         # Botón cerrar
         ttk.Button(ventana_ventas, text="Cerrar", style='Danger.TButton',
@@ -1277,17 +4949,25 @@ Empleados:
         tree.column("Precio", width=100, anchor="e")
         tree.column("Subtotal", width=100, anchor="e")
         
-        # Insertar productos
+        # Insertar productos con el precio registrado en la venta; los productos
+        # eliminados del inventario se muestran con su clave
+        detalle = venta.get("detalle", {})
         for key, cantidad in venta["productos"].items():
-            if key in self.inventario:
-                producto = self.inventario[key]
-                subtotal = cantidad * producto["precio"]
-                tree.insert("", "end", values=(
-                    producto["nombre"],
-                    f"{cantidad:.1f} {producto['unidad']}",
-                    f"${producto['precio']:.2f}",
-                    f"${subtotal:.2f}"
-                ))
+            producto = self.inventario.get(key, {})
+            if key in detalle:
+                precio, subtotal = detalle[key]["precio"], detalle[key]["subtotal"]
+            elif key in self.inventario:
+                # Ventas anteriores sin precio registrado: se usa el precio actual
+                precio = producto["precio"]
+                subtotal = cantidad * precio
+            else:
+                precio = subtotal = None
+            tree.insert("", "end", values=(
+                producto.get("nombre", key),
+                f"{cantidad:.1f} {producto.get('unidad', '')}".rstrip(),
+                f"${precio:.2f}" if precio is not None else "-",
+                f"${subtotal:.2f}" if subtotal is not None else "-"
+            ))
         
         # Agregar scrollbar
         scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
@@ -1324,6 +5004,16 @@ Empleados:
                                       font=("Helvetica", 14, "bold"), bg="#F0F8FF")
         productos_frame.pack(fill="both", expand=True)
         
+        # Búsqueda por nombre, descripción o categoría
+        busqueda_frame = tk.Frame(productos_frame, bg="#F0F8FF")
+        busqueda_frame.pack(fill="x", padx=5, pady=5)
+        
+        tk.Label(busqueda_frame, text="🔍 Buscar:", font=("Helvetica", 11, "bold"),
+                bg="#F0F8FF").pack(side="left", padx=2)
+        busqueda_var = tk.StringVar()
+        ttk.Entry(busqueda_frame, textvariable=busqueda_var, font=("Helvetica", 11),
+                 width=40).pack(side="left", padx=2)
+        
         # Crear tabla editable con Treeview
         tree_frame = tk.Frame(productos_frame, bg="#F0F8FF")
         tree_frame.pack(fill="both", expand=True)
@@ -1345,32 +5035,13 @@ Empleados:
         tree.column("Unidad", width=80, anchor="center")
         tree.column("Estado", width=120, anchor="center")
         
-        # Insertar datos
-        for i, (key, producto) in enumerate(self.inventario.items()):
-            estado = "✅ Disponible" if producto["stock"] > 5 else "⚠️ Poco Stock" if producto["stock"] > 0 else "❌ Agotado"
-            
-            tree.insert("", "end", values=(
-                i+1,
-                producto["nombre"],
-                f"{producto['stock']:.1f}",
-                f"${producto['precio']:.2f}",
-                producto["unidad"],
-                estado
-            ), tags=(key,))
+        # Insertar datos; después solo se actualizan las filas de los productos que cambien
+        tabla = TablaInventario(tree, self.estado_stock)
+        self.actualizar_vista_inventario(tabla, busqueda_var)
+        busqueda_var.trace_add("write", lambda *args: tabla.mostrar(self.buscar_productos(busqueda_var.get())))
         
-        # Aplicar estilos a las filas
-        for item in tree.get_children():
-            values = tree.item(item, 'values')
-            estado = values[5]
-            if estado == "⚠️ Poco Stock":
-                tree.tag_configure('warning', background='#FFFACD')
-                tree.item(item, tags=('warning',))
-            elif estado == "❌ Agotado":
-                tree.tag_configure('danger', background='#FFE4E1')
-                tree.item(item, tags=('danger',))
-            else:
-                tree.tag_configure('success', background='#F0FFF0')
-                tree.item(item, tags=('success',))
+        self.observar_productos(ventana_inventario,
+                                lambda claves: self.actualizar_vista_inventario(tabla, busqueda_var, claves))
         
         # Agregar scrollbar
         scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
@@ -1379,15 +5050,21 @@ Empleados:
         tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
+        # Producción sugerida según el pronóstico de demanda
+        produccion_frame = tk.LabelFrame(main_frame, text="Producción Sugerida para Mañana",
+                                       font=("Helvetica", 14, "bold"), bg="#F0F8FF")
+        produccion_frame.pack(fill="x", pady=(10, 0))
+        
+        self.actualizar_produccion_sugerida(produccion_frame)
+        
         # Panel de controles
         controles_frame = tk.Frame(main_frame, bg="#F0F8FF")
         controles_frame.pack(fill="x", pady=10)
         
         # Botón para editar producto seleccionado
         def editar_producto():
-            item = tree.focus()
-            if item:
-                key = tree.item(item, 'tags')[0]
+            key = tree.focus()  # El id de cada fila es la clave del producto
+            if key in self.inventario:
                 self.editar_producto_admin(key, ventana_inventario)
         
         ttk.Button(controles_frame, text="✏️ Editar Producto Seleccionado",
@@ -1400,39 +5077,60 @@ Empleados:
         
         ttk.Button(controles_frame, text="Actualizar Vista",
                  style='Info.TButton',
-                 command=lambda: self.actualizar_vista_inventario(tree, ventana_inventario)).pack(side="right", padx=5)
+                 command=lambda: (self.actualizar_vista_inventario(tabla, busqueda_var),
+                                  self.actualizar_produccion_sugerida(produccion_frame))
+                 ).pack(side="right", padx=5)
         
         ttk.Button(controles_frame, text="Cerrar",
                  style='Danger.TButton',
                  command=ventana_inventario.destroy).pack(side="right", padx=5)
     
-    def actualizar_vista_inventario(self, tree, ventana):
-        """Actualizar la vista del inventario"""
-        for item in tree.get_children():
-            tree.delete(item)
+    def actualizar_vista_inventario(self, tabla, busqueda_var, claves=None):
+        """Actualizar las filas de los productos `claves` (todos si es None) respetando la búsqueda"""
+        busqueda = busqueda_var.get()
+        # Sin búsqueda, las filas nuevas ya quedan en su lugar al final
+        if tabla.actualizar(self.inventario, claves) or busqueda.strip():
+            tabla.mostrar(self.buscar_productos(busqueda))
+    
+    def actualizar_produccion_sugerida(self, parent):
+        """Llenar la tabla de producción sugerida para mañana (el pronóstico se calcula en el hilo de reportes)"""
+        for widget in parent.winfo_children():
+            widget.destroy()
         
-        for i, (key, producto) in enumerate(self.inventario.items()):
-            estado = "✅ Disponible" if producto["stock"] > 5 else "⚠️ Poco Stock" if producto["stock"] > 0 else "❌ Agotado"
+        def dibujar(produccion):
+            if not produccion:
+                tk.Label(parent, text="Se necesita al menos una semana de ventas para pronosticar la demanda",
+                        font=("Helvetica", 10), bg="#F0F8FF", fg="gray").pack(anchor="w", padx=5)
+                return
             
-            tree.insert("", "end", values=(
-                i+1,
-                producto["nombre"],
-                f"{producto['stock']:.1f}",
-                f"${producto['precio']:.2f}",
-                producto["unidad"],
-                estado
-            ), tags=(key,))
+            tree = ttk.Treeview(parent, columns=("Producto", "Stock", "Demanda", "Sugerido"),
+                                show="headings", height=5)
+            tree.heading("Producto", text="Producto")
+            tree.heading("Stock", text="Stock Actual")
+            tree.heading("Demanda", text="Demanda Pronosticada")
+            tree.heading("Sugerido", text="Producción Sugerida")
+            
+            tree.column("Producto", width=250, anchor="w")
+            tree.column("Stock", width=150, anchor="center")
+            tree.column("Demanda", width=180, anchor="center")
+            tree.column("Sugerido", width=180, anchor="center")
+            tree.pack(fill="x")
+            
+            for key, datos in produccion.items():
+                producto = self.inventario.get(key)
+                if producto is None:
+                    continue
+                tree.insert("", "end", values=(
+                    producto["nombre"],
+                    f"{producto['stock']:.1f} {producto['unidad']}",
+                    f"{datos['demanda']:.1f} {producto['unidad']}",
+                    f"{datos['sugerido']:.1f} {producto['unidad']}"
+                ))
+            tk.Label(parent, text=f"Pronóstico con las ventas hasta el {self.pronostico_demanda.hasta}; "
+                                  f"incluye un margen del {MARGEN_PRODUCCION * 100:.0f}% sobre la demanda",
+                    font=("Helvetica", 10), bg="#F0F8FF", fg="gray").pack(anchor="w", padx=5)
         
-        # Reaplicar estilos
-        for item in tree.get_children():
-            values = tree.item(item, 'values')
-            estado = values[5]
-            if estado == "⚠️ Poco Stock":
-                tree.item(item, tags=('warning',))
-            elif estado == "❌ Agotado":
-                tree.item(item, tags=('danger',))
-            else:
-                tree.item(item, tags=('success',))
+        self.cargar_en_segundo_plano(parent, self.produccion_sugerida, dibujar)
     
     def editar_producto_admin(self, key, ventana_padre):
         """Editar producto existente"""
@@ -1497,6 +5195,12 @@ Empleados:
         categoria_entry.pack(side="left", padx=5)
         categoria_entry.insert(0, producto.get("categoria", "otros"))
         
+        tk.Label(unidad_cat_frame, text="PLU:", font=("Helvetica", 11, "bold"),
+                bg="#F0F8FF").pack(side="left", padx=5)
+        plu_entry = ttk.Entry(unidad_cat_frame, font=("Helvetica", 11), width=6)
+        plu_entry.pack(side="left", padx=5)
+        plu_entry.insert(0, producto.get("plu", ""))
+        
         # Botones
         botones_frame = tk.Frame(ventana_editar, bg="#F0F8FF")
         botones_frame.pack(pady=20)
@@ -1504,14 +5208,14 @@ Empleados:
         ttk.Button(botones_frame, text="Guardar Cambios", style='Success.TButton',
                  command=lambda: self.guardar_cambios_producto(
                      key, nombre_entry, desc_entry, stock_entry, 
-                     precio_entry, unidad_entry, categoria_entry, 
+                     precio_entry, unidad_entry, categoria_entry, plu_entry,
                      ventana_editar, ventana_padre)).pack(side="left", padx=10)
         
         ttk.Button(botones_frame, text="Cancelar", style='Danger.TButton',
                  command=ventana_editar.destroy).pack(side="left", padx=10)
     
     def guardar_cambios_producto(self, key, nombre_entry, desc_entry, stock_entry, 
-                               precio_entry, unidad_entry, categoria_entry, 
+                               precio_entry, unidad_entry, categoria_entry, plu_entry,
                                ventana_editar, ventana_padre):
         """Guardar cambios en el producto"""
         try:
@@ -1521,6 +5225,7 @@ Empleados:
             precio = float(precio_entry.get())
             unidad = unidad_entry.get().strip()
             categoria = categoria_entry.get().strip()
+            plu = normalizar_plu(plu_entry.get())
             
             if not nombre or not descripcion:
                 messagebox.showerror("Error", "Nombre y descripción son obligatorios")
@@ -1530,6 +5235,15 @@ Empleados:
                 messagebox.showerror("Error", "Stock no puede ser negativo y precio debe ser mayor a 0")
                 return
             
+            if not plu.isdigit():
+                messagebox.showerror("Error", "El código PLU debe ser un número")
+                return
+            
+            otro = self.indice_plu.buscar(self.inventario, plu)
+            if otro not in (None, key):
+                messagebox.showerror("Error", f"El código PLU {plu} ya es de {self.inventario[otro]['nombre']}")
+                return
+            
             # Actualizar producto
             self.inventario[key]["nombre"] = nombre
             self.inventario[key]["descripcion"] = descripcion
@@ -1537,15 +5251,17 @@ Empleados:
             self.inventario[key]["precio"] = precio
             self.inventario[key]["unidad"] = unidad
             self.inventario[key]["categoria"] = categoria
+            self.inventario[key]["plu"] = plu
+            self.indice_busqueda.actualizar(key, self.inventario[key])
+            self.indice_plu.actualizar(key, self.inventario[key])
             
+            self.marcar_cambio("inventario")
             self.guardar_datos()
+            # Actualiza la fila del producto en las ventanas de inventario abiertas
+            self.avisar_cambio_productos([key])
             messagebox.showinfo("Producto Actualizado", "Los cambios se han guardado exitosamente")
             ventana_editar.destroy()
             
-            # Actualizar la ventana principal de inventario
-            if ventana_padre:
-                self.actualizar_vista_inventario(ventana_padre.children['!labelframe'].children['!frame'].children['!treeview'], ventana_padre)
-            
         except ValueError:
             messagebox.showerror("Error", "Por favor ingrese valores numéricos válidos")
     
@@ -1643,11 +5359,17 @@ Empleados:
                 "precio": precio,
                 "stock": stock,
                 "unidad": unidad,
-                "categoria": categoria
+                "categoria": categoria,
+                "plu": self.indice_plu.siguiente(self.inventario)
             }
+            self.indice_busqueda.actualizar(key, self.inventario[key])
+            self.indice_plu.actualizar(key, self.inventario[key])
             
+            self.marcar_cambio("inventario")
             self.guardar_datos()
-            messagebox.showinfo("Producto Agregado", f"El producto '{nombre}' ha sido agregado exitosamente")
+            self.avisar_cambio_productos([key])
+            messagebox.showinfo("Producto Agregado", f"El producto '{nombre}' ha sido agregado "
+                                                     f"exitosamente con el código PLU {self.inventario[key]['plu']}")
             ventana.destroy()
             
         except ValueError:
@@ -1672,123 +5394,245 @@ Empleados:
         notebook = ttk.Notebook(ventana_reportes)
         notebook.pack(fill="both", expand=True, padx=20, pady=20)
         
+        # Cada pestaña se construye (y calcula sus datos) la primera vez que se elige
+        pendientes = {}
+        
+        def agregar_pestana(texto, crear, *argumentos):
+            frame = tk.Frame(notebook, bg="#F0F8FF")
+            notebook.add(frame, text=texto)
+            pendientes[str(frame)] = lambda: crear(frame, *argumentos)
+        
+        def cargar_pestana(event=None):
+            crear = pendientes.pop(notebook.select(), None)
+            if crear is not None:
+                crear()
+        
         # Reporte del día
-        dia_frame = tk.Frame(notebook, bg="#F0F8FF")
-        notebook.add(dia_frame, text="Ventas del Día")
+        agregar_pestana("Ventas del Día", self.crear_reporte_dia)
         
-        self.crear_reporte_dia(dia_frame)
+        # Semana y mes en curso
+        hoy = datetime.now()
+        lunes = (hoy - timedelta(days=hoy.weekday())).strftime("%Y-%m-%d")
+        siguiente_lunes = (hoy + timedelta(days=7 - hoy.weekday())).strftime("%Y-%m-%d")
+        agregar_pestana("Esta Semana", self.crear_reporte_periodo, lunes, siguiente_lunes, "📆 VENTAS DE LA SEMANA")
         
-        # Reporte semanal
-        semana_frame = tk.Frame(notebook, bg="#F0F8FF")
-        notebook.add(semana_frame, text="Resumen Semanal")
+        mes_actual = hoy.strftime("%Y-%m")
+        agregar_pestana("Este Mes", self.crear_reporte_periodo, f"{mes_actual}-01",
+                        f"{mes_siguiente(mes_actual)}-01", "🗓️ VENTAS DEL MES")
+        
+        # Rango elegido por el usuario
+        agregar_pestana("Rango de Fechas", self.crear_reporte_rango)
         
-        self.crear_reporte_resumen(semana_frame)
+        # Reporte semanal
+        agregar_pestana("Resumen Semanal", self.crear_reporte_resumen)
         
         # Productos más vendidos
-        productos_frame = tk.Frame(notebook, bg="#F0F8FF")
-        notebook.add(productos_frame, text="Productos Populares")
+        agregar_pestana("Productos Populares", self.crear_reporte_productos)
+        
+        # Ventas por día de la semana y hora
+        agregar_pestana("Mapa de Calor", self.crear_reporte_mapa_calor)
         
-        self.crear_reporte_productos(productos_frame)
+        # Productos que se compran juntos
+        agregar_pestana("Comprados Juntos", self.crear_reporte_canastas)
+        
+        notebook.bind("<<NotebookTabChanged>>", cargar_pestana)
+        cargar_pestana()
         
         # Botón cerrar
         ttk.Button(ventana_reportes, text="Cerrar", style='Danger.TButton',
                  command=ventana_reportes.destroy).pack(pady=10)
     
-    def crear_reporte_dia(self, parent):
-        """Crear reporte del día"""
-        hoy = datetime.now().strftime("%Y-%m-%d")
-        ventas_hoy = [v for v in self.historial_ventas if v["fecha"].startswith(hoy)]
-        
-        # Estadísticas generales
-        stats_frame = tk.Frame(parent, bg="#FFD700", relief="raised", bd=2)
-        stats_frame.pack(fill="x", padx=20, pady=10)
+    def cargar_en_segundo_plano(self, parent, calcular, dibujar):
+        """Mostrar "Cargando..." en `parent`, calcular los datos en el hilo de reportes y dibujarlos.
+
+        `dibujar(datos)` se llama en el hilo principal, solo si `parent` y el aviso
+        siguen existiendo (si se vacía `parent` para otra consulta, este resultado se descarta).
+        """
+        aviso = tk.Label(parent, text="⏳ Cargando reporte...", font=("Helvetica", 14),
+                         bg="#F0F8FF", fg="gray")
+        aviso.pack(pady=50)
         
-        if ventas_hoy:
-            total_ventas = len(ventas_hoy)
-            total_monto = sum(v["total"] for v in ventas_hoy)
-            promedio = total_monto / total_ventas
-            
-            stats_text = f"📅 RESUMEN DEL DÍA ({datetime.now().strftime('%d/%m/%Y')})\n"
-            stats_text += f"Total de Ventas: {total_ventas} | Monto Total: ${total_monto:.2f} | Promedio por Venta: ${promedio:.2f}"
-        else:
-            stats_text = "No hay ventas registradas para el día de hoy"
+        def al_terminar(datos):
+            if parent.winfo_exists() and aviso.winfo_exists():
+                aviso.destroy()
+                dibujar(datos)
         
-        tk.Label(stats_frame, text=stats_text, font=("Helvetica", 12, "bold"),
-                bg="#FFD700", fg="black", justify="center").pack(pady=10)
+        def al_fallar(error):
+            if parent.winfo_exists() and aviso.winfo_exists():
+                aviso.config(text=f"No se pudo calcular el reporte: {str(error)}", fg="#B22222")
         
-        # Lista detallada de ventas
-        if ventas_hoy:
-            ventas_scroll_frame = tk.Frame(parent, bg="#F0F8FF")
-            ventas_scroll_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        self.ejecutor_tareas.enviar(calcular, al_terminar, al_fallar)
+    
+    def crear_reporte_dia(self, parent):
+        """Crear reporte del día"""
+        def dibujar(ventas_hoy):
+            # Estadísticas generales
+            stats_frame = tk.Frame(parent, bg="#FFD700", relief="raised", bd=2)
+            stats_frame.pack(fill="x", padx=20, pady=10)
             
-            # Usar Treeview para mejor visualización
-            tree = ttk.Treeview(ventas_scroll_frame, columns=("ID", "Hora", "Vendedor", "Total"), show="headings")
+            if ventas_hoy:
+                total_ventas = len(ventas_hoy)
+                total_monto = sum(v["total"] for v in ventas_hoy)
+                promedio = total_monto / total_ventas
+                
+                stats_text = f"📅 RESUMEN DEL DÍA ({datetime.now().strftime('%d/%m/%Y')})\n"
+                stats_text += f"Total de Ventas: {total_ventas} | Monto Total: ${total_monto:.2f} | Promedio por Venta: ${promedio:.2f}"
+            else:
+                stats_text = "No hay ventas registradas para el día de hoy"
             
-            # Configurar columnas
-            tree.heading("ID", text="ID")
-            tree.heading("Hora", text="Hora")
-            tree.heading("Vendedor", text="Vendedor")
-            tree.heading("Total", text="Total")
+            tk.Label(stats_frame, text=stats_text, font=("Helvetica", 12, "bold"),
+                    bg="#FFD700", fg="black", justify="center").pack(pady=10)
             
-            tree.column("ID", width=50, anchor="center")
-            tree.column("Hora", width=100, anchor="center")
-            tree.column("Vendedor", width=200, anchor="w")
-            tree.column("Total", width=100, anchor="e")
+            # Lista detallada de ventas
+            if ventas_hoy:
+                ventas_scroll_frame = tk.Frame(parent, bg="#F0F8FF")
+                ventas_scroll_frame.pack(fill="both", expand=True, padx=20, pady=10)
+                
+                self.crear_lista_ventas(ventas_scroll_frame, ventas_hoy, "Hora")
+        
+        self.cargar_en_segundo_plano(parent, self.ventas_del_dia, dibujar)
+    
+    def crear_reporte_periodo(self, parent, desde, hasta, titulo):
+        """Crear reporte de las ventas con fecha en [desde, hasta)"""
+        ultimo_dia = epoch_a_fecha(limite_a_epoch(hasta) - 86400)
+        periodo = f"{desde[8:10]}/{desde[5:7]}/{desde[:4]} - {ultimo_dia[8:10]}/{ultimo_dia[5:7]}/{ultimo_dia[:4]}"
+        
+        def calcular():
+            if self.almacen_sqlite is not None and not self.rango_en_memoria(desde, hasta):
+                # Fuera de memoria: SQLite da los totales y la lista lee sus filas por páginas
+                rango = RangoVentasSQLite(self.almacen_sqlite, desde, hasta)
+                return rango, rango.monto, rango.dias
+            ventas = self.consultar_ventas(desde, hasta)
+            return ventas, sum(v["total"] for v in ventas), len({v["fecha"][:10] for v in ventas})
+        
+        def dibujar(datos):
+            ventas, total_monto, dias = datos
+            # Estadísticas del periodo
+            stats_frame = tk.Frame(parent, bg="#FFD700", relief="raised", bd=2)
+            stats_frame.pack(fill="x", padx=20, pady=10)
             
-            # Insertar datos
-            for i, venta in enumerate(ventas_hoy):
-                tree.insert("", "end", values=(
-                    i+1,
-                    venta["fecha"][11:19],  # Solo la hora
-                    venta["vendedor"],
-                    f"${venta['total']:.2f}"
-                ))
+            if ventas:
+                stats_text = f"{titulo} ({periodo})\n"
+                stats_text += (f"Total de Ventas: {len(ventas)} | Monto Total: ${total_monto:.2f} | "
+                               f"Promedio por Venta: ${total_monto / len(ventas):.2f} | Días con Ventas: {dias}")
+            else:
+                stats_text = f"No hay ventas registradas en el periodo ({periodo})"
             
-            # Agregar scrollbar
-            scrollbar = ttk.Scrollbar(ventas_scroll_frame, orient="vertical", command=tree.yview)
-            tree.configure(yscrollcommand=scrollbar.set)
+            tk.Label(stats_frame, text=stats_text, font=("Helvetica", 12, "bold"),
+                    bg="#FFD700", fg="black", justify="center").pack(pady=10)
             
-            tree.pack(side="left", fill="both", expand=True)
-            scrollbar.pack(side="right", fill="y")
+            if not ventas:
+                return
             
-            # Función para ver detalles de la venta seleccionada
-            def ver_detalle_venta(event):
-                item = tree.focus()
-                if item:
-                    valores = tree.item(item, 'values')
-                    indice = int(valores[0]) - 1
-                    if 0 <= indice < len(ventas_hoy):
-                        self.mostrar_detalle_venta(ventas_hoy[indice])
+            ventas_frame = tk.Frame(parent, bg="#F0F8FF")
+            ventas_frame.pack(fill="both", expand=True, padx=20, pady=10)
             
-            tree.bind("<Double-1>", ver_detalle_venta)
+            # Más recientes primero
+            self.crear_lista_ventas(ventas_frame, ventas, "Fecha", fecha_completa=True, recientes_primero=True)
+        
+        self.cargar_en_segundo_plano(parent, calcular, dibujar)
     
-    def crear_reporte_resumen(self, parent):
-        """Crear reporte resumen"""
-        # Cálculos de estadísticas
-        if not self.historial_ventas:
-            tk.Label(parent, text="No hay datos de ventas disponibles",
-                    font=("Helvetica", 14), bg="#F0F8FF", fg="gray").pack(pady=50)
-            return
+    def crear_lista_ventas(self, parent, ventas, titulo_hora, fecha_completa=False, recientes_primero=False):
+        """Lista virtual de ventas con detalle al hacer doble clic; devuelve la ListaVirtual
+
+        `ventas` es una lista o un RangoVentasSQLite, cuyas filas se leen de la base por páginas.
+        """
+        columnas = {}
+        if fecha_completa:
+            columnas["Fecha"] = (lambda i, v: f"{v['fecha'][8:10]}/{v['fecha'][5:7]}/{v['fecha'][:4]}",
+                                 lambda i, v: v["fecha"], "v.fecha")
+        else:
+            columnas["ID"] = (lambda i, v: i + 1, lambda i, v: i, "v.fecha")
+        columnas["Hora"] = (lambda i, v: v["fecha"][11:19], lambda i, v: v["fecha"][11:19], "substr(v.fecha, 12)")
+        columnas["Vendedor"] = (lambda i, v: v["vendedor"], lambda i, v: v["vendedor"], "v.vendedor")
+        columnas["Total"] = (lambda i, v: f"${v['total']:.2f}", lambda i, v: v["total"], "v.total")
+        
+        encabezados = {"Fecha": ("Fecha", 120, "center"), "ID": ("ID", 50, "center"),
+                       "Hora": (titulo_hora, 100 if fecha_completa else 150, "center"),
+                       "Vendedor": ("Vendedor", 200, "w"), "Total": ("Total", 100, "e")}
+        if isinstance(ventas, RangoVentasSQLite):
+            fuente = FuenteVentasSQLite(ventas, columnas, recientes_primero)
+        else:
+            fuente = FuenteVentas(ventas, columnas, recientes_primero)
+        lista = ListaVirtual(parent, fuente, [(columna, *encabezados[columna]) for columna in columnas])
+        lista.pack(fill="both", expand=True)
+        
+        def ver_detalle_venta(event):
+            fila = lista.seleccionado()
+            if fila is not None:
+                self.mostrar_detalle_venta(fuente.venta(fila))
+        
+        lista.bind("<Double-1>", ver_detalle_venta)
+        return lista
+    
+    def crear_reporte_rango(self, parent):
+        """Crear reporte de un rango de fechas elegido por el usuario"""
+        filtros_frame = tk.Frame(parent, bg="#F0F8FF")
+        filtros_frame.pack(fill="x", padx=20, pady=10)
+        
+        hoy = datetime.now()
+        tk.Label(filtros_frame, text="Desde (AAAA-MM-DD):", font=("Helvetica", 12),
+                bg="#F0F8FF").pack(side="left", padx=5)
+        desde_var = tk.StringVar(value=(hoy - timedelta(days=30)).strftime("%Y-%m-%d"))
+        tk.Entry(filtros_frame, textvariable=desde_var, font=("Helvetica", 12), width=12).pack(side="left", padx=5)
         
-        # Estadísticas generales
-        total_ventas = len(self.historial_ventas)
-        total_monto = sum(v["total"] for v in self.historial_ventas)
-        promedio_venta = total_monto / total_ventas if total_ventas > 0 else 0
+        tk.Label(filtros_frame, text="Hasta (AAAA-MM-DD):", font=("Helvetica", 12),
+                bg="#F0F8FF").pack(side="left", padx=5)
+        hasta_var = tk.StringVar(value=hoy.strftime("%Y-%m-%d"))
+        tk.Entry(filtros_frame, textvariable=hasta_var, font=("Helvetica", 12), width=12).pack(side="left", padx=5)
         
-        # Ventas por día (últimos 7 días)
-        ventas_por_dia = defaultdict(lambda: {"count": 0, "total": 0})
+        resultados_frame = tk.Frame(parent, bg="#F0F8FF")
+        resultados_frame.pack(fill="both", expand=True)
         
-        for venta in self.historial_ventas:
-            fecha = venta["fecha"][:10]  # Solo la fecha, sin hora
-            ventas_por_dia[fecha]["count"] += 1
-            ventas_por_dia[fecha]["total"] += venta["total"]
+        def consultar():
+            try:
+                desde = datetime.strptime(desde_var.get().strip(), "%Y-%m-%d")
+                hasta = datetime.strptime(hasta_var.get().strip(), "%Y-%m-%d")
+            except ValueError:
+                messagebox.showerror("Error", "Las fechas deben tener el formato AAAA-MM-DD")
+                return
+            if hasta < desde:
+                messagebox.showerror("Error", "La fecha final no puede ser anterior a la inicial")
+                return
+            
+            for widget in resultados_frame.winfo_children():
+                widget.destroy()
+            # La fecha final se incluye completa
+            self.crear_reporte_periodo(resultados_frame, desde.strftime("%Y-%m-%d"),
+                                       (hasta + timedelta(days=1)).strftime("%Y-%m-%d"), "📋 VENTAS DEL RANGO")
         
-        # Frame de estadísticas
-        stats_frame = tk.LabelFrame(parent, text="Estadísticas Generales", 
-                                  font=("Helvetica", 14, "bold"), bg="#F0F8FF")
-        stats_frame.pack(fill="x", padx=20, pady=10)
+        tk.Button(filtros_frame, text="CONSULTAR", font=("Helvetica", 11, "bold"),
+                 bg="#4169E1", fg="white", command=consultar).pack(side="left", padx=15)
         
-        stats_text = f"""
+        consultar()
+    
+    def crear_reporte_resumen(self, parent):
+        """Crear reporte resumen"""
+        def calcular():
+            # Ventas por día (copia de lo que usa el reporte, ya que el resumen sigue cambiando)
+            ventas_por_dia = self.resumen_ventas_por_dia()
+            with self.bloqueo_historial:
+                return {fecha: {"count": datos["count"], "total": datos["total"]}
+                        for fecha, datos in ventas_por_dia.items()}
+        
+        def dibujar(ventas_por_dia):
+            # Cálculos de estadísticas
+            if not ventas_por_dia:
+                tk.Label(parent, text="No hay datos de ventas disponibles",
+                        font=("Helvetica", 14), bg="#F0F8FF", fg="gray").pack(pady=50)
+                return
+            
+            # Estadísticas generales
+            total_ventas = sum(datos["count"] for datos in ventas_por_dia.values())
+            total_monto = sum(datos["total"] for datos in ventas_por_dia.values())
+            promedio_venta = total_monto / total_ventas if total_ventas > 0 else 0
+            
+            # Frame de estadísticas
+            stats_frame = tk.LabelFrame(parent, text="Estadísticas Generales", 
+                                      font=("Helvetica", 14, "bold"), bg="#F0F8FF")
+            stats_frame.pack(fill="x", padx=20, pady=10)
+            
+            stats_text = f"""
 📊 RESUMEN GENERAL DE VENTAS
 
 Total de Ventas Registradas: {total_ventas}
@@ -1796,103 +5640,313 @@ Monto Total Vendido: ${total_monto:.2f}
 Promedio por Venta: ${promedio_venta:.2f}
 Días con Ventas: {len(ventas_por_dia)}
         """
+            
+            tk.Label(stats_frame, text=stats_text, font=("Helvetica", 12),
+                    bg="#F0F8FF", fg="black", justify="left").pack(padx=20, pady=10)
+            
+            # Ventas por día
+            dias_frame = tk.LabelFrame(parent, text="Ventas por Día", 
+                                     font=("Helvetica", 14, "bold"), bg="#F0F8FF")
+            dias_frame.pack(fill="both", expand=True, padx=20, pady=10)
+            
+            if ventas_por_dia:
+                # Usar Treeview para mejor visualización
+                tree = ttk.Treeview(dias_frame, columns=("Fecha", "Ventas", "Monto Total"), show="headings")
+                
+                # Configurar columnas
+                tree.heading("Fecha", text="Fecha")
+                tree.heading("Ventas", text="N° Ventas")
+                tree.heading("Monto Total", text="Monto Total")
+                
+                tree.column("Fecha", width=150, anchor="center")
+                tree.column("Ventas", width=100, anchor="center")
+                tree.column("Monto Total", width=150, anchor="e")
+                
+                # Insertar datos ordenados por fecha (más reciente primero)
+                for fecha, datos in sorted(ventas_por_dia.items(), reverse=True):
+                    fecha_formateada = f"{fecha[8:10]}/{fecha[5:7]}/{fecha[:4]}"
+                    tree.insert("", "end", values=(
+                        fecha_formateada,
+                        datos["count"],
+                        f"${datos['total']:.2f}"
+                    ))
+                
+                # Agregar scrollbar
+                scrollbar = ttk.Scrollbar(dias_frame, orient="vertical", command=tree.yview)
+                tree.configure(yscrollcommand=scrollbar.set)
+                
+                tree.pack(side="left", fill="both", expand=True)
+                scrollbar.pack(side="right", fill="y")
         
-        tk.Label(stats_frame, text=stats_text, font=("Helvetica", 12),
-                bg="#F0F8FF", fg="black", justify="left").pack(padx=20, pady=10)
-        
-        # Ventas por día
-        dias_frame = tk.LabelFrame(parent, text="Ventas por Día", 
-                                 font=("Helvetica", 14, "bold"), bg="#F0F8FF")
-        dias_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        self.cargar_en_segundo_plano(parent, calcular, dibujar)
+    
+    def crear_reporte_productos(self, parent):
+        """Crear reporte de productos más vendidos"""
+        def calcular():
+            # Consultar el índice acumulado por producto
+            return self.productos_mas_vendidos() if self.contar_ventas() else None
+        
+        def dibujar(productos_ordenados):
+            if productos_ordenados is None:
+                tk.Label(parent, text="No hay datos de ventas disponibles",
+                        font=("Helvetica", 14), bg="#F0F8FF", fg="gray").pack(pady=50)
+                return
+            
+            # Frame de productos populares
+            populares_frame = tk.LabelFrame(parent, text="Productos Más Vendidos", 
+                                          font=("Helvetica", 14, "bold"), bg="#F0F8FF")
+            populares_frame.pack(fill="both", expand=True, padx=20, pady=10)
+            
+            if productos_ordenados:
+                # Usar Treeview para mejor visualización
+                tree = ttk.Treeview(populares_frame, columns=("Producto", "Cantidad", "Monto", "Veces"), show="headings")
+                
+                # Configurar columnas
+                tree.heading("Producto", text="Producto")
+                tree.heading("Cantidad", text="Cantidad Vendida")
+                tree.heading("Monto", text="Monto Total")
+                tree.heading("Veces", text="Veces Vendido")
+                
+                tree.column("Producto", width=250, anchor="w")
+                tree.column("Cantidad", width=150, anchor="center")
+                tree.column("Monto", width=150, anchor="e")
+                tree.column("Veces", width=100, anchor="center")
+                
+                # Insertar datos (también los productos que ya no están en el inventario)
+                for prod_key, datos in productos_ordenados:
+                    tree.insert("", "end", values=(
+                        datos["nombre"],
+                        f"{datos['cantidad']:.1f} {datos['unidad']}",
+                        f"${datos['monto']:.2f}",
+                        datos["veces"]
+                    ))
+                
+                # Agregar scrollbar
+                scrollbar = ttk.Scrollbar(populares_frame, orient="vertical", command=tree.yview)
+                tree.configure(yscrollcommand=scrollbar.set)
+                
+                tree.pack(side="left", fill="both", expand=True)
+                scrollbar.pack(side="right", fill="y")
         
-        if ventas_por_dia:
-            # Usar Treeview para mejor visualización
-            tree = ttk.Treeview(dias_frame, columns=("Fecha", "Ventas", "Monto Total"), show="headings")
+        self.cargar_en_segundo_plano(parent, calcular, dibujar)
+    
+    def crear_reporte_mapa_calor(self, parent):
+        """Crear el mapa de calor de ventas por día de la semana y hora"""
+        def calcular():
+            if not self.contar_ventas():
+                return None
+            self.asegurar_resumen_ventas()
+            productos = {"Todos los productos": None}
+            with self.bloqueo_historial:
+                for prod_key in self.resumen_ventas.mapa_calor:
+                    nombre = self.inventario.get(prod_key, {}).get("nombre") or \
+                        self.resumen_ventas.productos.get(prod_key, {}).get("nombre", prod_key)
+                    productos[nombre] = prod_key
+            # Las celdas de cada opción se calculan aquí para que redibujar no consulte el resumen
+            mapas = {prod_key: {campo: self.mapa_calor_ventas(prod_key, campo) for campo in ("unidades", "monto")}
+                     for prod_key in productos.values()}
+            return productos, mapas
+        
+        def mostrar(datos):
+            if datos is None:
+                tk.Label(parent, text="No hay datos de ventas disponibles",
+                        font=("Helvetica", 14), bg="#F0F8FF", fg="gray").pack(pady=50)
+                return
+            productos, mapas = datos
             
-            # Configurar columnas
-            tree.heading("Fecha", text="Fecha")
-            tree.heading("Ventas", text="N° Ventas")
-            tree.heading("Monto Total", text="Monto Total")
+            # Selección de producto y medida
+            opciones_frame = tk.Frame(parent, bg="#F0F8FF")
+            opciones_frame.pack(fill="x", padx=20, pady=10)
             
-            tree.column("Fecha", width=150, anchor="center")
-            tree.column("Ventas", width=100, anchor="center")
-            tree.column("Monto Total", width=150, anchor="e")
+            tk.Label(opciones_frame, text="Producto:", font=("Helvetica", 12),
+                    bg="#F0F8FF").pack(side="left", padx=5)
+            producto_var = tk.StringVar(value="Todos los productos")
+            producto_combo = ttk.Combobox(opciones_frame, textvariable=producto_var, values=list(productos),
+                                          state="readonly", width=30)
+            producto_combo.pack(side="left", padx=5)
             
-            # Insertar datos ordenados por fecha (más reciente primero)
-            for fecha, datos in sorted(ventas_por_dia.items(), reverse=True):
-                fecha_formateada = datetime.strptime(fecha, "%Y-%m-%d").strftime("%d/%m/%Y")
-                tree.insert("", "end", values=(
-                    fecha_formateada,
-                    datos["count"],
-                    f"${datos['total']:.2f}"
-                ))
+            campo_var = tk.StringVar(value="unidades")
+            ttk.Radiobutton(opciones_frame, text="Unidades", variable=campo_var, value="unidades",
+                           command=lambda: dibujar()).pack(side="left", padx=10)
+            ttk.Radiobutton(opciones_frame, text="Ingresos", variable=campo_var, value="monto",
+                           command=lambda: dibujar()).pack(side="left", padx=10)
+            
+            total_label = tk.Label(opciones_frame, font=("Helvetica", 12, "bold"), bg="#F0F8FF", fg="#228B22")
+            total_label.pack(side="right", padx=5)
             
-            # Agregar scrollbar
-            scrollbar = ttk.Scrollbar(dias_frame, orient="vertical", command=tree.yview)
-            tree.configure(yscrollcommand=scrollbar.set)
+            canvas = tk.Canvas(parent, bg="white", highlightthickness=0)
+            canvas.pack(fill="both", expand=True, padx=20, pady=10)
+            
+            dias = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
+            
+            def dibujar(event=None):
+                canvas.delete("all")
+                campo = campo_var.get()
+                celdas = mapas[productos.get(producto_var.get())][campo]
+                maximo = max(celdas) or 1.0
+                total = sum(celdas)
+                total_label.config(text=f"Total: ${total:.2f}" if campo == "monto" else f"Total: {total:.1f}")
+                
+                ancho = max(canvas.winfo_width(), 800)
+                alto = max(canvas.winfo_height(), 400)
+                margen_x, margen_y = 50, 30
+                celda_ancho = (ancho - margen_x - 10) / 24
+                celda_alto = (alto - margen_y - 10) / 7
+                
+                for hora in range(24):
+                    canvas.create_text(margen_x + (hora + 0.5) * celda_ancho, margen_y / 2,
+                                       text=f"{hora:02d}", font=("Helvetica", 9))
+                for dia in range(7):
+                    y = margen_y + dia * celda_alto
+                    canvas.create_text(margen_x / 2, y + celda_alto / 2, text=dias[dia],
+                                       font=("Helvetica", 10, "bold"))
+                    for hora in range(24):
+                        valor = celdas[dia * 24 + hora]
+                        # Del blanco al verde de la aplicación según la proporción del máximo
+                        intensidad = valor / maximo
+                        color = "#{:02x}{:02x}{:02x}".format(int(255 - 221 * intensidad),
+                                                             int(255 - 116 * intensidad),
+                                                             int(255 - 221 * intensidad))
+                        x = margen_x + hora * celda_ancho
+                        canvas.create_rectangle(x, y, x + celda_ancho, y + celda_alto, fill=color, outline="#DDDDDD")
+                        if valor:
+                            texto = f"{valor:.0f}"
+                            canvas.create_text(x + celda_ancho / 2, y + celda_alto / 2, text=texto,
+                                               font=("Helvetica", 8),
+                                               fill="white" if intensidad > 0.6 else "black")
             
-            tree.pack(side="left", fill="both", expand=True)
-            scrollbar.pack(side="right", fill="y")
+            producto_combo.bind("<<ComboboxSelected>>", dibujar)
+            canvas.bind("<Configure>", dibujar)
+            dibujar()
+        
+        self.cargar_en_segundo_plano(parent, calcular, mostrar)
     
-    def crear_reporte_productos(self, parent):
-        """Crear reporte de productos más vendidos"""
-        if not self.historial_ventas:
-            tk.Label(parent, text="No hay datos de ventas disponibles",
-                    font=("Helvetica", 14), bg="#F0F8FF", fg="gray").pack(pady=50)
-            return
+    def crear_reporte_canastas(self, parent):
+        """Crear reporte de productos que se compran juntos (reglas de asociación)"""
+        filtros_frame = tk.Frame(parent, bg="#F0F8FF")
+        filtros_frame.pack(fill="x", padx=20, pady=10)
+        
+        hoy = datetime.now()
+        tk.Label(filtros_frame, text="Desde:", font=("Helvetica", 12),
+                bg="#F0F8FF").pack(side="left", padx=5)
+        desde_var = tk.StringVar(value=(hoy - timedelta(days=30)).strftime("%Y-%m-%d"))
+        tk.Entry(filtros_frame, textvariable=desde_var, font=("Helvetica", 12), width=12).pack(side="left", padx=5)
+        
+        tk.Label(filtros_frame, text="Hasta:", font=("Helvetica", 12),
+                bg="#F0F8FF").pack(side="left", padx=5)
+        hasta_var = tk.StringVar(value=hoy.strftime("%Y-%m-%d"))
+        tk.Entry(filtros_frame, textvariable=hasta_var, font=("Helvetica", 12), width=12).pack(side="left", padx=5)
         
-        # Contar productos vendidos
-        productos_vendidos = defaultdict(lambda: {"cantidad": 0, "total": 0, "veces": 0})
+        tk.Label(filtros_frame, text="Soporte mín. %:", font=("Helvetica", 12),
+                bg="#F0F8FF").pack(side="left", padx=5)
+        soporte_var = tk.StringVar(value=f"{SOPORTE_MINIMO * 100:g}")
+        tk.Entry(filtros_frame, textvariable=soporte_var, font=("Helvetica", 12), width=5).pack(side="left", padx=5)
         
-        for venta in self.historial_ventas:
-            for prod_key, cantidad in venta["productos"].items():
-                if prod_key in self.inventario:
-                    producto = self.inventario[prod_key]
-                    productos_vendidos[prod_key]["cantidad"] += cantidad
-                    productos_vendidos[prod_key]["total"] += cantidad * producto["precio"]
-                    productos_vendidos[prod_key]["veces"] += 1
+        tk.Label(filtros_frame, text="Confianza mín. %:", font=("Helvetica", 12),
+                bg="#F0F8FF").pack(side="left", padx=5)
+        confianza_var = tk.StringVar(value=f"{CONFIANZA_MINIMA * 100:g}")
+        tk.Entry(filtros_frame, textvariable=confianza_var, font=("Helvetica", 12), width=5).pack(side="left", padx=5)
         
-        # Ordenar por cantidad vendida
-        productos_ordenados = sorted(productos_vendidos.items(), 
-                                   key=lambda x: x[1]["cantidad"], reverse=True)
+        resultados_frame = tk.Frame(parent, bg="#F0F8FF")
+        resultados_frame.pack(fill="both", expand=True)
         
-        # Frame de productos populares
-        populares_frame = tk.LabelFrame(parent, text="Productos Más Vendidos", 
-                                      font=("Helvetica", 14, "bold"), bg="#F0F8FF")
-        populares_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        def nombre_conjunto(conjunto):
+            return " + ".join(self.inventario.get(clave, {}).get("nombre", clave) for clave in conjunto)
         
-        if productos_ordenados:
-            # Usar Treeview para mejor visualización
-            tree = ttk.Treeview(populares_frame, columns=("Producto", "Cantidad", "Monto", "Veces"), show="headings")
+        def mostrar(desde=None, hasta=None, titulo="Todo el historial"):
+            try:
+                soporte = float(soporte_var.get()) / 100
+                confianza = float(confianza_var.get()) / 100
+            except ValueError:
+                messagebox.showerror("Error", "El soporte y la confianza deben ser números")
+                return
             
-            # Configurar columnas
-            tree.heading("Producto", text="Producto")
-            tree.heading("Cantidad", text="Cantidad Vendida")
-            tree.heading("Monto", text="Monto Total")
-            tree.heading("Veces", text="Veces Vendido")
+            for widget in resultados_frame.winfo_children():
+                widget.destroy()
             
-            tree.column("Producto", width=250, anchor="w")
-            tree.column("Cantidad", width=150, anchor="center")
-            tree.column("Monto", width=150, anchor="e")
-            tree.column("Veces", width=100, anchor="center")
-            
-            # Insertar datos
-            for prod_key, datos in productos_ordenados:
-                if prod_key in self.inventario:
-                    producto = self.inventario[prod_key]
+            def dibujar(resultado):
+                tickets, frecuentes, reglas = resultado
+                
+                tk.Label(resultados_frame, text=f"🧺 {titulo}: {tickets} tickets analizados",
+                        font=("Helvetica", 13, "bold"), bg="#F0F8FF", fg="#228B22").pack(pady=5)
+                
+                if not frecuentes:
+                    tk.Label(resultados_frame, text="No hay combinaciones de productos con ese soporte",
+                            font=("Helvetica", 14), bg="#F0F8FF", fg="gray").pack(pady=50)
+                    return
+                
+                # Combinaciones frecuentes
+                frecuentes_frame = tk.LabelFrame(resultados_frame, text="Combinaciones Frecuentes",
+                                               font=("Helvetica", 14, "bold"), bg="#F0F8FF")
+                frecuentes_frame.pack(fill="both", expand=True, padx=20, pady=5)
+                
+                tree = ttk.Treeview(frecuentes_frame, columns=("Productos", "Soporte"), show="headings", height=6)
+                tree.heading("Productos", text="Productos")
+                tree.heading("Soporte", text="Tickets (%)")
+                tree.column("Productos", width=500, anchor="w")
+                tree.column("Soporte", width=150, anchor="center")
+                for conjunto, valor in frecuentes:
+                    tree.insert("", "end", values=(nombre_conjunto(conjunto), f"{valor * 100:.1f}%"))
+                tree.pack(fill="both", expand=True)
+                
+                # Reglas de asociación
+                reglas_frame = tk.LabelFrame(resultados_frame, text="Si compra... también compra...",
+                                           font=("Helvetica", 14, "bold"), bg="#F0F8FF")
+                reglas_frame.pack(fill="both", expand=True, padx=20, pady=5)
+                
+                tree = ttk.Treeview(reglas_frame, columns=("Si", "Tambien", "Soporte", "Confianza", "Lift", "Tickets"),
+                                    show="headings", height=8)
+                tree.heading("Si", text="Si compra")
+                tree.heading("Tambien", text="También compra")
+                tree.heading("Soporte", text="Soporte")
+                tree.heading("Confianza", text="Confianza")
+                tree.heading("Lift", text="Lift")
+                tree.heading("Tickets", text="Tickets")
+                tree.column("Si", width=250, anchor="w")
+                tree.column("Tambien", width=250, anchor="w")
+                tree.column("Soporte", width=90, anchor="center")
+                tree.column("Confianza", width=90, anchor="center")
+                tree.column("Lift", width=70, anchor="center")
+                tree.column("Tickets", width=80, anchor="center")
+                for regla in reglas:
                     tree.insert("", "end", values=(
-                        producto["nombre"],
-                        f"{datos['cantidad']:.1f} {producto['unidad']}",
-                        f"${datos['total']:.2f}",
-                        datos["veces"]
+                        nombre_conjunto(regla["antecedente"]),
+                        nombre_conjunto(regla["consecuente"]),
+                        f"{regla['soporte'] * 100:.1f}%",
+                        f"{regla['confianza'] * 100:.1f}%",
+                        f"{regla['lift']:.2f}",
+                        regla["tickets"]
                     ))
+                
+                scrollbar = ttk.Scrollbar(reglas_frame, orient="vertical", command=tree.yview)
+                tree.configure(yscrollcommand=scrollbar.set)
+                tree.pack(side="left", fill="both", expand=True)
+                scrollbar.pack(side="right", fill="y")
             
-            # Agregar scrollbar
-            scrollbar = ttk.Scrollbar(populares_frame, orient="vertical", command=tree.yview)
-            tree.configure(yscrollcommand=scrollbar.set)
-            
-            tree.pack(side="left", fill="both", expand=True)
-            scrollbar.pack(side="right", fill="y")
+            self.cargar_en_segundo_plano(resultados_frame,
+                                         lambda: self.productos_comprados_juntos(desde, hasta, soporte, confianza),
+                                         dibujar)
+        
+        def consultar():
+            try:
+                desde = datetime.strptime(desde_var.get().strip(), "%Y-%m-%d")
+                hasta = datetime.strptime(hasta_var.get().strip(), "%Y-%m-%d")
+            except ValueError:
+                messagebox.showerror("Error", "Las fechas deben tener el formato AAAA-MM-DD")
+                return
+            if hasta < desde:
+                messagebox.showerror("Error", "La fecha final no puede ser anterior a la inicial")
+                return
+            # La fecha final se incluye completa
+            mostrar(desde.strftime("%Y-%m-%d"), (hasta + timedelta(days=1)).strftime("%Y-%m-%d"),
+                    f"Del {desde.strftime('%d/%m/%Y')} al {hasta.strftime('%d/%m/%Y')}")
+        
+        tk.Button(filtros_frame, text="CONSULTAR", font=("Helvetica", 11, "bold"),
+                 bg="#4169E1", fg="white", command=consultar).pack(side="left", padx=10)
+        tk.Button(filtros_frame, text="TODO EL HISTORIAL", font=("Helvetica", 11, "bold"),
+                 bg="#228B22", fg="white", command=mostrar).pack(side="left", padx=5)
+        
+        mostrar()
     
     def gestion_usuarios_admin(self):
         """Gestión de usuarios para administradores"""
@@ -2086,6 +6140,7 @@ Días con Ventas: {len(ventas_por_dia)}
                 "role": role
             }
             
+            self.marcar_cambio("usuarios_sistema")
             self.guardar_datos()
             messagebox.showinfo("Usuario Actualizado", f"Usuario '{usuario}' actualizado exitosamente")
             ventana_editar.destroy()
@@ -2105,6 +6160,7 @@ Días con Ventas: {len(ventas_por_dia)}
         
         if respuesta:
             del self.usuarios_sistema[usuario]
+            self.marcar_cambio("usuarios_sistema")
             self.guardar_datos()
             messagebox.showinfo("Usuario Eliminado", f"Usuario '{usuario}' eliminado exitosamente")
             ventana_padre.destroy()
@@ -2184,6 +6240,7 @@ Días con Ventas: {len(ventas_por_dia)}
                 "role": role
             }
             
+            self.marcar_cambio("usuarios_sistema")
             self.guardar_datos()
             messagebox.showinfo("Usuario Creado", f"Usuario '{usuario}' creado exitosamente")
             ventana.destroy()
@@ -2195,7 +6252,7 @@ Días con Ventas: {len(ventas_por_dia)}
         """Opciones de respaldo de datos"""
         ventana_respaldo = tk.Toplevel(self.root)
         ventana_respaldo.title("💾 Respaldo de Datos")
-        ventana_respaldo.geometry("700x500")
+        ventana_respaldo.geometry("700x800")
         ventana_respaldo.configure(bg="#F0F8FF")
         
         # Header
@@ -2218,10 +6275,18 @@ Días con Ventas: {len(ventas_por_dia)}
                  style='Success.TButton',
                  width=25, command=self.exportar_datos).pack(pady=15)
         
+        ttk.Button(opciones_frame, text="🧩\nRESPALDO INCREMENTAL\nSolo cambios recientes",
+                 style='Success.TButton',
+                 width=25, command=lambda: self.exportar_datos(incremental=True)).pack(pady=15)
+        
         ttk.Button(opciones_frame, text="📥\nIMPORTAR DATOS\nCargar desde archivo",
                  style='Info.TButton',
                  width=25, command=self.importar_datos).pack(pady=15)
         
+        ttk.Button(opciones_frame, text="🗜️\nARCHIVAR MESES\nFormato compacto",
+                 style='Primary.TButton',
+                 width=25, command=self.archivar_periodos_cerrados).pack(pady=15)
+        
         ttk.Button(opciones_frame, text="🗄️\nVER ESTADÍSTICAS\nInformación del sistema",
                  style='Warning.TButton',
                  width=25, command=self.ver_estadisticas_sistema).pack(pady=15)
@@ -2230,77 +6295,234 @@ Días con Ventas: {len(ventas_por_dia)}
                  style='Danger.TButton',
                  width=25, command=ventana_respaldo.destroy).pack(pady=15)
     
-    def exportar_datos(self):
-        """Exportar datos del sistema"""
+    def leer_registro_respaldos(self):
+        """Datos del último respaldo hecho (para los respaldos incrementales)"""
         try:
-            from datetime import datetime
-            fecha = datetime.now().strftime("%Y%m%d_%H%M%S")
+            if os.path.exists(ARCHIVO_REGISTRO_RESPALDOS):
+                with open(ARCHIVO_REGISTRO_RESPALDOS, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Error al leer registro de respaldos: {e}")
+        return None
+    
+    def exportar_datos(self, incremental=False):
+        """Exportar datos del sistema a un respaldo comprimido (completo o incremental)
+
+        El archivo se escribe en el hilo de tareas; un respaldo completo lee el
+        historial mes por mes sin cargarlo en memoria.
+        """
+        try:
+            registro = self.leer_registro_respaldos()
+            if incremental and (registro is None or not os.path.exists(registro["archivo"])):
+                messagebox.showinfo("Respaldo Incremental",
+                                    "No hay un respaldo completo anterior.\nSe hará un respaldo completo.")
+                incremental = False
             
-            datos_completos = {
-                "inventario": self.inventario,
-                "historial_ventas": self.historial_ventas,
-                "usuarios_sistema": self.usuarios_sistema,
-                "fecha_respaldo": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "version": "1.0"
-            }
+            fecha = datetime.now().strftime("%Y%m%d_%H%M%S")
+            extension = ".json.xz" if COMPRESION_RESPALDOS == "lzma" else ".json.gz"
+            tipo = "incremental" if incremental else "completo"
             
             # Preguntar dónde guardar el archivo
             archivo = filedialog.asksaveasfilename(
-                defaultextension=".json",
-                filetypes=[("Archivos JSON", "*.json"), ("Todos los archivos", "*.*")],
-                initialfile=f"respaldo_tortilleria_{fecha}.json"
+                defaultextension=extension,
+                filetypes=[("Respaldos comprimidos", "*" + extension), ("Todos los archivos", "*.*")],
+                initialfile=f"respaldo_tortilleria_{tipo}_{fecha}{extension}"
             )
             
             if not archivo:  # Usuario canceló
                 return
             
-            # Guardar como JSON
-            with open(archivo, 'w', encoding='utf-8') as f:
-                json.dump(datos_completos, f, indent=2, ensure_ascii=False)
-            
-            messagebox.showinfo("Exportación Exitosa", 
-                              f"Datos exportados exitosamente en:\n{archivo}")
+            # Copias: el hilo de tareas los escribe mientras se sigue vendiendo
+            inventario = copy.deepcopy(self.inventario)
+            encabezado = {
+                "id": fecha,
+                "tipo": tipo,
+                "fecha_respaldo": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "version": "2.0",
+                "usuarios_sistema": copy.deepcopy(self.usuarios_sistema)
+            }
             
+            if incremental:
+                # Solo las ventas posteriores al último respaldo y los productos que cambiaron
+                ventas = self.consultar_ventas(registro["ultima_fecha"], "9999")
+                ventas = ventas[registro["ventas_en_ultima_fecha"]:]
+                anterior = registro["inventario"]
+                encabezado["base"] = registro["base"]
+                encabezado["anterior"] = os.path.basename(registro["archivo"])
+                encabezado["ruta_anterior"] = registro["archivo"]
+                encabezado["inventario_cambios"] = {k: v for k, v in inventario.items() if anterior.get(k) != v}
+                encabezado["inventario_eliminados"] = [k for k in anterior if k not in inventario]
+                base = registro["base"]
+                ultima_fecha = registro["ultima_fecha"]
+                ventas_en_ultima_fecha = registro["ventas_en_ultima_fecha"]
+            else:
+                # Se leen en el hilo de tareas, bloque por bloque y en orden cronológico
+                bloques = self.bloques_historial()
+                ventas = (venta for bloque in bloques for venta in ventas_de_bloque(bloque))
+                encabezado["inventario"] = inventario
+                base = fecha
+                ultima_fecha = ""
+                ventas_en_ultima_fecha = 0
         except Exception as e:
             messagebox.showerror("Error de Exportación", f"Error al exportar datos: {str(e)}")
+            return
+        
+        def escribir():
+            """Hilo de tareas: escribir el respaldo y recordar hasta qué venta cubre"""
+            cubierto = {"ventas": 0, "ultima_fecha": ultima_fecha, "en_ultima_fecha": ventas_en_ultima_fecha}
+            
+            def contar(ventas):
+                for venta in ventas:
+                    cubierto["ventas"] += 1
+                    if venta["fecha"] != cubierto["ultima_fecha"]:
+                        cubierto["ultima_fecha"] = venta["fecha"]
+                        cubierto["en_ultima_fecha"] = 0
+                    cubierto["en_ultima_fecha"] += 1
+                    yield venta
+            
+            escribir_respaldo(archivo, encabezado, contar(ventas))
+            escribir_json_atomico(ARCHIVO_REGISTRO_RESPALDOS, {
+                "archivo": os.path.abspath(archivo),
+                "base": base,
+                "ultima_fecha": cubierto["ultima_fecha"],
+                "ventas_en_ultima_fecha": cubierto["en_ultima_fecha"],
+                "inventario": inventario
+            })
+            return cubierto["ventas"]
+        
+        def terminar(total_ventas):
+            messagebox.showinfo("Exportación Exitosa", 
+                              f"Respaldo {tipo} exportado exitosamente en:\n{archivo}\n\nVentas incluidas: {total_ventas}")
+        
+        def fallar(error):
+            messagebox.showerror("Error de Exportación", f"Error al exportar datos: {str(error)}")
+        
+        self.ejecutor_tareas.enviar(escribir, terminar, fallar)
     
     def importar_datos(self):
         """Importar datos al sistema"""
+        archivo = filedialog.askopenfilename(
+            title="Seleccionar archivo de respaldo",
+            filetypes=[("Respaldos", "*.json.gz *.json.xz *.json"), ("Todos los archivos", "*.*")]
+        )
+        
+        if not archivo:
+            return
+        
+        # Confirmar importación
+        respuesta = messagebox.askyesno("Confirmar Importación", 
+                                      "¿Está seguro de importar los datos?\n\nEsto sobrescribirá todos los datos actuales.")
+        
+        if not respuesta:
+            return
+        
+        # Ventana de avance; es modal para que no se registren ventas mientras se importa
+        ventana = tk.Toplevel(self.root)
+        ventana.title("📥 Importando Respaldo")
+        ventana.geometry("450x170")
+        ventana.configure(bg="#F0F8FF")
+        ventana.transient(self.root)
+        ventana.grab_set()
+        
+        estado = tk.Label(ventana, text="Leyendo respaldo...", font=self.fuente_normal, bg="#F0F8FF")
+        estado.pack(pady=15)
+        barra = ttk.Progressbar(ventana, length=380, mode="determinate", maximum=100)
+        barra.pack(pady=5)
+        
+        cancelar = threading.Event()
+        boton_cancelar = tk.Button(ventana, text="CANCELAR", font=self.fuente_normal, bg="#DC143C", fg="white",
+                                   command=cancelar.set)
+        boton_cancelar.pack(pady=10)
+        ventana.protocol("WM_DELETE_WINDOW", cancelar.set)
+        
+        cola = queue.Queue()
+        
+        def leer():
+            """Hilo de lectura: recorre y valida la cadena de respaldos"""
+            try:
+                rutas = rutas_cadena_respaldos(archivo)
+                resultado = aplicar_cadena_respaldos(
+                    rutas, lambda leidos, total, ventas: cola.put(("avance", (leidos, total, ventas))), cancelar)
+                cola.put(("leido", resultado))
+            except ImportacionCancelada:
+                cola.put(("cancelado", None))
+            except Exception as e:
+                cola.put(("error", e))
+        
+        def escribir(datos):
+            """Hilo de escritura: guarda el historial importado junto al actual"""
+            try:
+                cola.put(("escrito", (datos, self.preparar_historial_importado(datos[1], datos[0]))))
+            except Exception as e:
+                cola.put(("error", e))
+        
+        def revisar():
+            """Atender los mensajes de los hilos desde el hilo principal"""
+            try:
+                while True:
+                    tipo, dato = cola.get_nowait()
+                    if tipo == "avance":
+                        leidos, total, ventas = dato
+                        barra["value"] = 100 * leidos / total
+                        estado.config(text=f"Leyendo respaldo... {ventas} ventas")
+                    elif tipo == "leido":
+                        inventario, historial, usuarios, errores = dato
+                        if errores:
+                            detalle = "\n".join(errores[:5])
+                            if not messagebox.askyesno(
+                                    "Ventas Inválidas",
+                                    f"Se encontraron {len(errores)} ventas inválidas:\n\n{detalle}\n\n"
+                                    f"¿Importar las {len(historial)} ventas válidas?", parent=ventana):
+                                ventana.destroy()
+                                return
+                        estado.config(text=f"Guardando {len(historial)} ventas...")
+                        barra.config(mode="indeterminate")
+                        barra.start(15)
+                        boton_cancelar.config(state=tk.DISABLED)
+                        ventana.protocol("WM_DELETE_WINDOW", lambda: None)
+                        threading.Thread(target=escribir, args=((inventario, historial, usuarios),),
+                                         daemon=True).start()
+                    elif tipo == "escrito":
+                        (inventario, historial, usuarios), preparado = dato
+                        ventana.destroy()
+                        self.terminar_importacion(archivo, inventario, historial, usuarios, preparado)
+                        return
+                    elif tipo == "cancelado":
+                        ventana.destroy()
+                        return
+                    elif tipo == "error":
+                        ventana.destroy()
+                        messagebox.showerror("Error de Importación", f"Error al importar datos: {str(dato)}")
+                        return
+            except queue.Empty:
+                pass
+            self.root.after(100, revisar)
+        
+        threading.Thread(target=leer, daemon=True).start()
+        self.root.after(100, revisar)
+    
+    def terminar_importacion(self, archivo, inventario, historial, usuarios, preparado):
+        """Reemplazar los datos actuales por los importados (hilo principal)"""
         try:
-            archivo = filedialog.askopenfilename(
-                title="Seleccionar archivo de respaldo",
-                filetypes=[("Archivos JSON", "*.json"), ("Todos los archivos", "*.*")]
-            )
-            
-            if not archivo:
-                return
-            
-            # Confirmar importación
-            respuesta = messagebox.askyesno("Confirmar Importación", 
-                                          "¿Está seguro de importar los datos?\n\nEsto sobrescribirá todos los datos actuales.")
-            
-            if not respuesta:
-                return
-            
-            # Cargar datos
-            with open(archivo, 'r', encoding='utf-8') as f:
-                datos_importados = json.load(f)
-            
-            # Validar estructura
-            if not all(key in datos_importados for key in ["inventario", "historial_ventas", "usuarios_sistema"]):
-                messagebox.showerror("Error", "Archivo de respaldo inválido")
-                return
+            self.confirmar_historial_importado(historial, preparado, inventario, usuarios)
             
             # Importar datos
-            self.inventario = datos_importados["inventario"]
-            self.historial_ventas = datos_importados["historial_ventas"]
-            self.usuarios_sistema = datos_importados["usuarios_sistema"]
+            self.inventario = inventario
+            self.historial_ventas = historial
+            self.usuarios_sistema = usuarios
+            self.marcar_cambio("inventario", "historial_ventas", "usuarios_sistema")
+            self.asignar_plu_faltantes()
+            self.avisar_cambio_productos()
+            
+            # El siguiente respaldo incremental necesita un respaldo completo nuevo
+            if os.path.exists(ARCHIVO_REGISTRO_RESPALDOS):
+                os.remove(ARCHIVO_REGISTRO_RESPALDOS)
             
             # Guardar datos importados
             self.guardar_datos()
             
             messagebox.showinfo("Importación Exitosa", 
-                              f"Datos importados exitosamente desde:\n{archivo}")
+                              f"Datos importados exitosamente desde:\n{archivo}\n\nVentas importadas: {len(historial)}")
             
         except Exception as e:
             messagebox.showerror("Error de Importación", f"Error al importar datos: {str(e)}")
@@ -2320,16 +6542,9 @@ Días con Ventas: {len(ventas_por_dia)}
         tk.Label(header, text="🗄️ ESTADÍSTICAS DEL SISTEMA",
                 font=("Helvetica", 18, "bold"), bg="#FF8C00", fg="white").pack(pady=15)
         
-        # Calcular estadísticas
-        total_productos = len(self.inventario)
-        total_usuarios = len(self.usuarios_sistema)
-        total_ventas = len(self.historial_ventas)
-        
-        productos_agotados = sum(1 for p in self.inventario.values() if p["stock"] == 0)
-        productos_poco_stock = sum(1 for p in self.inventario.values() if 0 < p["stock"] <= 5)
-        
-        valor_inventario = sum(p["stock"] * p["precio"] for p in self.inventario.values())
-        monto_total_ventas = sum(v["total"] for v in self.historial_ventas)
+        # Estadísticas en caché (se recalculan solo si su colección cambió)
+        stats_inventario = self.estadisticas_inventario()
+        stats_usuarios = self.estadisticas_usuarios()
         
         # Mostrar estadísticas en un Treeview
         tree_frame = tk.Frame(ventana_stats, bg="#F0F8FF")
@@ -2346,20 +6561,50 @@ Días con Ventas: {len(ventas_por_dia)}
         
         # Insertar datos
         tree.insert("", "end", values=("🏪 INVENTARIO", ""))
-        tree.insert("", "end", values=("   • Total de Productos", total_productos))
-        tree.insert("", "end", values=("   • Productos Agotados", productos_agotados))
-        tree.insert("", "end", values=("   • Productos con Poco Stock (≤5)", productos_poco_stock))
-        tree.insert("", "end", values=("   • Valor Total del Inventario", f"${valor_inventario:.2f}"))
+        tree.insert("", "end", values=("   • Total de Productos", stats_inventario["productos"]))
+        tree.insert("", "end", values=("   • Productos Agotados", stats_inventario["agotado"]))
+        tree.insert("", "end", values=("   • Productos con Poco Stock (≤5)", stats_inventario["poco"]))
+        tree.insert("", "end", values=("   • Valor Total del Inventario", f"${stats_inventario['valor']:.2f}"))
         
         tree.insert("", "end", values=("👥 USUARIOS", ""))
-        tree.insert("", "end", values=("   • Total de Usuarios", total_usuarios))
-        tree.insert("", "end", values=("   • Administradores", sum(1 for u in self.usuarios_sistema.values() if u['role'] == 'admin')))
-        tree.insert("", "end", values=("   • Empleados", sum(1 for u in self.usuarios_sistema.values() if u['role'] == 'empleado')))
+        tree.insert("", "end", values=("   • Total de Usuarios", stats_usuarios["usuarios"]))
+        tree.insert("", "end", values=("   • Administradores", stats_usuarios["admin"]))
+        tree.insert("", "end", values=("   • Empleados", stats_usuarios["empleado"]))
+        
+        # Las ventas pueden requerir recorrer todo el historial: se llenan cuando estén calculadas
+        ventas_item = tree.insert("", "end", values=("💰 VENTAS", "⏳ Calculando..."))
+        vendedores_item = tree.insert("", "end", values=("🧑‍🍳 VENTAS POR VENDEDOR", "⏳ Calculando..."))
+        
+        def mostrar_ventas(stats_ventas):
+            if not tree.winfo_exists():
+                return
+            total_ventas, monto_total_ventas = stats_ventas["ventas"], stats_ventas["monto"]
+            ventas_por_hora = stats_ventas["horas"]
+            hora_pico = max(range(24), key=lambda h: ventas_por_hora[h]["count"])
+            
+            filas = [("   • Total de Ventas Registradas", total_ventas),
+                     ("   • Monto Total Vendido", f"${monto_total_ventas:.2f}")]
+            promedio_venta = monto_total_ventas / total_ventas if total_ventas > 0 else 0
+            filas.append(("   • Promedio por Venta", f"${promedio_venta:.2f}"))
+            if total_ventas:
+                filas.append(("   • Hora con Más Ventas",
+                              f"{hora_pico:02d}:00 - {hora_pico + 1:02d}:00 "
+                              f"({ventas_por_hora[hora_pico]['count']} ventas)"))
+            tree.item(ventas_item, values=("💰 VENTAS", ""))
+            posicion = tree.index(ventas_item)
+            for i, fila in enumerate(filas, 1):
+                tree.insert("", posicion + i, values=fila)
+            
+            tree.item(vendedores_item, values=("🧑‍🍳 VENTAS POR VENDEDOR", ""))
+            posicion = tree.index(vendedores_item)
+            vendedores = sorted(stats_ventas["vendedores"].items(), key=lambda x: x[1]["total"], reverse=True)
+            for i, (vendedor, datos) in enumerate(vendedores, 1):
+                tree.insert("", posicion + i, values=(f"   • {vendedor}", f"{datos['count']} ventas - ${datos['total']:.2f}"))
         
-        tree.insert("", "end", values=("💰 VENTAS", ""))
-        tree.insert("", "end", values=("   • Total de Ventas Registradas", total_ventas))
-        tree.insert("", "end", values=("   • Monto Total Vendido", f"${monto_total_ventas:.2f}"))
-        tree.insert("", "end", values=("   • Promedio por Venta", f"${(monto_total_ventas/total_ventas):.2f if total_ventas > 0 else 0}"))
+        def error_ventas(error):
+            if tree.winfo_exists():
+                tree.item(ventas_item, values=("💰 VENTAS", f"No se pudo calcular: {str(error)}"))
+                tree.item(vendedores_item, values=("🧑‍🍳 VENTAS POR VENDEDOR", ""))
         
         tree.insert("", "end", values=("📅 SISTEMA", ""))
         tree.insert("", "end", values=("   • Fecha Actual", datetime.now().strftime("%d/%m/%Y %H:%M")))
@@ -2373,6 +6618,8 @@ Días con Ventas: {len(ventas_por_dia)}
         tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
+        self.estadisticas_ventas(mostrar_ventas, error_ventas)
+        
         # Botón cerrar
         ttk.Button(ventana_stats, text="Cerrar", style='Danger.TButton',
                  command=ventana_stats.destroy).pack(pady=10)
@@ -2388,8 +6635,15 @@ Días con Ventas: {len(ventas_por_dia)}
         """Ejecutar la aplicación"""
         self.root.mainloop()
 
+        # Si la ventana se cerró sin pasar por "Salir", escribir lo pendiente
+        # (si aún se estaban leyendo los datos, se espera a que termine la lectura)
+        self.ejecutor_tareas.detener(esperar=not self.datos_cargados)
+        self.persistencia.detener()
+        self.motor_reportes.cerrar()
+
 
 # Ejecutar la aplicación
 if __name__ == "__main__":
-    app = TortilleriaApp()
+    # --profile-startup: imprimir cuánto tarda cada etapa del arranque
+    app = TortilleriaApp(perfilar_inicio="--profile-startup" in sys.argv[1:])
     app.ejecutar ()
\ No newline at end of file